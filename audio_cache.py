@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache disque de l'audio décodé pour VocaNote
+Chaque fichier est décodé une seule fois par ffmpeg en 16 kHz mono float32 et enregistré
+au format .npy; transcription, détection de langue et diarisation lisent ensuite des vues
+projetées en mémoire (memmap, sans copie, partagées entre processus)
+"""
+
+import os
+import logging
+import threading
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+import settings
+import audio_io
+import cache_utils
+
+
+class AudioCache:
+    """
+    Un fichier .npy par audio (clé: empreinte du contenu + date de modification),
+    éviction LRU au-delà de la taille maximale ([Performance] audio_cache_mb)
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or cache_utils.get_cache_dir("audio")
+        if max_bytes is None:
+            max_bytes = settings.get_int("Performance", "audio_cache_mb", 2048) * 1024 ** 2
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._decode_locks = {}  # clé -> verrou (un seul décodage par fichier)
+
+    def make_key(self, audio_file: str) -> str:
+        """Clé de l'audio décodé d'un fichier"""
+        mtime = os.stat(audio_file).st_mtime_ns
+        return cache_utils.make_key(cache_utils.hash_file(audio_file), mtime, audio_io.SAMPLE_RATE)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def lookup(self, audio_file: str) -> Optional[str]:
+        """Chemin du .npy si le fichier est déjà décodé (None sinon)"""
+        path = self._path(self.make_key(audio_file))
+        if os.path.exists(path):
+            cache_utils.touch(path)
+            return path
+        return None
+
+    def fits(self, audio_file: str) -> bool:
+        """Le signal décodé du fichier tient-il dans le cache ? (durée inconnue: oui)"""
+        duration = audio_io.probe_duration(audio_file)
+        return duration is None or duration * audio_io.SAMPLE_RATE * 4 <= self.max_bytes
+
+    def load(self, audio_file: str, status_callback: Optional[Callable[[str], None]] = None) -> np.ndarray:
+        """
+        Signal 16 kHz mono float32 du fichier, en lecture seule et projeté en mémoire
+        Le fichier est décodé au premier appel (les appels concurrents attendent ce décodage).
+        Un fichier plus grand que le cache entier n'y est pas enregistré (signal décodé en mémoire)
+        """
+        key = self.make_key(audio_file)
+        path = self._path(key)
+
+        with self._lock:
+            decode_lock = self._decode_locks.setdefault(key, threading.Lock())
+
+        with decode_lock:
+            if os.path.exists(path):
+                cache_utils.touch(path)
+                logging.info(f"[AUDIO_CACHE] Audio décodé trouvé: {key[:12]}")
+            else:
+                if status_callback:
+                    status_callback("Décodage audio...")
+                if not self.fits(audio_file):
+                    # Sinon évincé aussitôt écrit (et suppression impossible tant qu'il est projeté sous Windows)
+                    logging.info(f"[AUDIO_CACHE] Fichier plus grand que le cache ({self.max_bytes // 1024 ** 2} Mo): non enregistré")
+                    with self._lock:
+                        self._decode_locks.pop(key, None)
+                    return audio_io.load_audio(audio_file)
+                self._decode(audio_file, path)
+            audio = open_audio(path)
+
+        with self._lock:
+            self._decode_locks.pop(key, None)
+            # L'entrée qui vient d'être ouverte n'est jamais évincée
+            cache_utils.enforce_size_limit(self.cache_dir, self.max_bytes, suffix=".npy", keep=path)
+        return audio
+
+    def stream(self, audio_file: str) -> Iterator[np.ndarray]:
+        """
+        Blocs du fichier lus par ffmpeg (comme audio_io.stream_audio), enregistrés dans le cache
+        au passage: la transcription commence sans attendre le décodage complet et les étapes
+        suivantes relisent le cache. L'entrée n'est publiée que si la lecture va jusqu'au bout.
+        """
+        path = self._path(self.make_key(audio_file))
+        yield from self._decode_blocks(audio_file, path)
+        with self._lock:
+            cache_utils.enforce_size_limit(self.cache_dir, self.max_bytes, suffix=".npy", keep=path)
+
+    def _decode(self, audio_file: str, path: str):
+        """Décode tout le fichier dans le cache"""
+        for _ in self._decode_blocks(audio_file, path):
+            pass
+
+    def _decode_blocks(self, audio_file: str, path: str) -> Iterator[np.ndarray]:
+        """
+        Décode en continu dans un .npy temporaire (blocs retournés au fil de l'eau): l'en-tête est
+        écrit avec une taille nulle puis réécrit avec la taille finale (même longueur, réservée par numpy)
+        """
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)), 'fortran_order': False}
+        num_samples = 0
+        blocks = audio_io.stream_audio(audio_file)
+        try:
+            with open(temp_path, 'wb') as f:
+                np.lib.format.write_array_header_1_0(f, dict(header, shape=(0,)))
+                for block in blocks:
+                    f.write(block.astype(np.float32, copy=False).tobytes())
+                    num_samples += len(block)
+                    yield block
+                f.seek(0)
+                np.lib.format.write_array_header_1_0(f, dict(header, shape=(num_samples,)))
+            os.replace(temp_path, path)
+        except BaseException:
+            # Erreur ou lecture abandonnée (GeneratorExit): pas d'entrée incomplète
+            blocks.close()
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        logging.info(f"[AUDIO_CACHE] Audio décodé: {num_samples / audio_io.SAMPLE_RATE:.1f}s -> {path}")
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+
+def open_audio(path: str) -> np.ndarray:
+    """Ouvre un .npy du cache en lecture seule (projection mémoire, utilisable dans un autre processus)"""
+    audio = np.load(path, mmap_mode='r')
+    if len(audio) == 0:
+        # Une projection de taille nulle est impossible: tableau vide ordinaire
+        return np.zeros(0, dtype=np.float32)
+    return audio
+
+
+def is_audio_cache_enabled() -> bool:
+    """[Performance] audio_cache_mb = 0 désactive le cache (lecture ffmpeg à chaque étape)"""
+    return settings.get_int("Performance", "audio_cache_mb", 2048) > 0
+
+
+# Variable globale
+_audio_cache_instance = None
+
+
+def get_audio_cache() -> AudioCache:
+    global _audio_cache_instance
+    if _audio_cache_instance is None:
+        _audio_cache_instance = AudioCache()
+    return _audio_cache_instance
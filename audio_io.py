@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lecture audio via ffmpeg pour VocaNote
+Décode directement en 16 kHz mono float32 (format attendu par Whisper),
+en une fois ou en continu par blocs (mémoire bornée pour les longs enregistrements)
+"""
+
+import os
+import re
+import sys
+import shutil
+import logging
+import subprocess
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+
+_ffmpeg_configured = False
+
+
+def configure_ffmpeg_path() -> Optional[str]:
+    """
+    Ajoute au PATH les dossiers où trouver ffmpeg (une seule fois par processus):
+    1. dossier local ffmpeg/bin ou ffmpeg/ (créé par installer_ffmpeg.bat)
+    2. binaire fourni par imageio-ffmpeg (si installé)
+
+    Returns:
+        Chemin de l'exécutable ffmpeg trouvé (None si absent du PATH)
+    """
+    global _ffmpeg_configured
+    if _ffmpeg_configured:
+        return shutil.which("ffmpeg")
+    _ffmpeg_configured = True
+
+    ffmpeg_dirs = []
+
+    # Déterminer le chemin de base (différent en mode développement vs exécutable)
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.getcwd()
+
+    # 1. Chercher dans le dossier local (ffmpeg/bin ET ffmpeg/ racine)
+    for path in [os.path.join(base_path, "ffmpeg", "bin"), os.path.join(base_path, "ffmpeg")]:
+        if os.path.exists(os.path.join(path, "ffmpeg.exe")) or os.path.exists(os.path.join(path, "ffmpeg")):
+            logging.info(f"[AUDIO] FFmpeg local trouvé: {path}")
+            ffmpeg_dirs.append(path)
+            break
+
+    # 2. Chercher via imageio_ffmpeg (si installé)
+    try:
+        import imageio_ffmpeg
+        try:
+            # Peut échouer en mode frozen
+            exe_path = imageio_ffmpeg.get_ffmpeg_exe()
+            logging.info(f"[AUDIO] imageio-ffmpeg trouvé: {exe_path}")
+            ffmpeg_dirs.append(os.path.dirname(exe_path))
+        except Exception as e:
+            logging.info(f"[AUDIO] imageio-ffmpeg erreur runtime: {e}")
+    except ImportError:
+        logging.info("[AUDIO] imageio-ffmpeg non installé")
+
+    # Ajouter au début du PATH pour être prioritaire
+    if ffmpeg_dirs:
+        os.environ["PATH"] = os.pathsep.join(ffmpeg_dirs) + os.pathsep + os.environ.get("PATH", "")
+    else:
+        logging.info("[AUDIO] Aucun dossier FFmpeg spécifique trouvé (utilisation du PATH système)")
+
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        logging.error("[AUDIO] FFmpeg n'est PAS trouvé dans le PATH!")
+    return ffmpeg_path
+
+
+def _ffmpeg_command(audio_file: str, offset: float = 0.0, duration: Optional[float] = None, channels: int = 1) -> list:
+    """Construit la commande ffmpeg qui écrit du PCM 16 bits 16 kHz sur stdout (mono, ou canaux entrelacés)"""
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0"]
+    if offset > 0:
+        # -ss avant -i: positionnement rapide sans décoder le début
+        cmd += ["-ss", f"{offset:.3f}"]
+    cmd += ["-i", audio_file]
+    if duration is not None:
+        # -t après -i: ffmpeg s'arrête de décoder une fois la durée atteinte
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += ["-f", "s16le", "-ac", str(channels), "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    return cmd
+
+
+def load_audio(audio_file: str, offset: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+    """
+    Décode un fichier audio en un seul passage
+
+    Args:
+        audio_file: Chemin du fichier (tout format lu par ffmpeg)
+        offset: Position de départ en secondes
+        duration: Durée maximale à décoder en secondes (None = jusqu'à la fin)
+
+    Returns:
+        Signal float32 normalisé dans [-1, 1]
+    """
+    cmd = _ffmpeg_command(audio_file, offset, duration)
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Échec du décodage audio: {e.stderr.decode(errors='ignore')}") from e
+
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def load_audio_limited(audio_file: str, max_duration: float):
+    """
+    Décode au plus max_duration secondes (version d'évaluation)
+    Une demi-seconde supplémentaire est lue pour savoir si le fichier est plus long
+
+    Returns:
+        (signal tronqué, True si le fichier dépassait la limite)
+    """
+    audio = load_audio(audio_file, duration=max_duration + 0.5)
+    max_samples = int(max_duration * SAMPLE_RATE)
+    truncated = len(audio) > max_samples
+    if truncated:
+        logging.info(f"[AUDIO] Audio tronqué à {max_duration}s")
+        audio = audio[:max_samples]
+    return audio, truncated
+
+
+def probe_duration(audio_file: str) -> Optional[float]:
+    """Durée du fichier en secondes lue dans l'en-tête par ffmpeg (None si inconnue)"""
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-hide_banner", "-i", audio_file],
+            capture_output=True, text=True, errors="ignore"
+        )
+        match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+        if match:
+            hours, minutes, seconds = match.groups()
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except Exception as e:
+        logging.warning(f"[AUDIO] Impossible de lire la durée de {audio_file}: {e}")
+    return None
+
+
+def probe_channels(audio_file: str) -> Optional[int]:
+    """Nombre de canaux du premier flux audio lu dans l'en-tête par ffmpeg (None si inconnu)"""
+    layouts = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-hide_banner", "-i", audio_file],
+            capture_output=True, text=True, errors="ignore"
+        )
+        match = re.search(r"Stream #\S+.*?Audio: [^,]+, \d+ Hz, ([^,]+)", result.stderr)
+        if match:
+            layout = match.group(1).strip()
+            count = re.match(r"(\d+) channels", layout)
+            if count:
+                return int(count.group(1))
+            return layouts.get(layout.split("(")[0])
+    except Exception as e:
+        logging.warning(f"[AUDIO] Impossible de lire les canaux de {audio_file}: {e}")
+    return None
+
+
+def stream_audio(
+    audio_file: str,
+    block_samples: int = 30 * SAMPLE_RATE,
+    offset: float = 0.0,
+    duration: Optional[float] = None,
+    channels: int = 1
+) -> Iterator[np.ndarray]:
+    """
+    Générateur de blocs float32 lus depuis un pipe ffmpeg
+    Seul le bloc courant est en mémoire, quelle que soit la durée du fichier
+    channels > 1: canaux séparés (sans mixage), blocs de forme (échantillons, canaux)
+    """
+    cmd = _ffmpeg_command(audio_file, offset, duration, channels)
+    cmd.insert(1, "-loglevel")
+    cmd.insert(2, "error")
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    produced = 0
+
+    try:
+        while True:
+            data = process.stdout.read(block_samples * 2 * channels)
+            if not data:
+                break
+            frame_bytes = 2 * channels
+            if len(data) % frame_bytes:
+                data = data[:len(data) - len(data) % frame_bytes]
+            produced += len(data) // frame_bytes
+            block = np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+            yield block.reshape(-1, channels) if channels > 1 else block
+
+        process.wait()
+        if process.returncode != 0 and produced == 0:
+            stderr = process.stderr.read().decode(errors="ignore")
+            raise RuntimeError(f"Échec du décodage audio: {stderr}")
+    finally:
+        # Arrêt anticipé du générateur: terminer ffmpeg proprement
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+
+
+def quietest_position(audio: np.ndarray) -> Optional[int]:
+    """
+    Position (échantillons) du passage le plus calme d'un signal 16 kHz
+    (énergie par trames de 100 ms lissée sur 0,5 s: une pause, pas une trame isolée)
+    None si le signal est plus court qu'une trame
+    """
+    frame = SAMPLE_RATE // 10
+    num_frames = len(audio) // frame
+    if num_frames == 0:
+        return None
+    energy = (audio[:num_frames * frame].astype(np.float64).reshape(num_frames, frame) ** 2).mean(axis=1)
+    smoothed = np.convolve(energy, np.ones(5) / 5, mode='same')
+    return int((int(np.argmin(smoothed)) + 0.5) * frame)
+
+
+class ArraySource:
+    """Source audio en mémoire (signal complet déjà décodé)"""
+
+    def __init__(self, audio: np.ndarray):
+        self.audio = audio
+        self.total_samples = len(audio)
+
+    def read(self, start: int, length: int) -> np.ndarray:
+        """Retourne les échantillons [start, start + length)"""
+        return self.audio[start:start + length]
+
+    def release(self, position: int):
+        """Rien à libérer: le signal complet reste en mémoire"""
+        pass
+
+
+class StreamingSource:
+    """
+    Source audio alimentée par un générateur de blocs (voir stream_audio)
+
+    Les lectures doivent avancer dans le temps: release() oublie les échantillons
+    déjà traités, la mémoire reste bornée à quelques fenêtres.
+    """
+
+    def __init__(self, blocks: Iterator[np.ndarray], total_samples: Optional[int] = None, start: int = 0):
+        self._blocks = iter(blocks)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = start  # Position absolue de _buffer[0] (flux ouvert avec un décalage)
+        self._exhausted = False
+        # Estimation (en-tête du fichier) remplacée par la valeur exacte en fin de flux
+        self.total_samples = total_samples
+
+    def _fill(self, end: int):
+        """Lit des blocs jusqu'à couvrir la position end (ou la fin du flux)"""
+        pending = [self._buffer]
+        available = self._buffer_start + len(self._buffer)
+        while not self._exhausted and available < end:
+            try:
+                block = next(self._blocks)
+            except StopIteration:
+                self._exhausted = True
+                break
+            pending.append(block)
+            available += len(block)
+        if len(pending) > 1:
+            self._buffer = np.concatenate(pending)
+        if self._exhausted:
+            self.total_samples = self._buffer_start + len(self._buffer)
+
+    def read(self, start: int, length: int) -> np.ndarray:
+        """Retourne les échantillons [start, start + length) (vide après la fin du flux)"""
+        if start < self._buffer_start:
+            raise ValueError("Lecture en arrière impossible sur un flux audio")
+        self._fill(start + length)
+        offset = start - self._buffer_start
+        return self._buffer[offset:offset + length]
+
+    def release(self, position: int):
+        """Libère les échantillons avant position"""
+        drop = min(max(0, position - self._buffer_start), len(self._buffer))
+        if drop:
+            self._buffer = self._buffer[drop:].copy()
+            self._buffer_start += drop
+
+    def close(self):
+        """Arrête la lecture (termine ffmpeg si le générateur le permet)"""
+        close = getattr(self._blocks, "close", None)
+        if close:
+            close()
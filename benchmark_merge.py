@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mesure de la fusion transcription / diarisation sur des données synthétiques
+Compare assign_speakers (balayage) à la recherche segment par segment (_find_speaker_for_segment)
+et vérifie que les locuteurs attribués sont identiques
+
+Usage: python benchmark_merge.py [--segments 10000] [--turns 10000] [--no-reference]
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from diarization import SpeakerDiarization, assign_speakers
+
+
+def make_segments(count: int, duration: float, rng: np.random.Generator):
+    """Segments de transcription consécutifs (0.5 à 2x la durée moyenne)"""
+    lengths = rng.uniform(0.5, 2.0, count)
+    bounds = np.concatenate([[0.0], np.cumsum(lengths / lengths.sum() * duration)])
+    return [
+        {'start': float(start), 'end': float(end), 'text': f"segment {k}"}
+        for k, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def make_turns(count: int, duration: float, num_speakers: int, rng: np.random.Generator):
+    """Tours de parole avec pauses et chevauchements occasionnels (comme pyannote)"""
+    starts = np.sort(rng.uniform(0, duration, count))
+    lengths = rng.exponential(duration / count * 1.2, count)
+    return [
+        {'start': float(start), 'end': float(min(start + length, duration)), 'speaker': f"Locuteur {rng.integers(num_speakers) + 1}"}
+        for start, length in zip(starts, lengths)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de merge_with_transcription")
+    parser.add_argument("--segments", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--speakers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=4 * 3600.0, help="durée simulée en secondes")
+    parser.add_argument("--no-reference", action="store_true", help="ne pas mesurer l'ancienne méthode (N x M)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    segments = make_segments(args.segments, args.duration, rng)
+    turns = make_turns(args.turns, args.duration, args.speakers, rng)
+    # Ordre quelconque: la fusion ne doit pas supposer des tours triés
+    turns = [turns[k] for k in rng.permutation(len(turns))]
+
+    print(f"📊 {len(segments)} segments x {len(turns)} tours de parole")
+
+    start = time.perf_counter()
+    speakers = assign_speakers(segments, turns)
+    sweep_time = time.perf_counter() - start
+    print(f"⚡ Balayage (assign_speakers): {sweep_time * 1000:.1f} ms")
+
+    if args.no_reference:
+        return
+
+    diarizer = SpeakerDiarization.__new__(SpeakerDiarization)  # Sans charger de modèle
+    start = time.perf_counter()
+    reference = [diarizer._find_speaker_for_segment(seg['start'], seg['end'], turns) for seg in segments]
+    reference_time = time.perf_counter() - start
+    print(f"🐢 Recherche par segment (N x M): {reference_time * 1000:.1f} ms")
+
+    mismatches = sum(1 for a, b in zip(speakers, reference) if a != b)
+    if mismatches:
+        print(f"❌ {mismatches} locuteurs différents")
+        raise SystemExit(1)
+    print(f"✅ Locuteurs identiques (x{reference_time / max(sweep_time, 1e-9):.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -208,6 +208,23 @@ hiddenimports += [
     'summarizer',
     'diarization',
     'license',
+    'settings',
+    'model_registry',
+    'decoding',
+    'audio_io',
+    'cache_utils',
+    'result_cache',
+    'sharding',
+    'vad',
+    'checkpoint',
+    'engine',
+    'job_queue',
+    'audio_cache',
+    'diarization_chunks',
+    'speaker_enrollment',
+    'channel_diarization',
+    'fast_diarization',
+    'diarization_cache',
     # Requis par PyTorch
     'unittest',
     'unittest.mock',
@@ -221,7 +238,7 @@ if os.path.exists('ffmpeg'):
     datas += [('ffmpeg', 'ffmpeg')]
 
 # Inclure les modules Python locaux
-local_modules = ['summarizer.py', 'diarization.py', 'license.py']
+local_modules = ['summarizer.py', 'diarization.py', 'license.py', 'settings.py', 'model_registry.py', 'decoding.py', 'audio_io.py', 'cache_utils.py', 'result_cache.py', 'sharding.py', 'vad.py', 'checkpoint.py', 'engine.py', 'job_queue.py', 'audio_cache.py', 'diarization_chunks.py', 'speaker_enrollment.py', 'channel_diarization.py', 'fast_diarization.py', 'diarization_cache.py']
 for mod in local_modules:
     if os.path.exists(mod):
         datas += [(mod, '.')]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Outils communs aux caches disque de VocaNote
+Emplacement du cache, empreinte du contenu des fichiers audio et éviction LRU par taille
+"""
+
+import os
+import sys
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+import settings
+
+
+# Empreintes déjà calculées: (chemin, taille, mtime) -> hash
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def get_cache_dir(name: str = "") -> str:
+    """
+    Dossier de cache de l'application ([Performance] data_cache_dir)
+    Par défaut: %LOCALAPPDATA%/VocaNote/cache sous Windows, ~/.cache/vocanote ailleurs
+    """
+    base = settings.get_str("Performance", "data_cache_dir", "")
+    if not base:
+        if sys.platform == "win32":
+            base = os.path.join(os.environ.get('LOCALAPPDATA', os.getcwd()), 'VocaNote', 'cache')
+        else:
+            base = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'vocanote')
+    path = os.path.join(base, name) if name else base
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def hash_file(path: str) -> str:
+    """
+    Empreinte BLAKE2b du contenu d'un fichier
+    Mémorisée tant que le fichier n'est pas modifié (taille et date identiques)
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    file_hash = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[memo_key] = file_hash
+    return file_hash
+
+
+def make_key(*parts) -> str:
+    """Clé de cache stable à partir de valeurs simples (texte, nombres, None, dict)"""
+    text = "|".join(
+        repr(sorted(part.items())) if isinstance(part, dict) else repr(part)
+        for part in parts
+    )
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def touch(path: str):
+    """Marque une entrée comme récemment utilisée (date de modification)"""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def enforce_size_limit(directory: str, max_bytes: int, suffix: Optional[str] = None, keep: Optional[str] = None):
+    """
+    Supprime les fichiers les moins récemment utilisés tant que
+    la taille totale du dossier dépasse max_bytes
+    keep: fichier jamais supprimé (entrée qui vient d'être écrite, encore ouverte)
+    """
+    if max_bytes <= 0:
+        return
+
+    entries = []
+    for name in os.listdir(directory):
+        if suffix and not name.endswith(suffix):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if os.path.isfile(path):
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            logging.info(f"[CACHE] Entrée supprimée (limite de taille): {path}")
+        except OSError as e:
+            logging.warning(f"[CACHE] Suppression impossible {path}: {e}")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diarisation par canal pour VocaNote
+Enregistrements multicanaux avec un locuteur par canal (centres d'appels, interviews
+à deux micros): la parole de chaque canal est détectée séparément (VAD) et attribuée
+au locuteur de ce canal, sans charger le pipeline pyannote
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import settings
+import audio_io
+import vad
+
+
+# Écart d'énergie (dB) au-delà duquel un canal est considéré comme dominant dans une trame
+DOMINANT_DB = 6.0
+
+
+def channel_names(count: int) -> List[str]:
+    """Nom du locuteur de chaque canal ([Diarization] channel_names, sinon "Locuteur N")"""
+    configured = [name.strip() for name in settings.get_str("Diarization", "channel_names", "").split(",")]
+    return [
+        configured[index] if index < len(configured) and configured[index] else f"Locuteur {index + 1}"
+        for index in range(count)
+    ]
+
+
+def cache_params() -> Dict:
+    """Paramètres qui déterminent les tours de parole par canal (clé du cache de diarisation)"""
+    return {
+        'mode': settings.get_str("Diarization", "channel_mode", "auto").strip().lower(),
+        'names': settings.get_str("Diarization", "channel_names", ""),
+        'bleed_db': settings.get_float("Diarization", "channel_bleed_db", 15.0),
+        'max': settings.get_int("Diarization", "channel_max", 4),
+    }
+
+
+def _frame_energy_db(audio: np.ndarray, num_frames: int) -> np.ndarray:
+    """Énergie (dBFS) par trame de 30 ms"""
+    frames = audio[:num_frames * vad.FRAME_SAMPLES].reshape(num_frames, vad.FRAME_SAMPLES)
+    return 10.0 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+
+
+def diarize_by_channel(audio_file: str, min_turn: float = 0.3, max_duration: Optional[float] = None) -> Optional[List[Dict]]:
+    """
+    Tours de parole d'un enregistrement multicanal, un locuteur par canal
+    max_duration: seul le début du fichier est lu (version d'évaluation)
+
+    Le fichier est lu en un passage par blocs (canaux séparés, mémoire bornée).
+    Dans chaque trame, la parole d'un canal n'est gardée que si elle n'est pas
+    nettement plus faible que celle du canal le plus fort ([Diarization] channel_bleed_db):
+    la voix d'un locuteur captée par le micro de l'autre est ignorée, les vrais
+    chevauchements sont conservés.
+
+    Returns:
+        [{'start', 'end', 'speaker'}], ou None si le fichier n'a qu'un canal ou si ses
+        canaux portent le même signal (mono dupliqué): diarisation classique dans ce cas
+    """
+    mode = settings.get_str("Diarization", "channel_mode", "auto").strip().lower()
+    if mode == "off":
+        return None
+    channels = audio_io.probe_channels(audio_file)
+    if not channels or channels < 2:
+        return None
+    max_channels = settings.get_int("Diarization", "channel_max", 4)
+    if channels > max_channels:
+        logging.info(f"[DIARIZATION] {channels} canaux (> {max_channels}): diarisation classique")
+        return None
+
+    bleed_db = settings.get_float("Diarization", "channel_bleed_db", 15.0)
+    detectors = [vad.VoiceActivityDetector() for _ in range(channels)]
+    masks = [[] for _ in range(channels)]
+    speech_frames = 0
+    dominant_frames = 0
+
+    for block in audio_io.stream_audio(audio_file, duration=max_duration, channels=channels):
+        num_frames = len(block) // vad.FRAME_SAMPLES
+        if num_frames == 0:
+            continue
+        energies = np.stack([_frame_energy_db(block[:, c], num_frames) for c in range(channels)])
+        speech = np.stack([detectors[c].speech_mask(np.ascontiguousarray(block[:, c]))[:num_frames] for c in range(channels)])
+
+        loudest = energies.max(axis=0)
+        speech &= energies >= loudest - bleed_db
+        for c in range(channels):
+            masks[c].append(speech[c])
+
+        # Canaux réellement séparés: l'un domine nettement pendant la parole
+        active = speech.any(axis=0)
+        ordered = np.sort(energies, axis=0)
+        speech_frames += int(active.sum())
+        dominant_frames += int((active & (ordered[-1] - ordered[-2] > DOMINANT_DB)).sum())
+
+    if mode == "auto" and (speech_frames == 0 or dominant_frames < 0.5 * speech_frames):
+        logging.info("[DIARIZATION] Canaux peu différenciés (mono dupliqué?): diarisation classique")
+        return None
+
+    frame_seconds = vad.FRAME_SAMPLES / audio_io.SAMPLE_RATE
+    names = channel_names(channels)
+    turns = []
+    for c in range(channels):
+        mask = np.concatenate(masks[c]) if masks[c] else np.zeros(0, dtype=bool)
+        for start, end in vad.mask_to_regions(mask):
+            if (end - start) * frame_seconds >= min_turn:
+                turns.append({'start': round(start * frame_seconds, 3), 'end': round(end * frame_seconds, 3), 'speaker': names[c]})
+    turns.sort(key=lambda turn: (turn['start'], turn['end']))
+
+    logging.info(f"[DIARIZATION] Diarisation par canal: {channels} canaux, {len(turns)} tours de parole")
+    return turns
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Points de reprise des transcriptions longues pour VocaNote
+Les segments déjà décodés et la position suivante sont enregistrés régulièrement
+dans le dossier de cache: une transcription interrompue (annulation, plantage)
+reprend à la dernière fenêtre terminée au lieu de repartir de zéro
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+import settings
+import audio_io
+import cache_utils
+
+
+# À incrémenter quand le format de l'état enregistré change
+CHECKPOINT_VERSION = 1
+
+
+class CheckpointStore:
+    """Un fichier JSON par transcription en cours (même clé que le cache de résultats)"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or cache_utils.get_cache_dir("checkpoints")
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, key: str, options: Optional[Dict] = None) -> Optional[Dict]:
+        """Retourne l'état enregistré (None si absent ou obtenu avec d'autres options)"""
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except Exception as e:
+                logging.warning(f"[CHECKPOINT] Point de reprise illisible {path}: {e}")
+                return None
+
+        if state.get('version') != CHECKPOINT_VERSION or state.get('options') != (options or {}):
+            logging.info(f"[CHECKPOINT] Point de reprise ignoré (options différentes): {key[:12]}")
+            return None
+        return state
+
+    def save(self, key: str, state: Dict, options: Optional[Dict] = None):
+        """Enregistre l'état (écriture atomique: un plantage pendant l'écriture garde l'ancien état)"""
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        data = dict(state, version=CHECKPOINT_VERSION, options=options or {})
+        with self._lock:
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, path)
+            except Exception as e:
+                logging.warning(f"[CHECKPOINT] Écriture impossible {path}: {e}")
+
+    def remove(self, key: str):
+        """Supprime le point de reprise (transcription terminée)"""
+        with self._lock:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+class Checkpointer:
+    """
+    Enregistrement périodique de l'état d'une transcription
+    S'utilise comme checkpoint_callback de SeekTranscriber.transcribe
+    """
+
+    def __init__(self, store: CheckpointStore, key: str, options: Optional[Dict] = None, interval: Optional[float] = None):
+        self.store = store
+        self.key = key
+        self.options = options or {}
+        if interval is None:
+            interval = settings.get_float("Performance", "checkpoint_interval", 30.0)
+        self.interval = interval
+        self._last_save = time.monotonic()
+        self._state = None
+
+    def load(self) -> Optional[Dict]:
+        """État à reprendre (None si aucun)"""
+        state = self.store.load(self.key, self.options)
+        if state:
+            logging.info(f"[CHECKPOINT] Reprise à {state['seek'] / audio_io.SAMPLE_RATE:.1f}s ({len(state['segments'])} segments)")
+        return state
+
+    def __call__(self, state: Dict):
+        """Appelé après chaque lot de fenêtres: enregistre au plus toutes les `interval` secondes"""
+        self._state = state
+        if time.monotonic() - self._last_save >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Enregistre immédiatement le dernier état reçu (annulation)"""
+        if self._state is not None:
+            self.store.save(self.key, self._state, self.options)
+            self._last_save = time.monotonic()
+
+    def clear(self):
+        """Transcription terminée: le point de reprise n'est plus utile"""
+        self._state = None
+        self.store.remove(self.key)
+
+
+# Variable globale
+_checkpoint_store_instance = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    global _checkpoint_store_instance
+    if _checkpoint_store_instance is None:
+        _checkpoint_store_instance = CheckpointStore()
+    return _checkpoint_store_instance
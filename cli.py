@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VocaNote en ligne de commande (sans interface graphique, n'importe pas PyQt6)
+
+Utilisation:
+    python cli.py transcribe enregistrement.mp3 [-m small] [-l fr] [--diarize]
+    python cli.py diarize reunion.wav
+    python cli.py summarize transcription.json
+    python cli.py batch dossier/ --output-dir resultats/ [--concurrency 2]
+    python cli.py serve [--port 8765] [--preload base]    (service HTTP local, voir server.py)
+    python cli.py speakers enroll "Marie" --result reunion.json --speaker "Locuteur 2"
+
+Sortie: JSON (un seul fichier) ou JSON Lines (un objet par fichier) sur stdout ou dans -o FICHIER.
+Codes de retour (pour cron et les scripts):
+    0   tous les fichiers ont été traités
+    1   au moins un fichier en erreur (les autres résultats sont écrits)
+    2   arguments invalides
+    130 interrompu (Ctrl+C)
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import audio_io
+
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+MODEL_SIZES = ["tiny", "base", "small", "medium", "large"]
+DIARIZATION_BACKENDS = ["pyannote", "fast"]  # Voir diarization.BACKENDS
+
+
+# --- Travail sur un fichier (exécuté dans ce processus ou dans un processus de travail) ---
+
+def _init_worker(num_threads: int, log_level: int):
+    """Initialisation d'un processus de travail: répartir les cœurs entre processus"""
+    import torch
+    logging.basicConfig(level=log_level, format='%(levelname)s - %(message)s', stream=sys.stderr)
+    torch.set_num_threads(max(1, num_threads))
+    audio_io.configure_ffmpeg_path()
+
+
+def _transcribe_one(
+    audio_file: str,
+    model_size: str,
+    language,
+    enable_diarization: bool,
+    allow_sharding: bool,
+    word_timestamps: Optional[bool] = None,
+    diarization_backend: Optional[str] = None
+) -> Dict:
+    import license as lic
+    from engine import TranscriptionEngine
+
+    engine = TranscriptionEngine(
+        audio_file,
+        model_size,
+        language,
+        lic.get_transcription_limit(),
+        enable_diarization,
+        on_status=lambda message: logging.info(f"[CLI] {os.path.basename(audio_file)}: {message}"),
+        on_warning=lambda message: logging.warning(f"[CLI] {os.path.basename(audio_file)}: {message}"),
+        allow_sharding=allow_sharding,
+        word_timestamps=word_timestamps,
+        diarization_backend=diarization_backend
+    )
+    return engine.run()
+
+
+def _diarize_one(audio_file: str, num_speakers, backend: Optional[str] = None) -> Dict:
+    from engine import diarize_file
+    return {'segments': diarize_file(audio_file, num_speakers, backend)}
+
+
+def _summarize_one(path: str) -> Dict:
+    from engine import summarize_text
+
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # Résultat JSON de `transcribe`: résumer le texte transcrit
+        if path.lower().endswith(".json"):
+            text = json.loads(text).get('text', '')
+    return {'summary': summarize_text(text)}
+
+
+def _run_task(function, path: str, *args) -> Dict:
+    """Exécute une tâche et retourne un enregistrement {'file', 'status', ...} (jamais d'exception)"""
+    try:
+        record = {'file': path, 'status': 'ok'}
+        record.update(function(path, *args))
+        return record
+    except Exception as e:
+        logging.error(f"[CLI] Échec de {path}: {e}")
+        return {'file': path, 'status': 'error', 'error': str(e)}
+
+
+def _run_tasks(function, paths: List[str], args: tuple, workers: int, log_level: int) -> Iterator[Dict]:
+    """
+    Traite les fichiers dans l'ordre, en parallèle sur `workers` processus
+    (chacun avec ses propres modèles, gardés en mémoire d'un fichier à l'autre)
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield _run_task(function, path, *args)
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads, log_level)
+    ) as pool:
+        futures = [pool.submit(_run_task, function, path, *args) for path in paths]
+        for future in futures:
+            yield future.result()
+
+
+# --- Sortie ---
+
+class _Output:
+    """Écrit les enregistrements en JSON (un seul) ou JSON Lines (au fil de l'eau)"""
+
+    def __init__(self, path, output_format: str, count: int):
+        self.stream = open(path, 'w', encoding='utf-8') if path else sys.stdout
+        self.close_stream = bool(path)
+        if output_format == "auto":
+            output_format = "json" if count == 1 else "jsonl"
+        self.format = output_format
+        self.records = []
+
+    def write(self, record: Dict):
+        if self.format == "jsonl":
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.stream.flush()
+        elif self.format == "text":
+            # Travaux de la file (batch): chemin du .txt écrit dans --output-dir
+            text = record.get('text', record.get('summary', record.get('text_path', '')))
+            if record['status'] != 'ok':
+                text = f"# {record['file']}: {record.get('error') or record['status']}"
+            self.stream.write(text.strip() + "\n")
+            self.stream.flush()
+        else:
+            self.records.append(record)
+
+    def close(self):
+        if self.format == "json":
+            data = self.records[0] if len(self.records) == 1 else self.records
+            json.dump(data, self.stream, ensure_ascii=False, indent=2)
+            self.stream.write("\n")
+        if self.close_stream:
+            self.stream.close()
+
+
+def _emit(records: Iterator[Dict], args, count: int) -> int:
+    """Écrit les enregistrements et retourne le code de sortie"""
+    output = _Output(args.output, args.format, count)
+    failures = 0
+    try:
+        for record in records:
+            if record['status'] != 'ok':
+                failures += 1
+            output.write(record)
+    finally:
+        output.close()
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+# --- Commandes ---
+
+def _check_files(parser, paths: List[str]):
+    missing = [path for path in paths if path != "-" and not os.path.isfile(path)]
+    if missing:
+        parser.error(f"fichier introuvable: {', '.join(missing)}")
+
+
+def cmd_transcribe(args, parser) -> int:
+    _check_files(parser, args.files)
+    language = None if args.language == "auto" else args.language
+    records = _run_tasks(
+        _transcribe_one, args.files,
+        (args.model, language, args.diarize, args.workers <= 1, args.word_timestamps, args.diarization_backend),
+        args.workers, args.log_level
+    )
+    return _emit(records, args, len(args.files))
+
+
+def cmd_diarize(args, parser) -> int:
+    _check_files(parser, args.files)
+    records = _run_tasks(_diarize_one, args.files, (args.speakers, args.diarization_backend), args.workers, args.log_level)
+    return _emit(records, args, len(args.files))
+
+
+def cmd_summarize(args, parser) -> int:
+    _check_files(parser, args.files)
+    records = (_run_task(_summarize_one, path) for path in args.files)
+    return _emit(records, args, len(args.files))
+
+
+def cmd_batch(args, parser) -> int:
+    """File de travaux: résultats JSON/TXT dans --output-dir, une ligne JSON par fichier sur stdout"""
+    import license as lic
+    import job_queue
+
+    paths = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            paths.extend(job_queue.list_audio_files(path, args.recursive))
+        elif os.path.isfile(path):
+            paths.append(path)
+        else:
+            parser.error(f"fichier ou dossier introuvable: {path}")
+    if not paths:
+        parser.error("aucun fichier audio à traiter")
+
+    queue = job_queue.JobQueue(args.output_dir, args.concurrency)
+    options = {
+        'model_size': args.model,
+        'language': None if args.language == "auto" else args.language,
+        'max_duration': lic.get_transcription_limit(),
+        'enable_diarization': args.diarize,
+        'word_timestamps': args.word_timestamps,
+        'diarization_backend': args.diarization_backend,
+    }
+    jobs = [queue.add(path, **options) for path in paths]
+    queue.start()
+    try:
+        queue.wait()
+    except KeyboardInterrupt:
+        queue.cancel_all()
+        queue.wait()
+        raise
+
+    args.format = "jsonl" if args.format == "auto" else args.format
+    return _emit((_job_record(job) for job in jobs), args, len(jobs))
+
+
+def _job_record(job: "job_queue.Job") -> Dict:
+    """
+    Enregistrement de sortie d'un travail de la file (status: ok, cancelled ou error)
+    text_path: transcription en texte brut écrite dans --output-dir (sortie --format text)
+    """
+    import job_queue
+    record = dict(job.to_dict(), file=job.audio_file)
+    if job.state == job_queue.DONE:
+        record['status'] = 'ok'
+        record['text_path'] = os.path.splitext(job.output_path)[0] + ".txt"
+    elif job.state == job_queue.CANCELLED:
+        record['status'] = 'cancelled'
+        record['error'] = record.get('error') or "Travail annulé"
+    else:
+        record['status'] = 'error'
+    return record
+
+
+def cmd_serve(args, parser) -> int:
+    """Service HTTP local (jusqu'à Ctrl+C)"""
+    import server
+    server.serve(
+        args.host, args.port, args.workers,
+        preload_models=args.preload or [],
+        preload_summarizer=args.preload_summarizer,
+        preload_diarization=args.preload_diarization,
+        output_dir=args.output_dir
+    )
+    return EXIT_OK
+
+
+def cmd_speakers(args, parser) -> int:
+    """Voix connues: liste, enregistrement depuis un résultat de transcribe --diarize, suppression"""
+    import speaker_enrollment
+    store = speaker_enrollment.get_speaker_store()
+
+    if args.action == "list":
+        for name in store.names():
+            print(name)
+        return EXIT_OK
+    if not args.name:
+        parser.error(f"{args.action}: nom de la personne requis")
+
+    if args.action == "remove":
+        if not store.remove(args.name):
+            print(f"vocanote: voix inconnue: {args.name}", file=sys.stderr)
+            return EXIT_FAILURES
+        return EXIT_OK
+
+    if not args.result or not args.speaker:
+        parser.error("enroll: --result et --speaker sont requis")
+    with open(args.result, 'r', encoding='utf-8') as f:
+        embeddings = json.load(f).get('speaker_embeddings', {})
+    if args.speaker not in embeddings:
+        available = ", ".join(embeddings) or "aucun (relancer transcribe avec --diarize)"
+        print(f"vocanote: locuteur introuvable dans {args.result}: {args.speaker} (disponibles: {available})", file=sys.stderr)
+        return EXIT_FAILURES
+    try:
+        store.enroll(args.name, embeddings[args.speaker])
+    except ValueError as e:
+        print(f"vocanote: {e}", file=sys.stderr)
+        return EXIT_FAILURES
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="vocanote",
+        description="VocaNote - transcription audio, détection des locuteurs et résumé (sans interface)"
+    )
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="messages de progression sur stderr (-vv: débogage)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_output_arguments(subparser):
+        subparser.add_argument("-o", "--output", help="fichier de sortie (défaut: stdout)")
+        subparser.add_argument(
+            "-f", "--format", choices=["auto", "json", "jsonl", "text"], default="auto",
+            help="auto: JSON pour un fichier, JSON Lines pour plusieurs"
+        )
+
+    def add_backend_argument(subparser):
+        subparser.add_argument(
+            "--diarization-backend", choices=DIARIZATION_BACKENDS, default=None,
+            help="pyannote: précis, fast: rapide sur CPU sans modèle (défaut: [Diarization] backend)"
+        )
+
+    def add_transcription_arguments(subparser):
+        subparser.add_argument("-m", "--model", choices=MODEL_SIZES, default="base", help="modèle Whisper (défaut: base)")
+        subparser.add_argument("-l", "--language", default="auto", help="code langue (fr, en...) ou auto")
+        subparser.add_argument("--diarize", action="store_true", help="détecter les locuteurs")
+        subparser.add_argument(
+            "--word-timestamps", action="store_true", default=None,
+            help="horodater chaque mot (défaut: [Transcription] word_timestamps)"
+        )
+        add_backend_argument(subparser)
+
+    transcribe = subparsers.add_parser("transcribe", help="transcrire des fichiers audio")
+    transcribe.add_argument("files", nargs="+")
+    add_transcription_arguments(transcribe)
+    transcribe.add_argument("-j", "--workers", type=int, default=1, help="processus en parallèle (défaut: 1)")
+    add_output_arguments(transcribe)
+    transcribe.set_defaults(handler=cmd_transcribe)
+
+    diarize = subparsers.add_parser("diarize", help="détecter les tours de parole")
+    diarize.add_argument("files", nargs="+")
+    diarize.add_argument("--speakers", type=int, default=None, help="nombre de locuteurs (si connu)")
+    add_backend_argument(diarize)
+    diarize.add_argument("-j", "--workers", type=int, default=1, help="processus en parallèle (défaut: 1)")
+    add_output_arguments(diarize)
+    diarize.set_defaults(handler=cmd_diarize)
+
+    summarize = subparsers.add_parser("summarize", help="résumer un texte ou un résultat JSON de transcribe")
+    summarize.add_argument("files", nargs="+", help="fichiers .txt / .json, ou - pour stdin")
+    add_output_arguments(summarize)
+    summarize.set_defaults(handler=cmd_summarize)
+
+    batch = subparsers.add_parser("batch", help="traiter une série de fichiers ou de dossiers")
+    batch.add_argument("inputs", nargs="+", help="fichiers audio ou dossiers")
+    batch.add_argument("-r", "--recursive", action="store_true", help="parcourir les sous-dossiers")
+    add_transcription_arguments(batch)
+    batch.add_argument("--output-dir", default=None, help="dossier des résultats ([Performance] batch_output_dir)")
+    batch.add_argument("-c", "--concurrency", type=int, default=None, help="travaux simultanés ([Performance] batch_concurrency)")
+    add_output_arguments(batch)
+    batch.set_defaults(handler=cmd_batch)
+
+    serve = subparsers.add_parser("serve", help="service HTTP local (modèles gardés en mémoire)")
+    serve.add_argument("--host", default="127.0.0.1", help="adresse d'écoute (défaut: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="port (défaut: 8765)")
+    serve.add_argument("-j", "--workers", type=int, default=None, help="travaux simultanés ([Server] workers)")
+    serve.add_argument("--preload", action="append", choices=MODEL_SIZES, help="modèle Whisper à charger au démarrage (répétable)")
+    serve.add_argument("--preload-summarizer", action="store_true", help="charger le modèle de résumé au démarrage")
+    serve.add_argument("--preload-diarization", action="store_true", help="charger le modèle de diarisation au démarrage")
+    serve.add_argument("--output-dir", default=None, help="dossier des résultats (défaut: cache de VocaNote)")
+    serve.set_defaults(handler=cmd_serve)
+
+    speakers = subparsers.add_parser("speakers", help="voix connues (nommage automatique des locuteurs)")
+    speakers.add_argument("action", choices=["list", "enroll", "remove"])
+    speakers.add_argument("name", nargs="?", help="nom de la personne (enroll, remove)")
+    speakers.add_argument("--result", help="résultat JSON de transcribe --diarize (enroll)")
+    speakers.add_argument("--speaker", help='locuteur de ce résultat, ex. "Locuteur 2" (enroll)')
+    speakers.set_defaults(handler=cmd_speakers)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    args.log_level = {0: logging.WARNING, 1: logging.INFO}.get(args.verbose, logging.DEBUG)
+    logging.basicConfig(level=args.log_level, format='%(levelname)s - %(message)s', stream=sys.stderr)
+
+    if args.command not in ("summarize", "speakers") and not audio_io.configure_ffmpeg_path():
+        print("vocanote: FFmpeg introuvable (PATH, dossier ffmpeg/ ou imageio-ffmpeg)", file=sys.stderr)
+        return EXIT_FAILURES
+
+    try:
+        return args.handler(args, parser)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    finally:
+        if args.command in ("transcribe", "batch", "serve"):
+            import sharding
+            sharding.shutdown_pool()
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
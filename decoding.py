@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Décodage Whisper pour VocaNote
+- Décodage par lots: plusieurs fenêtres de 30 secondes dans un même tenseur mel (N, n_mels, 3000)
+- Fenêtres glissantes guidées par les tokens timestamp de Whisper (segments fins)
+- Horodatage des mots optionnel, déduit de l'attention croisée enregistrée pendant le décodage
+"""
+
+import logging
+import contextlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import whisper
+import whisper.timing
+
+import settings
+import audio_io
+from model_registry import LoadedModel, get_memory_info
+
+
+# Durée d'une fenêtre Whisper
+WINDOW_SECONDS = whisper.audio.CHUNK_LENGTH
+WINDOW_SAMPLES = whisper.audio.N_SAMPLES
+
+# Mémoire de travail approximative (Mo) par fenêtre décodée, selon le modèle
+# (activations de l'encodeur + cache KV du décodeur)
+_WINDOW_COST_MB = {
+    "tiny": 60,
+    "base": 100,
+    "small": 220,
+    "medium": 500,
+    "large": 900,
+}
+
+MAX_BATCH_SIZE = 16
+
+# Décodage par lots: une zone du fichier par fenêtre du lot, chacune suivie par sa propre
+# position de lecture; les zones sont coupées sur un passage calme (voir SeekTranscriber)
+REGION_SAMPLES = 120 * whisper.audio.SAMPLE_RATE
+BOUNDARY_SEARCH_SAMPLES = 5 * whisper.audio.SAMPLE_RATE
+
+
+class TranscriptionCancelled(Exception):
+    """Transcription arrêtée à la demande de l'utilisateur (entre deux fenêtres)"""
+    pass
+
+
+def auto_batch_size(model_size: str, device: str) -> int:
+    """Choisit la taille de lot selon la mémoire disponible (GPU ou RAM)"""
+    cost = _WINDOW_COST_MB.get(model_size.split(".")[0].split("-")[0], 900) * 1024 ** 2
+
+    if device == "cuda":
+        try:
+            available, _ = torch.cuda.mem_get_info()
+        except Exception:
+            available = 2 * 1024 ** 3
+    else:
+        _, available = get_memory_info()
+
+    # Ne jamais utiliser plus de la moitié de la mémoire libre
+    batch_size = int((available * 0.5) // cost)
+    batch_size = max(1, min(MAX_BATCH_SIZE, batch_size))
+    logging.info(f"[DECODING] Taille de lot auto: {batch_size} ({available // 1024 ** 2} Mo libres, {device})")
+    return batch_size
+
+
+def get_batch_size(model_size: str, device: str) -> int:
+    """Taille de lot configurée ([Performance] decode_batch_size, 0 = automatique)"""
+    batch_size = settings.get_int("Performance", "decode_batch_size", 0)
+    if batch_size > 0:
+        return min(batch_size, MAX_BATCH_SIZE)
+    return auto_batch_size(model_size, device)
+
+
+def log_mel_batch(windows: List[np.ndarray], n_mels: int, device: str) -> torch.Tensor:
+    """Calcule le spectrogramme mel de chaque fenêtre (complétée à 30 s) et les empile"""
+    mels = [
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(window), n_mels=n_mels)
+        for window in windows
+    ]
+    return torch.stack(mels).to(device)
+
+
+def detect_language(loaded_model: LoadedModel, mel: torch.Tensor) -> str:
+    """Détecte la langue sur une fenêtre mel (n_mels, 3000)"""
+    with loaded_model.lock:
+        _, probs = loaded_model.model.detect_language(mel)
+    return max(probs, key=probs.get)
+
+
+# Ponctuation rattachée au mot voisin (valeurs par défaut de whisper.transcribe)
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+
+
+class CrossAttentionRecorder:
+    """
+    Enregistre l'attention croisée des têtes d'alignement du modèle pendant le décodage
+    (les têtes utilisées par whisper.timing), pour horodater les mots sans second passage
+
+    Les poids sont conservés en float16: (N, têtes, positions décodées, trames audio / 2)
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.heads_by_layer = {}
+        for layer, head in model.alignment_heads.indices().T.tolist():
+            self.heads_by_layer.setdefault(layer, []).append(head)
+        self._steps = {layer: [] for layer in self.heads_by_layer}
+        self._hooks = []
+        self._sdpa = None
+
+    def __enter__(self):
+        for layer, heads in self.heads_by_layer.items():
+            hook = self.model.decoder.blocks[layer].cross_attn.register_forward_hook(
+                lambda module, inputs, outputs, layer=layer, heads=heads:
+                    self._steps[layer].append(outputs[-1][:, heads].to(torch.float16))
+            )
+            self._hooks.append(hook)
+        # L'attention "SDPA" ne renvoie pas les poids: calcul explicite pendant l'enregistrement
+        self._sdpa = whisper.model.disable_sdpa()
+        self._sdpa.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+        self._sdpa.__exit__(*exc)
+        return False
+
+    def weights(self) -> torch.Tensor:
+        """Poids enregistrés (N, têtes, positions, trames) sur CPU"""
+        return torch.cat(
+            [torch.cat(self._steps[layer], dim=2) for layer in sorted(self._steps)], dim=1
+        ).cpu()
+
+
+def decode_batch(
+    loaded_model: LoadedModel,
+    mel: torch.Tensor,
+    options: whisper.DecodingOptions,
+    recorder: Optional[CrossAttentionRecorder] = None
+) -> list:
+    """Décode un lot de fenêtres (N, n_mels, 3000) et retourne N DecodingResult"""
+    # Les crochets de l'enregistreur sont posés sous le verrou: le modèle est partagé entre threads
+    with loaded_model.lock, (recorder or contextlib.nullcontext()):
+        results = whisper.decode(loaded_model.model, mel, options)
+    if not isinstance(results, list):
+        results = [results]
+    return results
+
+
+class SeekTranscriber:
+    """
+    Transcription par fenêtres glissantes guidée par les timestamps de Whisper
+
+    Chaque fenêtre de 30 s est découpée en segments selon les paires de tokens
+    timestamp produites par le décodeur. La fenêtre suivante commence au dernier
+    timestamp complet, de sorte qu'un mot coupé en fin de fenêtre est décodé
+    entièrement dans la fenêtre suivante au lieu d'être coupé en deux.
+
+    Avec batch_size > 1, le fichier est découpé en zones d'environ 2 minutes coupées
+    sur un passage calme; chaque fenêtre du lot avance dans sa propre zone avec la même
+    règle (fenêtre suivante au dernier timestamp complet). Les segments sont transmis
+    dans l'ordre chronologique, ceux d'une zone une fois les zones précédentes terminées.
+    Avec un détecteur de parole (vad), les fenêtres de silence sont sautées et chaque
+    fenêtre commence au début de la parole; les timestamps restent ceux du fichier.
+    """
+
+    def __init__(
+        self,
+        loaded_model: LoadedModel,
+        language: Optional[str] = None,
+        batch_size: int = 1,
+        no_speech_threshold: float = 0.6,
+        logprob_threshold: float = -1.0,
+        vad=None,
+        word_timestamps: bool = False
+    ):
+        self.loaded_model = loaded_model
+        self.model = loaded_model.model
+        self.device = loaded_model.device
+        self.language = language
+        self.batch_size = max(1, batch_size)
+        self.no_speech_threshold = no_speech_threshold
+        self.logprob_threshold = logprob_threshold
+        # Détecteur de parole optionnel (vad.VoiceActivityDetector): les fenêtres sans parole ne sont pas décodées
+        self.vad = vad
+        # Horodatage des mots (attention croisée + DTW), stocké dans segment['words']
+        self.word_timestamps = word_timestamps
+
+        # Un token timestamp correspond à 2 trames mel, soit 0.02 s
+        input_stride = whisper.audio.N_FRAMES // self.model.dims.n_audio_ctx
+        self.samples_per_token = input_stride * whisper.audio.HOP_LENGTH
+        self.tokenizer = None
+
+    def _get_tokenizer(self):
+        if self.tokenizer is None:
+            self.tokenizer = whisper.tokenizer.get_tokenizer(
+                self.model.is_multilingual,
+                num_languages=self.model.num_languages,
+                language=self.language,
+                task="transcribe"
+            )
+        return self.tokenizer
+
+    def _make_segment(self, tokens: List[int], start_sample: int, end_sample: int) -> Optional[Dict]:
+        """Crée un segment {'start', 'end', 'text'} à partir des tokens texte"""
+        tokenizer = self._get_tokenizer()
+        text_tokens = [token for token in tokens if token < tokenizer.eot]
+        text = tokenizer.decode(text_tokens).strip()
+        if not text:
+            return None
+        return {
+            'start': round(start_sample / whisper.audio.SAMPLE_RATE, 2),
+            'end': round(max(end_sample, start_sample) / whisper.audio.SAMPLE_RATE, 2),
+            'text': text
+        }
+
+    def split_window(
+        self,
+        result,
+        window_start: int,
+        window_length: int,
+        keep_tail: bool = False,
+        token_ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[List[Dict], int]:
+        """
+        Découpe le résultat d'une fenêtre en segments selon les tokens timestamp
+
+        Args:
+            result: DecodingResult de la fenêtre
+            window_start: Position de la fenêtre dans l'audio (échantillons)
+            window_length: Longueur réelle de la fenêtre (échantillons)
+            keep_tail: Garder le texte après le dernier timestamp complet
+                       (sinon il sera redécodé par la fenêtre suivante)
+            token_ranges: Si fourni, reçoit l'intervalle [début, fin) des tokens de chaque segment
+
+        Returns:
+            (segments, nombre d'échantillons consommés)
+        """
+        tokenizer = self._get_tokenizer()
+        timestamp_begin = tokenizer.timestamp_begin
+        tokens = list(result.tokens)
+        window_end = window_start + window_length
+
+        def position(token: int) -> int:
+            return window_start + (token - timestamp_begin) * self.samples_per_token
+
+        # Fenêtre sans parole: on la saute entièrement
+        if (result.no_speech_prob > self.no_speech_threshold
+                and result.avg_logprob < self.logprob_threshold):
+            return [], window_length
+
+        is_timestamp = [token >= timestamp_begin for token in tokens]
+        single_timestamp_ending = is_timestamp[-2:] == [False, True]
+        consecutive = [
+            i + 1 for i in range(len(tokens) - 1)
+            if is_timestamp[i] and is_timestamp[i + 1]
+        ]
+
+        segments = []
+        if consecutive:
+            slices = list(consecutive)
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+
+            last_slice = 0
+            for current_slice in slices:
+                sliced = tokens[last_slice:current_slice]
+                segment = self._make_segment(sliced, position(sliced[0]), min(position(sliced[-1]), window_end))
+                if segment:
+                    segments.append(segment)
+                    if token_ranges is not None:
+                        token_ranges.append((last_slice, current_slice))
+                last_slice = current_slice
+
+            if single_timestamp_ending:
+                # Un timestamp seul à la fin: plus de parole après, toute la fenêtre est consommée
+                consumed = window_length
+            else:
+                consumed = (tokens[last_slice - 1] - timestamp_begin) * self.samples_per_token
+                # Moins d'une seconde consommée: la fenêtre est de toute façon passée entièrement
+                # (terminaison), le texte après le dernier timestamp est gardé pour ne pas le perdre
+                if (keep_tail or consumed < whisper.audio.SAMPLE_RATE) and last_slice < len(tokens):
+                    tail = self._make_segment(tokens[last_slice:], window_start + consumed, window_end)
+                    if tail:
+                        segments.append(tail)
+                        if token_ranges is not None:
+                            token_ranges.append((last_slice, len(tokens)))
+                    consumed = window_length
+        else:
+            # Pas de paire de timestamps: un seul segment, borné par le dernier timestamp s'il existe
+            end = window_end
+            timestamps = [token for token in tokens if token >= timestamp_begin]
+            if timestamps and timestamps[-1] != timestamp_begin:
+                end = min(position(timestamps[-1]), window_end)
+            segment = self._make_segment(tokens, window_start, end)
+            if segment:
+                segments.append(segment)
+                if token_ranges is not None:
+                    token_ranges.append((0, len(tokens)))
+            consumed = window_length
+
+        # Toujours avancer d'au moins une seconde pour garantir la terminaison
+        if consumed < whisper.audio.SAMPLE_RATE:
+            consumed = window_length
+        return segments, min(consumed, window_length)
+
+    def _word_timings(self, tokens: List[int], attention: torch.Tensor, window_start: int, window_length: int) -> List[Tuple[int, float, float, str]]:
+        """
+        Horodatage des mots d'une fenêtre par DTW sur l'attention croisée enregistrée
+        (même méthode que whisper.timing.find_alignment, sans repasser le décodeur)
+
+        Args:
+            tokens: Tokens décodés de la fenêtre (result.tokens)
+            attention: Poids de la fenêtre (têtes, positions, trames)
+
+        Returns:
+            Liste de (indice du premier token du mot dans tokens, début, fin, mot), temps en secondes
+        """
+        tokenizer = self._get_tokenizer()
+        text_positions = [k for k, token in enumerate(tokens) if token < tokenizer.eot]
+        if not text_positions:
+            return []
+
+        # La position (L - 1) + k de la séquence décodée prédit le token k (L: séquence de départ)
+        offset = len(tokenizer.sot_sequence) - 1
+        rows = [offset + k for k in text_positions]
+        # Ligne de clôture (prédiction de la fin de texte) pour borner le dernier mot
+        rows.append(min(offset + len(tokens), attention.shape[1] - 1))
+
+        num_frames = min(window_length // whisper.audio.HOP_LENGTH, whisper.audio.N_FRAMES)
+        weights = attention[:, rows, : num_frames // 2].float().softmax(dim=-1)
+        std, mean = torch.std_mean(weights, dim=-2, keepdim=True, unbiased=False)
+        weights = (weights - mean) / std
+        weights = whisper.timing.median_filter(weights, 7)
+        text_indices, time_indices = whisper.timing.dtw(-weights.mean(dim=0))
+
+        text_tokens = [tokens[k] for k in text_positions]
+        words, word_tokens = tokenizer.split_to_word_tokens(text_tokens + [tokenizer.eot])
+        if len(word_tokens) <= 1:
+            return []
+        word_boundaries = np.pad(np.cumsum([len(t) for t in word_tokens[:-1]]), (1, 0))
+        jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+        jump_times = time_indices[jumps] / whisper.timing.TOKENS_PER_SECOND
+        offset_seconds = window_start / whisper.audio.SAMPLE_RATE
+
+        alignment = [
+            whisper.timing.WordTiming(word, word_token_list, offset_seconds + start, offset_seconds + end, 1.0)
+            for word, word_token_list, start, end in zip(
+                words[:-1], word_tokens[:-1], jump_times[word_boundaries[:-1]], jump_times[word_boundaries[1:]]
+            )
+        ]
+        # Indice du premier token de chaque mot (retrouvé après la fusion de la ponctuation)
+        first_index = {id(timing): text_positions[i] for timing, i in zip(alignment, word_boundaries[:-1])}
+        whisper.timing.merge_punctuations(alignment, PREPEND_PUNCTUATIONS, APPEND_PUNCTUATIONS)
+
+        return [
+            (first_index[id(timing)], float(timing.start), float(timing.end), timing.word)
+            for timing in alignment
+            if timing.word
+        ]
+
+    def _attach_words(self, segments: List[Dict], token_ranges: List[Tuple[int, int]], words: List[Tuple[int, float, float, str]]):
+        """Range les mots dans leur segment: segment['words'] = [[début, fin, mot], ...]"""
+        for segment, (first, last) in zip(segments, token_ranges):
+            segment['words'] = [
+                [
+                    round(min(max(start, segment['start']), segment['end']), 2),
+                    round(min(max(end, segment['start']), segment['end']), 2),
+                    word
+                ]
+                for index, start, end, word in words
+                if first <= index < last
+            ]
+
+    def transcribe(
+        self,
+        audio,
+        progress_callback: Optional[Callable[[float], None]] = None,
+        status_callback: Optional[Callable[[str], None]] = None,
+        segments_callback: Optional[Callable[[List[Dict]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        checkpoint_callback: Optional[Callable[[Dict], None]] = None,
+        resume: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Transcrit un signal 16 kHz mono
+
+        Args:
+            audio: Signal float32 (np.ndarray) ou source audio_io (ArraySource, StreamingSource)
+            progress_callback: Appelé avec la fraction traitée (0.0 - 1.0) avant chaque lot
+            status_callback: Appelé avec un message d'état (langue détectée...)
+            segments_callback: Appelé avec les nouveaux segments (ordre chronologique) après chaque lot
+            should_stop: Consulté avant chaque lot; True lève TranscriptionCancelled
+            checkpoint_callback: Appelé après chaque lot avec l'état de reprise
+                                 {'seek', 'segments', 'language', 'skipped_samples'}
+            resume: État de reprise précédent (la source doit pouvoir être lue à partir de 'seek')
+
+        Returns:
+            Dictionnaire {'text', 'segments', 'language', 'duration', 'skipped_duration'}
+        """
+        source = audio if hasattr(audio, "read") else audio_io.ArraySource(audio)
+        n_mels = self.model.dims.n_mels
+        seek = 0
+        all_segments = []
+        skipped = 0  # Silence non décodé des zones terminées (échantillons)
+
+        if resume:
+            seek = resume['seek']
+            all_segments = list(resume['segments'])
+            self.language = self.language or resume.get('language')
+            skipped = resume.get('skipped_samples', 0)
+            if segments_callback and all_segments:
+                segments_callback(list(all_segments))
+
+        regions = []  # Zones pas encore entièrement transmises, dans l'ordre du fichier
+        next_start = seek
+        planning = True
+
+        while True:
+            if should_stop and should_stop():
+                raise TranscriptionCancelled()
+
+            # Une zone en cours par fenêtre du lot
+            while planning and sum(not region['done'] for region in regions) < self.batch_size:
+                region = self._plan_region(source, next_start)
+                if region is None:
+                    planning = False
+                    break
+                regions.append(region)
+                if region['end'] is None:
+                    planning = False
+                else:
+                    next_start = region['end']
+
+            if progress_callback and source.total_samples and regions:
+                processed = regions[0]['start'] + sum(region['seek'] - region['start'] for region in regions)
+                progress_callback(min(1.0, processed / source.total_samples))
+
+            # Prochaine fenêtre de chaque zone en cours
+            batch = []
+            for region in regions:
+                if len(batch) == self.batch_size:
+                    break
+                if region['done']:
+                    continue
+                window = self._next_window(source, region, release=region is regions[0])
+                if window is not None:
+                    batch.append((region,) + window)
+
+            if batch:
+                mel = log_mel_batch([window for _, _, window in batch], n_mels, self.device)
+
+                # Détecter la langue si pas spécifiée (une seule fois, sur la première fenêtre)
+                if self.language is None:
+                    self.language = detect_language(self.loaded_model, mel[0])
+                    if status_callback:
+                        status_callback(f"Langue détectée: {self.language}")
+
+                options = whisper.DecodingOptions(
+                    language=self.language,
+                    without_timestamps=False,
+                    fp16=self.loaded_model.fp16
+                )
+                recorder = CrossAttentionRecorder(self.model) if self.word_timestamps else None
+                results = decode_batch(self.loaded_model, mel, options, recorder)
+                attention = recorder.weights() if recorder else None
+
+                for k, ((region, start, window), result) in enumerate(zip(batch, results)):
+                    # Dernière fenêtre d'une zone: elle s'arrête sur un passage calme, tout est gardé
+                    reaches_end = region['end'] is not None and start + len(window) >= region['end']
+                    token_ranges = [] if attention is not None else None
+                    segments, consumed = self.split_window(
+                        result, start, len(window), keep_tail=reaches_end, token_ranges=token_ranges
+                    )
+                    if attention is not None and segments:
+                        words = self._word_timings(result.tokens, attention[k], start, len(window))
+                        self._attach_words(segments, token_ranges, words)
+                    region['segments'].extend(segments)
+                    if reaches_end:
+                        region['seek'] = region['end']
+                        region['done'] = True
+                    else:
+                        region['seek'] = start + consumed
+
+            # Transmettre dans l'ordre: la première zone au fil de l'eau, les suivantes une fois atteintes
+            new_segments = []
+            while regions:
+                region = regions[0]
+                new_segments.extend(region['segments'][region['emitted']:])
+                region['emitted'] = len(region['segments'])
+                if not region['done']:
+                    break
+                skipped += region['skipped']
+                seek = region['seek']
+                regions.pop(0)
+            all_segments.extend(new_segments)
+            if segments_callback and new_segments:
+                segments_callback(new_segments)
+
+            if regions:
+                seek = regions[0]['seek']
+            source.release(seek)
+
+            if checkpoint_callback and batch:
+                checkpoint_callback({
+                    'seek': seek,
+                    'segments': all_segments,
+                    'language': self.language,
+                    'skipped_samples': skipped + (regions[0]['skipped'] if regions else 0)
+                })
+
+            if not batch and not planning and not regions:
+                break
+
+        if progress_callback:
+            progress_callback(1.0)
+
+        return {
+            'text': " ".join(segment['text'] for segment in all_segments),
+            'segments': all_segments,
+            'language': self.language,
+            'duration': (source.total_samples or seek) / whisper.audio.SAMPLE_RATE,
+            'skipped_duration': round(skipped / whisper.audio.SAMPLE_RATE, 2)
+        }
+
+    def _plan_region(self, source, start: int) -> Optional[Dict]:
+        """
+        Zone suivante à partir de start (None si la source est épuisée)
+        Avec batch_size > 1: environ REGION_SAMPLES, fin placée sur le passage le plus calme;
+        sinon (ou en fin de fichier) la zone va jusqu'à la fin du flux (fin None)
+        """
+        if len(source.read(start, 1)) == 0:
+            return None
+        end = None
+        if self.batch_size > 1:
+            search_start = start + REGION_SAMPLES - BOUNDARY_SEARCH_SAMPLES
+            around = source.read(search_start, 2 * BOUNDARY_SEARCH_SAMPLES)
+            if len(around) == 2 * BOUNDARY_SEARCH_SAMPLES:
+                end = search_start + audio_io.quietest_position(around)
+        return {
+            'start': start, 'end': end, 'seek': start, 'done': False,
+            'segments': [], 'emitted': 0, 'skipped': 0
+        }
+
+    def _next_window(self, source, region: Dict, release: bool = False) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Prochaine fenêtre (début, signal) d'une zone, None si la zone est terminée
+        Les fenêtres de silence sont sautées (release: libérer la source au fil des sauts)
+        """
+        position = region['seek']
+        while True:
+            length = WINDOW_SAMPLES if region['end'] is None else min(WINDOW_SAMPLES, region['end'] - position)
+            window = source.read(position, length) if length > 0 else np.zeros(0, dtype=np.float32)
+            if len(window) == 0:
+                region['seek'] = position
+                region['done'] = True
+                return None
+            if self.vad is None:
+                break
+            first_speech = self.vad.first_speech(window)
+            if first_speech is None:
+                # Fenêtre de silence: pas de décodage (évite aussi les hallucinations)
+                region['skipped'] += len(window)
+                position += len(window)
+                if release:
+                    source.release(position)
+                continue
+            if first_speech > 0:
+                # Commencer la fenêtre au début de la parole
+                region['skipped'] += first_speech
+                position += first_speech
+                length = WINDOW_SAMPLES if region['end'] is None else min(WINDOW_SAMPLES, region['end'] - position)
+                window = source.read(position, length)
+            break
+        region['seek'] = position
+        return position, window
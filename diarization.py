@@ -6,12 +6,25 @@ Détecte et identifie les différents locuteurs dans un enregistrement audio
 """
 
 import os
+import gc
 import sys
+import copy
+import heapq
+import importlib
+import importlib.metadata
 import warnings
-from typing import Dict, List, Tuple, Optional
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional
+import numpy as np
 import torch
-import tempfile
-import subprocess
+
+import settings
+import audio_io
+import audio_cache
+import diarization_chunks
+import speaker_enrollment
 
 # Supprimer les avertissements
 warnings.filterwarnings("ignore")
@@ -19,6 +32,29 @@ warnings.filterwarnings("ignore")
 import logging
 
 
+PIPELINE_NAME = "pyannote/speaker-diarization-3.0"
+
+UNKNOWN_SPEAKER = "Locuteur inconnu"
+
+# Pipeline partagé (voir get_pipeline)
+_pipeline_instance = None
+_pipeline_device = None
+_pipeline_lock = threading.Lock()
+# Un seul appel du pipeline à la fois (pyannote n'est pas prévu pour des appels concurrents)
+_inference_lock = threading.Lock()
+_preload_thread = None
+
+
+class DiarizationCancelled(Exception):
+    """Diarisation arrêtée à la demande de l'appelant (entre deux étapes ou deux morceaux)"""
+    pass
+
+
+def _check_stop(should_stop: Optional[Callable[[], bool]]):
+    if should_stop is not None and should_stop():
+        raise DiarizationCancelled()
+
+
 def get_base_path() -> str:
     """Retourne le chemin de base de l'application (compatible PyInstaller)"""
     if getattr(sys, 'frozen', False):
@@ -32,245 +68,348 @@ def get_base_path() -> str:
     return base
 
 
-def convert_to_wav_if_needed(audio_file: str) -> str:
+def _get_token_from_config() -> Optional[str]:
     """
-    Convertit un fichier audio en WAV 16kHz mono si nécessaire
-    pour assurer la compatibilité avec pyannote.audio
-    
-    Returns:
-        Chemin vers le fichier WAV (original ou converti)
+    Récupère le token HuggingFace depuis le fichier hf_token.txt
     """
-    # Si c'est déjà un WAV, on tente quand même la conversion pour s'assurer du format
-    ext = os.path.splitext(audio_file)[1].lower()
+    base_path = get_base_path()
     
-    try:
-        import shutil
-        ffmpeg_path = shutil.which("ffmpeg")
-        
-        if ffmpeg_path:
-            # Créer un fichier temporaire
-            temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_wav.close()
-            
-            # Convertir avec ffmpeg (16kHz mono, format standard)
-            cmd = [
-                ffmpeg_path,
-                '-y',  # Overwrite
-                '-i', audio_file,
-                '-ar', '16000',  # Sample rate 16kHz
-                '-ac', '1',  # Mono
-                '-acodec', 'pcm_s16le',  # PCM 16-bit
-                temp_wav.name
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                logging.info(f"Audio converti en WAV: {temp_wav.name}")
-                return temp_wav.name
-            else:
-                logging.warning(f"Conversion ffmpeg échouée: {result.stderr}")
-                return audio_file
+    # Chercher dans plusieurs emplacements possibles
+    possible_paths = [
+        os.path.join(base_path, "hf_token.txt"),
+        os.path.join(os.path.dirname(sys.executable), "hf_token.txt") if getattr(sys, 'frozen', False) else None,
+        os.path.join(os.getcwd(), "hf_token.txt"),
+    ]
+    
+    for token_file in possible_paths:
+        if token_file and os.path.exists(token_file):
+            logging.info(f"[DIARIZATION] Token trouvé: {token_file}")
+            try:
+                with open(token_file, 'r') as f:
+                    token = f.read().strip()
+                    if token:
+                        logging.info(f"[DIARIZATION] Token chargé (longueur: {len(token)})")
+                        return token
+            except Exception as e:
+                logging.error(f"[DIARIZATION] Erreur lecture token: {e}")
         else:
-            return audio_file
-            
-    except Exception as e:
-        logging.warning(f"Erreur conversion audio: {e}")
-        return audio_file
+            logging.debug(f"[DIARIZATION] Token non trouvé: {token_file}")
+    
+    logging.warning("[DIARIZATION] Aucun token HuggingFace trouvé!")
+    return None
 
 
-class SpeakerDiarization:
+def _load_pipeline(device: str):
     """
-    Classe pour effectuer la diarisation des locuteurs
-    Utilise pyannote.audio pour détecter qui parle quand
+    Charge le pipeline pyannote (None en cas d'échec)
     """
+    logging.info("[DIARIZATION] === Chargement du modèle de diarisation ===")
+    logging.info(f"[DIARIZATION] Device: {device}")
+    logging.info(f"[DIARIZATION] CWD: {os.getcwd()}")
+    logging.info(f"[DIARIZATION] sys.executable: {sys.executable}")
     
-    def __init__(self):
-        """Initialise le modèle de diarisation"""
-        self.pipeline = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logging.info(f"Diarisation init: Device={self.device}")
-    
-    def _get_token_from_config(self) -> Optional[str]:
-        """
-        Récupère le token HuggingFace depuis le fichier hf_token.txt
-        """
-        base_path = get_base_path()
+    try:
+        logging.info("[DIARIZATION] Import pyannote.audio...")
+        from pyannote.audio import Pipeline
+        logging.info("[DIARIZATION] Import pyannote.audio OK")
         
-        # Chercher dans plusieurs emplacements possibles
-        possible_paths = [
-            os.path.join(base_path, "hf_token.txt"),
-            os.path.join(os.path.dirname(sys.executable), "hf_token.txt") if getattr(sys, 'frozen', False) else None,
-            os.path.join(os.getcwd(), "hf_token.txt"),
-        ]
+        # Charger le pipeline de diarisation
+        # Token HuggingFace: via variable d'environnement ou fichier config
+        hf_token = os.environ.get("HF_TOKEN") or _get_token_from_config()
         
-        for token_file in possible_paths:
-            if token_file and os.path.exists(token_file):
-                logging.info(f"[DIARIZATION] Token trouvé: {token_file}")
-                try:
-                    with open(token_file, 'r') as f:
-                        token = f.read().strip()
-                        if token:
-                            logging.info(f"[DIARIZATION] Token chargé (longueur: {len(token)})")
-                            return token
-                except Exception as e:
-                    logging.error(f"[DIARIZATION] Erreur lecture token: {e}")
-            else:
-                logging.debug(f"[DIARIZATION] Token non trouvé: {token_file}")
+        if not hf_token:
+            logging.error("[DIARIZATION] ERREUR: Pas de token HuggingFace!")
+            return None
         
-        logging.warning("[DIARIZATION] Aucun token HuggingFace trouvé!")
-        return None
+        logging.info("[DIARIZATION] Téléchargement/chargement du pipeline...")
+        pipeline = Pipeline.from_pretrained(
+            PIPELINE_NAME,
+            token=hf_token  # Nouveau nom du paramètre (anciennement use_auth_token)
+        )
+        logging.info("[DIARIZATION] Pipeline chargé!")
         
-    def load_model(self):
-        """
-        Charge le modèle de diarisation
-        """
-        logging.info("[DIARIZATION] === Chargement du modèle de diarisation ===")
-        logging.info(f"[DIARIZATION] Device: {self.device}")
-        logging.info(f"[DIARIZATION] CWD: {os.getcwd()}")
-        logging.info(f"[DIARIZATION] sys.executable: {sys.executable}")
+        # Déplacer sur GPU si disponible
+        if device == "cuda":
+            logging.info("[DIARIZATION] Déplacement sur GPU...")
+            pipeline.to(torch.device("cuda"))
+        
+        logging.info("[DIARIZATION] === Modèle chargé avec succès ===")
+        return pipeline
         
+    except ImportError as e:
+        logging.error(f"[DIARIZATION] ERREUR IMPORT: {e}")
+        import traceback
+        logging.error(traceback.format_exc())
+    except Exception as e:
+        logging.error(f"[DIARIZATION] ERREUR: {e}")
+        import traceback
+        logging.error(traceback.format_exc())
+    return None
+
+
+def get_pipeline(device: Optional[str] = None):
+    """
+    Pipeline pyannote partagé par tout le processus, créé au premier appel
+    Les appels concurrents attendent le même chargement (None si le chargement échoue)
+    """
+    global _pipeline_instance, _pipeline_device
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    with _pipeline_lock:
+        if _pipeline_instance is None or _pipeline_device != device:
+            _pipeline_instance = _load_pipeline(device)
+            _pipeline_device = device if _pipeline_instance is not None else None
+        return _pipeline_instance
+
+
+def is_pipeline_loaded() -> bool:
+    return _pipeline_instance is not None
+
+
+def preload_pipeline() -> threading.Thread:
+    """Charge le pipeline en arrière-plan (case de diarisation cochée, démarrage du service)"""
+    global _preload_thread
+    with _pipeline_lock:
+        if _preload_thread is None or not _preload_thread.is_alive():
+            _preload_thread = threading.Thread(target=get_pipeline, name="vocanote-diarization-preload", daemon=True)
+            _preload_thread.start()
+        return _preload_thread
+
+
+def unload_pipeline():
+    """Libère le pipeline (les diarisations en cours gardent leur référence jusqu'à la fin)"""
+    global _pipeline_instance, _pipeline_device
+    with _pipeline_lock:
+        if _pipeline_instance is None:
+            return
+        device = _pipeline_device
+        _pipeline_instance = None
+        _pipeline_device = None
+    gc.collect()
+    if device == "cuda":
+        torch.cuda.empty_cache()
+    logging.info("[DIARIZATION] Pipeline déchargé")
+
+
+def assign_speakers(segments: List[Dict], turns: List[Dict]) -> List[str]:
+    """
+    Locuteur de chaque segment: le tour de parole de plus grand chevauchement,
+    s'il couvre plus de la moitié du segment (sinon UNKNOWN_SPEAKER)
+    
+    Balayage des intervalles triés: seuls les tours actifs (commencés avant la fin
+    du segment et pas encore terminés) sont comparés, O((N + M) log M) au lieu de N x M.
+    À chevauchement égal, le premier tour de la liste l'emporte (comme _find_speaker_for_segment).
+    """
+    speakers = [UNKNOWN_SPEAKER] * len(segments)
+    if not segments or not turns:
+        return speakers
+    
+    seg_starts = np.array([seg.get('start', 0) for seg in segments], dtype=np.float64)
+    seg_ends = np.array([seg.get('end', 0) for seg in segments], dtype=np.float64)
+    turn_starts = np.array([turn['start'] for turn in turns], dtype=np.float64)
+    turn_ends = np.array([turn['end'] for turn in turns], dtype=np.float64)
+    
+    # Balayage: paires (segment, tour) qui se recouvrent
+    turn_order = np.argsort(turn_starts, kind='stable').tolist()
+    sorted_turn_starts = turn_starts[turn_order].tolist()
+    turn_ends_list = turn_ends.tolist()
+    active = []  # tas (fin, indice du tour)
+    next_turn = 0
+    pair_segments = []
+    pair_turns = []
+    for i in np.argsort(seg_starts, kind='stable').tolist():
+        start, end = seg_starts[i], seg_ends[i]
+        while next_turn < len(turn_order) and sorted_turn_starts[next_turn] < end:
+            j = turn_order[next_turn]
+            heapq.heappush(active, (turn_ends_list[j], j))
+            next_turn += 1
+        # Les segments suivants commencent plus tard: les tours terminés ne servent plus
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        pair_segments.extend([i] * len(active))
+        pair_turns.extend(j for _, j in active)
+    
+    if not pair_segments:
+        return speakers
+    
+    # Chevauchements calculés en une fois
+    pair_segments = np.array(pair_segments, dtype=np.int64)
+    pair_turns = np.array(pair_turns, dtype=np.int64)
+    overlaps = (
+        np.minimum(seg_ends[pair_segments], turn_ends[pair_turns])
+        - np.maximum(seg_starts[pair_segments], turn_starts[pair_turns])
+    )
+    keep = overlaps > 0
+    pair_segments, pair_turns, overlaps = pair_segments[keep], pair_turns[keep], overlaps[keep]
+    
+    # Meilleur tour de chaque segment: tri (segment, chevauchement décroissant, rang du tour)
+    order = np.lexsort((pair_turns, -overlaps, pair_segments))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_segments[order][1:] != pair_segments[order][:-1]
+    best = order[first]
+    
+    durations = seg_ends[pair_segments[best]] - seg_starts[pair_segments[best]]
+    for i, j, overlap, duration in zip(
+        pair_segments[best].tolist(), pair_turns[best].tolist(), overlaps[best].tolist(), durations.tolist()
+    ):
+        if overlap > duration * 0.5:
+            speakers[i] = turns[j]['speaker']
+    return speakers
+
+
+def _run_pipeline(pipeline, file_input, params: Dict, return_embeddings: bool = False):
+    """
+    Appelle le pipeline et retourne (annotation, empreintes des locuteurs ou None)
+    Compatible avec DiarizeOutput (pyannote 4) et (annotation, empreintes) (pyannote 3.x)
+    Les empreintes suivent l'ordre de annotation.labels()
+    """
+    if return_embeddings:
         try:
-            logging.info("[DIARIZATION] Import pyannote.audio...")
-            from pyannote.audio import Pipeline
-            logging.info("[DIARIZATION] Import pyannote.audio OK")
-            
-            # Charger le pipeline de diarisation
-            # Token HuggingFace: via variable d'environnement ou fichier config
-            hf_token = os.environ.get("HF_TOKEN") or self._get_token_from_config()
-            
-            if not hf_token:
-                logging.error("[DIARIZATION] ERREUR: Pas de token HuggingFace!")
-                return False
-            
-            logging.info("[DIARIZATION] Téléchargement/chargement du pipeline...")
-            self.pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.0",
-                token=hf_token  # Nouveau nom du paramètre (anciennement use_auth_token)
-            )
-            logging.info("[DIARIZATION] Pipeline chargé!")
-            
-            # Déplacer sur GPU si disponible
-            if self.device == "cuda":
-                logging.info("[DIARIZATION] Déplacement sur GPU...")
-                self.pipeline.to(torch.device("cuda"))
-            
-            logging.info("[DIARIZATION] === Modèle chargé avec succès ===")
-            return True
-            
-        except ImportError as e:
-            logging.error(f"[DIARIZATION] ERREUR IMPORT: {e}")
-            import traceback
-            logging.error(traceback.format_exc())
+            output = pipeline(file_input, return_embeddings=True, **params)
+        except TypeError:
+            # Version qui renvoie toujours les empreintes (ou ne sait pas les renvoyer)
+            output = pipeline(file_input, **params)
+    else:
+        output = pipeline(file_input, **params)
+    
+    embeddings = None
+    if hasattr(output, 'speaker_diarization'):
+        # Extraire l'annotation depuis DiarizeOutput (nouvelle API pyannote)
+        annotation = output.speaker_diarization
+        embeddings = getattr(output, 'speaker_embeddings', None)
+    elif isinstance(output, tuple):
+        annotation, embeddings = output
+    else:
+        # Ancienne API : diarization est directement une Annotation
+        annotation = output
+    return annotation, embeddings
+
+
+def _rename_speakers(turns: List[Dict], embeddings: Optional[Dict] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Remplace les étiquettes par "Locuteur N" dans l'ordre d'apparition,
+    ou par le nom de la personne quand sa voix est reconnue (voix enregistrées)
+    
+    Args:
+        embeddings: Empreinte (centroïde) de chaque étiquette, si disponible
+    
+    Returns:
+        (tours renommés, {nouveau nom: empreinte})
+    """
+    known = {}
+    if embeddings:
+        try:
+            store = speaker_enrollment.get_speaker_store()
+            if not store.is_empty():
+                known = store.rename(embeddings)
+                if known:
+                    logging.info(f"[DIARIZATION] Voix reconnues: {', '.join(sorted(known.values()))}")
         except Exception as e:
-            logging.error(f"[DIARIZATION] ERREUR: {e}")
-            import traceback
-            logging.error(traceback.format_exc())
-            return False
+            logging.warning(f"[DIARIZATION] Reconnaissance des voix impossible: {e}")
+    
+    speaker_mapping = {}
+    counter = 1
+    for turn in turns:
+        if turn['speaker'] not in speaker_mapping:
+            if turn['speaker'] in known:
+                speaker_mapping[turn['speaker']] = known[turn['speaker']]
+            else:
+                speaker_mapping[turn['speaker']] = f"Locuteur {counter}"
+                counter += 1
+        turn['speaker'] = speaker_mapping[turn['speaker']]
+    
+    renamed_embeddings = {
+        speaker_mapping[label]: np.asarray(embedding, dtype=np.float32)
+        for label, embedding in (embeddings or {}).items()
+        if label in speaker_mapping
+    }
+    return turns, renamed_embeddings
+
+
+def _segment_words(segment: Dict) -> List[Dict]:
+    """
+    Mots d'un segment avec leurs temps: horodatage de Whisper (segment['words']) si présent,
+    sinon durée du segment répartie proportionnellement au nombre de caractères
+    """
+    words = segment.get('words')
+    if words:
+        return [{'start': start, 'end': end, 'text': word} for start, end, word in words]
+    
+    tokens = segment.get('text', '').split()
+    if not tokens:
+        return []
+    start = segment.get('start', 0)
+    end = segment.get('end', 0)
+    weights = np.array([len(token) + 1 for token in tokens], dtype=np.float64)
+    bounds = start + (end - start) * np.concatenate([[0.0], np.cumsum(weights)]) / weights.sum()
+    return [
+        {'start': float(word_start), 'end': float(word_end), 'text': " " + token}
+        for token, word_start, word_end in zip(tokens, bounds[:-1], bounds[1:])
+    ]
+
+
+def _fill_unknown(speakers: List[str]) -> List[str]:
+    """Mots sans locuteur (pause, mot très court): rattachés au mot précédent, ou au suivant en début de segment"""
+    known = [speaker for speaker in speakers if speaker != UNKNOWN_SPEAKER]
+    if not known:
+        return speakers
+    filled = []
+    current = known[0]
+    for speaker in speakers:
+        if speaker != UNKNOWN_SPEAKER:
+            current = speaker
+        filled.append(current)
+    return filled
+
+
+class DiarizationBackend(ABC):
+    """
+    Interface des moteurs de diarisation (voir BACKENDS et create_diarizer)
+    
+    Un moteur implémente load_model() et diarize(); la fusion avec la transcription
+    et la mise en forme sont communes à tous les moteurs.
+    """
     
-    def diarize(self, audio_file: str, num_speakers: Optional[int] = None) -> List[Dict]:
+    name = ""
+    
+    def __init__(self):
+        self.speaker_embeddings = {}  # Empreinte de chaque locuteur de la dernière diarisation (enregistrement des voix)
+    
+    @abstractmethod
+    def load_model(self) -> bool:
+        """Prépare le moteur (True si utilisable)"""
+    
+    @abstractmethod
+    def diarize(
+        self,
+        audio_file: str,
+        num_speakers: Optional[int] = None,
+        waveform: Optional[np.ndarray] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[Dict]:
         """
-        Effectue la diarisation sur un fichier audio
+        Tours de parole [{'start', 'end', 'speaker'}], locuteurs nommés "Locuteur N"
+        (ou nom reconnu, voir speaker_enrollment)
+        should_stop() est consulté entre deux étapes (DiarizationCancelled si arrêt demandé)
         """
-        logging.info(f"Diarisation: Début de l'analyse sur {audio_file}")
-        
-        if self.pipeline is None:
-            if not self.load_model():
-                logging.error("Diarisation: Impossible de charger le modèle, abandon.")
-                return []
-        
-        # Convertir le fichier audio en WAV compatible
-        converted_file = convert_to_wav_if_needed(audio_file)
-        temp_file_created = (converted_file != audio_file)
-        
-        try:
-            # Paramètres de diarisation
-            params = {}
-            if num_speakers is not None:
-                params['num_speakers'] = num_speakers
-            
-            # Charger l'audio avec scipy/soundfile comme fallback
-            try:
-                import scipy.io.wavfile as wav
-                import numpy as np
-                
-                sample_rate, audio_data = wav.read(converted_file)
-                
-                # Convertir en float32 normalisé
-                if audio_data.dtype == np.int16:
-                    audio_data = audio_data.astype(np.float32) / 32768.0
-                elif audio_data.dtype == np.int32:
-                    audio_data = audio_data.astype(np.float32) / 2147483648.0
-                
-                # Convertir en mono si stéréo
-                if len(audio_data.shape) > 1:
-                    audio_data = np.mean(audio_data, axis=1)
-                
-                # Créer un tenseur pour pyannote
-                waveform = torch.from_numpy(audio_data).unsqueeze(0)
-                
-                # Créer le dictionnaire d'entrée pour pyannote
-                file_input = {
-                    "waveform": waveform,
-                    "sample_rate": sample_rate
-                }
-                
-                logging.info(f"Audio chargé: {sample_rate}Hz, {len(audio_data)} samples")
-                
-                # Effectuer la diarisation avec le waveform
-                diarization = self.pipeline(file_input, **params)
-                
-            except Exception as wav_error:
-                logging.warning(f"Fallback scipy échoué: {wav_error}, essai direct...")
-                # Fallback: essayer directement avec le chemin du fichier
-                diarization = self.pipeline(converted_file, **params)
-            
-            # Extraire l'annotation depuis DiarizeOutput (nouvelle API pyannote 3.x)
-            if hasattr(diarization, 'speaker_diarization'):
-                annotation = diarization.speaker_diarization
-            else:
-                # Ancienne API : diarization est directement une Annotation
-                annotation = diarization
-            
-            # Convertir en format utilisable
-            segments = []
-            speaker_mapping = {}
-            speaker_counter = 1
-            
-            for turn, _, speaker in annotation.itertracks(yield_label=True):
-                # Créer un mapping des labels de locuteurs
-                if speaker not in speaker_mapping:
-                    speaker_mapping[speaker] = f"Locuteur {speaker_counter}"
-                    speaker_counter += 1
-                
-                segments.append({
-                    'start': turn.start,
-                    'end': turn.end,
-                    'speaker': speaker_mapping[speaker]
-                })
-            
-            logging.info(f"Diarisation: {len(segments)} segments détectés")
-            return segments
-            
-        except Exception as e:
-            logging.error(f"Diarisation RUNTIME ERROR: {e}")
-            import traceback
-            logging.error(traceback.format_exc())
-            return []
-        
-        finally:
-            # Nettoyer le fichier temporaire si créé
-            if temp_file_created and os.path.exists(converted_file):
-                try:
-                    os.remove(converted_file)
-                    logging.debug(f"Fichier temporaire supprimé: {converted_file}")
-                except:
-                    pass
+    
+    def cache_params(self) -> Dict:
+        """Version et paramètres qui déterminent les tours de parole (clé du cache, voir diarization_cache)"""
+        return {}
+    
+    def restore(self, turns: List[Dict], embeddings: Dict) -> List[Dict]:
+        """Tours de parole relus du cache: les voix enregistrées depuis sont reconnues"""
+        if not embeddings:
+            # Locuteurs sans empreinte (moteur rapide, diarisation par canal): noms inchangés
+            self.speaker_embeddings = {}
+            return turns
+        segments, self.speaker_embeddings = _rename_speakers(turns, embeddings)
+        return segments
     
     def merge_with_transcription(
         self, 
         transcription_segments: List[Dict], 
-        diarization_segments: List[Dict]
+        diarization_segments: List[Dict],
+        split_at_turns: bool = True
     ) -> List[Dict]:
         """
         Fusionne les segments de transcription avec les informations de locuteur
@@ -278,33 +417,90 @@ class SpeakerDiarization:
         Args:
             transcription_segments: Segments de Whisper avec texte et timestamps
             diarization_segments: Segments de diarisation avec locuteurs
+            split_at_turns: Couper les segments aux changements de locuteur (mot par mot)
+                            au lieu d'attribuer un seul locuteur par segment
             
         Returns:
             Segments fusionnés avec texte et locuteur
         """
         merged = []
         
-        for trans_seg in transcription_segments:
-            trans_start = trans_seg.get('start', 0)
-            trans_end = trans_seg.get('end', 0)
-            trans_text = trans_seg.get('text', '')
-            
-            # Trouver le locuteur correspondant
-            speaker = self._find_speaker_for_segment(
-                trans_start, 
-                trans_end, 
-                diarization_segments
-            )
-            
-            merged.append({
-                'start': trans_start,
-                'end': trans_end,
-                'text': trans_text,
-                'speaker': speaker
-            })
+        # Locuteurs de tous les segments en un seul balayage (même critère que _find_speaker_for_segment)
+        speakers = assign_speakers(transcription_segments, diarization_segments)
+        
+        if not split_at_turns:
+            for trans_seg, speaker in zip(transcription_segments, speakers):
+                merged.append({
+                    'start': trans_seg.get('start', 0),
+                    'end': trans_seg.get('end', 0),
+                    'text': trans_seg.get('text', ''),
+                    'speaker': speaker
+                })
+            return merged
+        
+        # Locuteur de chaque mot (tous les segments en un seul balayage)
+        segment_words = [_segment_words(trans_seg) for trans_seg in transcription_segments]
+        word_speakers = assign_speakers(
+            [word for words in segment_words for word in words],
+            diarization_segments
+        )
+        
+        position = 0
+        for trans_seg, segment_speaker, words in zip(transcription_segments, speakers, segment_words):
+            speakers_of_words = _fill_unknown(word_speakers[position:position + len(words)])
+            position += len(words)
+            merged.extend(self._split_segment(trans_seg, segment_speaker, words, speakers_of_words))
         
         return merged
     
+    def _split_segment(
+        self,
+        trans_seg: Dict,
+        segment_speaker: str,
+        words: List[Dict],
+        word_speakers: List[str]
+    ) -> List[Dict]:
+        """
+        Découpe un segment en tours de parole (mots consécutifs du même locuteur)
+        Un segment d'un seul locuteur est conservé tel quel
+        """
+        start = trans_seg.get('start', 0)
+        end = trans_seg.get('end', 0)
+        
+        # Groupes de mots consécutifs du même locuteur: [locuteur, premier mot, dernier mot + 1]
+        runs = []
+        for k, speaker in enumerate(word_speakers):
+            if runs and runs[-1][0] == speaker:
+                runs[-1][2] = k + 1
+            else:
+                runs.append([speaker, k, k + 1])
+        
+        if len(runs) <= 1:
+            speaker = runs[0][0] if runs and runs[0][0] != UNKNOWN_SPEAKER else segment_speaker
+            segment = {
+                'start': start,
+                'end': end,
+                'text': trans_seg.get('text', ''),
+                'speaker': speaker
+            }
+            if 'words' in trans_seg:
+                segment['words'] = trans_seg['words']
+            return [segment]
+        
+        pieces = []
+        for index, (speaker, first, last) in enumerate(runs):
+            piece = {
+                # Le premier et le dernier morceau gardent les bornes du segment
+                'start': start if index == 0 else round(words[first]['start'], 2),
+                'end': end if index == len(runs) - 1 else round(words[last - 1]['end'], 2),
+                'text': "".join(word['text'] for word in words[first:last]).strip(),
+                'speaker': speaker
+            }
+            if 'words' in trans_seg:
+                piece['words'] = trans_seg['words'][first:last]
+            pieces.append(piece)
+        return pieces
+    
     def _find_speaker_for_segment(
         self, 
         start: float, 
@@ -314,9 +510,10 @@ class SpeakerDiarization:
         """
         Trouve le locuteur principal pour un segment donné
         Utilise le critère de chevauchement maximal
+        (parcourt tous les tours de parole: pour de nombreux segments, voir assign_speakers)
         """
         max_overlap = 0
-        best_speaker = "Locuteur inconnu"
+        best_speaker = UNKNOWN_SPEAKER
         
         segment_duration = end - start
         
@@ -335,7 +532,7 @@ class SpeakerDiarization:
         if max_overlap > segment_duration * 0.5:
             return best_speaker
         else:
-            return "Locuteur inconnu"
+            return UNKNOWN_SPEAKER
     
     def format_segments_for_display(self, segments: List[Dict]) -> str:
         """
@@ -404,6 +601,265 @@ class SpeakerDiarization:
         return f"{minutes:02d}:{secs:02d}"
 
 
+class SpeakerDiarization(DiarizationBackend):
+    """
+    Classe pour effectuer la diarisation des locuteurs
+    Utilise pyannote.audio pour détecter qui parle quand
+    """
+    
+    name = "pyannote"
+    
+    def __init__(self):
+        """Initialise le modèle de diarisation"""
+        super().__init__()
+        self.pipeline = None
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        logging.info(f"Diarisation init: Device={self.device}")
+    
+    def load_model(self):
+        """
+        Charge le modèle de diarisation (pipeline partagé, chargé une seule fois par processus)
+        """
+        self.pipeline = get_pipeline(self.device)
+        return self.pipeline is not None
+    
+    def cache_params(self) -> Dict:
+        try:
+            version = importlib.metadata.version("pyannote.audio")
+        except Exception:
+            version = None
+        return {
+            'pipeline': PIPELINE_NAME,
+            'pyannote': version,
+            'chunk_minutes': settings.get_float("Performance", "diarization_chunk_minutes", 30.0),
+            'chunk_overlap': settings.get_float("Performance", "diarization_chunk_overlap", 30.0),
+            'link_threshold': settings.get_float("Performance", "diarization_link_threshold", 0.7),
+        }
+    
+    def diarize(
+        self,
+        audio_file: str,
+        num_speakers: Optional[int] = None,
+        waveform: Optional[np.ndarray] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[Dict]:
+        """
+        Effectue la diarisation sur un fichier audio
+        
+        Args:
+            audio_file: Chemin du fichier audio
+            num_speakers: Nombre de locuteurs (si connu)
+            waveform: Signal 16 kHz mono déjà décodé (vue du cache audio), sinon décodé ici
+            should_stop: Arrêt demandé, consulté avant le pipeline et entre deux morceaux
+        
+        Raises:
+            DiarizationCancelled: arrêt demandé par should_stop
+        """
+        logging.info(f"Diarisation: Début de l'analyse sur {audio_file}")
+        
+        if self.pipeline is None:
+            if not self.load_model():
+                logging.error("Diarisation: Impossible de charger le modèle, abandon.")
+                return []
+        
+        try:
+            # Paramètres de diarisation
+            params = {}
+            if num_speakers is not None:
+                params['num_speakers'] = num_speakers
+            
+            # Signal décodé par ffmpeg (cache audio partagé avec la transcription, sans WAV temporaire)
+            file_input = None
+            try:
+                if waveform is None:
+                    if audio_cache.is_audio_cache_enabled():
+                        waveform = audio_cache.get_audio_cache().load(audio_file)
+                    else:
+                        waveform = audio_io.load_audio(audio_file)
+                
+                # Créer un tenseur pour pyannote (vue du signal, sans copie)
+                file_input = {
+                    "waveform": torch.from_numpy(waveform).unsqueeze(0),
+                    "sample_rate": audio_io.SAMPLE_RATE
+                }
+                
+                logging.info(f"Audio chargé: {audio_io.SAMPLE_RATE}Hz, {len(waveform)} samples")
+            except Exception as wav_error:
+                logging.warning(f"Décodage audio échoué: {wav_error}, essai direct...")
+            
+            _check_stop(should_stop)
+            if file_input is None:
+                # Fallback: essayer directement avec le chemin du fichier
+                with _inference_lock:
+                    annotation, embeddings = _run_pipeline(self.pipeline, audio_file, params, return_embeddings=True)
+            else:
+                # Long enregistrement: diarisation par morceaux (mémoire bornée).
+                # En cas d'échec, pas de repli sur le fichier entier (mémoire non bornée)
+                chunk_seconds = settings.get_float("Performance", "diarization_chunk_minutes", 30.0) * 60
+                if chunk_seconds > 0 and len(waveform) > 1.5 * chunk_seconds * audio_io.SAMPLE_RATE:
+                    try:
+                        segments = self._diarize_chunked(waveform, num_speakers, chunk_seconds, should_stop)
+                    except DiarizationCancelled:
+                        raise
+                    except Exception as chunk_error:
+                        logging.error(f"[DIARIZATION] Diarisation par morceaux échouée: {chunk_error}")
+                        return []
+                    if segments is not None:
+                        return segments
+                
+                # Effectuer la diarisation avec le waveform
+                with _inference_lock:
+                    annotation, embeddings = _run_pipeline(self.pipeline, file_input, params, return_embeddings=True)
+            
+            # Convertir en format utilisable
+            labels = annotation.labels()
+            segments, self.speaker_embeddings = _rename_speakers(
+                [
+                    {'start': turn.start, 'end': turn.end, 'speaker': speaker}
+                    for turn, _, speaker in annotation.itertracks(yield_label=True)
+                ],
+                dict(zip(labels, np.asarray(embeddings))) if embeddings is not None and labels else None
+            )
+            
+            logging.info(f"Diarisation: {len(segments)} segments détectés")
+            return segments
+            
+        except DiarizationCancelled:
+            logging.info("Diarisation: arrêt demandé")
+            raise
+        except Exception as e:
+            logging.error(f"Diarisation RUNTIME ERROR: {e}")
+            import traceback
+            logging.error(traceback.format_exc())
+            return []
+    
+    def _diarize_chunked(
+        self,
+        waveform: np.ndarray,
+        num_speakers: Optional[int],
+        chunk_seconds: float,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Optional[List[Dict]]:
+        """
+        Diarise des morceaux qui se recouvrent puis relie les locuteurs entre morceaux
+        par regroupement des centroïdes de leurs empreintes vocales
+        
+        Returns:
+            Tours de parole (même format que diarize), None si le pipeline ne fournit
+            pas d'empreintes (diarisation en un seul passage)
+        """
+        overlap_seconds = settings.get_float("Performance", "diarization_chunk_overlap", 30.0)
+        workers = max(1, settings.get_int("Performance", "diarization_chunk_workers", 1))
+        threshold = settings.get_float("Performance", "diarization_link_threshold", 0.7)
+        
+        chunks = diarization_chunks.plan_chunks(
+            len(waveform),
+            int(chunk_seconds * audio_io.SAMPLE_RATE),
+            int(overlap_seconds * audio_io.SAMPLE_RATE)
+        )
+        logging.info(f"[DIARIZATION] {len(chunks)} morceaux de {chunk_seconds / 60:.0f} min, {workers} en parallèle")
+        
+        # Nombre de locuteurs connu: un morceau peut en contenir moins
+        params = {'max_speakers': num_speakers} if num_speakers is not None else {}
+        worker_pipelines = threading.local()
+        
+        def diarize_chunk(index: int):
+            _check_stop(should_stop)
+            start, end = chunks[index]
+            file_input = {
+                "waveform": torch.from_numpy(waveform[start:end]).unsqueeze(0),
+                "sample_rate": audio_io.SAMPLE_RATE
+            }
+            if workers > 1:
+                # Une copie du pipeline par thread: les morceaux avancent réellement en parallèle
+                if not hasattr(worker_pipelines, 'pipeline'):
+                    worker_pipelines.pipeline = copy.deepcopy(self.pipeline)
+                annotation, embeddings = _run_pipeline(worker_pipelines.pipeline, file_input, params, return_embeddings=True)
+            else:
+                with _inference_lock:
+                    annotation, embeddings = _run_pipeline(self.pipeline, file_input, params, return_embeddings=True)
+            
+            # Tours limités à la partie centrale du morceau, en temps absolu
+            core_start, core_end = diarization_chunks.core_bounds(chunks, index)
+            offset = start / audio_io.SAMPLE_RATE
+            turns = []
+            for turn, _, speaker in annotation.itertracks(yield_label=True):
+                turn_start = max(turn.start + offset, core_start / audio_io.SAMPLE_RATE)
+                turn_end = min(turn.end + offset, core_end / audio_io.SAMPLE_RATE)
+                if turn_end > turn_start:
+                    turns.append({'start': turn_start, 'end': turn_end, 'speaker': speaker})
+            return annotation.labels(), embeddings, turns
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vocanote-diarization") as pool:
+            results = list(pool.map(diarize_chunk, range(len(chunks))))
+        
+        # Locuteurs locaux (morceau, étiquette) et centroïdes de leurs empreintes
+        local_speakers = []
+        centroids = []
+        for index, (labels, embeddings, _) in enumerate(results):
+            if labels and embeddings is None:
+                logging.warning("[DIARIZATION] Empreintes indisponibles: diarisation en un seul passage")
+                return None
+            for label, embedding in zip(labels, np.asarray(embeddings) if labels else []):
+                local_speakers.append((index, label))
+                centroids.append(embedding)
+        
+        if not local_speakers:
+            return []
+        global_ids = diarization_chunks.link_speakers(
+            np.asarray(centroids, dtype=np.float64),
+            np.array([index for index, _ in local_speakers]),
+            threshold,
+            num_speakers
+        )
+        mapping = dict(zip(local_speakers, global_ids.tolist()))
+        
+        chunk_turns = [
+            [dict(turn, speaker=mapping[(index, turn['speaker'])]) for turn in turns]
+            for index, (_, _, turns) in enumerate(results)
+        ]
+        # Empreinte de chaque locuteur global: moyenne de ses centroïdes locaux
+        centroids = np.asarray(centroids, dtype=np.float64)
+        global_embeddings = {}
+        for speaker_id in np.unique(global_ids).tolist():
+            members = centroids[global_ids == speaker_id]
+            members = members[np.all(np.isfinite(members), axis=1)]
+            if len(members):
+                global_embeddings[speaker_id] = (members / np.linalg.norm(members, axis=1, keepdims=True)).mean(axis=0)
+        
+        segments, self.speaker_embeddings = _rename_speakers(diarization_chunks.stitch_turns(chunk_turns), global_embeddings)
+        logging.info(f"Diarisation: {len(segments)} segments détectés, {len(set(global_ids.tolist()))} locuteurs")
+        return segments
+
+
+# Moteurs de diarisation: nom -> (module, classe), importés à la demande
+BACKENDS = {
+    'pyannote': ("diarization", "SpeakerDiarization"),  # Précis (modèle neuronal, GPU conseillé, token HuggingFace)
+    'fast': ("fast_diarization", "FastDiarization"),  # Rapide (CPU, sans modèle à télécharger)
+}
+
+
+def get_default_backend() -> str:
+    """[Diarization] backend (pyannote par défaut)"""
+    backend = settings.get_str("Diarization", "backend", "pyannote").strip().lower()
+    return backend if backend in BACKENDS else "pyannote"
+
+
+def create_diarizer(backend: Optional[str] = None) -> DiarizationBackend:
+    """
+    Crée le moteur de diarisation demandé (None: [Diarization] backend)
+    
+    Raises:
+        ValueError: moteur inconnu
+    """
+    backend = backend or get_default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"Moteur de diarisation inconnu: {backend} ({', '.join(BACKENDS)})")
+    module_name, class_name = BACKENDS[backend]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)()
+
+
 # Fonction utilitaire pour tester la diarisation
 def test_diarization(audio_file: str):
     """
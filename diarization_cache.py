@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache disque des tours de parole pour VocaNote
+Les locuteurs ne dépendent que de l'audio et des paramètres de diarisation (pas du modèle
+Whisper): une nouvelle transcription du même fichier relit les tours de parole au lieu de
+relancer le décodage audio et le modèle de diarisation.
+Format colonnes (.npz): débuts, fins, numéro de locuteur + noms et empreintes des locuteurs
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import settings
+import cache_utils
+import channel_diarization
+
+
+# À incrémenter quand le format des tours de parole produits change
+DIARIZATION_VERSION = 2
+
+
+class DiarizationCache:
+    """
+    Un fichier .npz par clé (empreinte du contenu audio + origine des tours + paramètres),
+    éviction LRU au-delà de la taille maximale ([Performance] diarization_cache_mb)
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or cache_utils.get_cache_dir("diarization")
+        if max_bytes is None:
+            max_bytes = settings.get_int("Performance", "diarization_cache_mb", 50) * 1024 ** 2
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def make_key(
+        self,
+        audio_file: str,
+        diarizer,
+        num_speakers: Optional[int] = None,
+        max_duration: Optional[float] = None
+    ) -> str:
+        """
+        Clé des tours de parole d'un fichier selon le chemin qui les a produits:
+        diarizer=None pour la diarisation par canal (réglages par canal seulement), sinon
+        le moteur (voir DiarizationBackend.cache_params) et les réglages par canal qui l'ont écarté
+        max_duration: diarisation limitée au début du fichier (version d'évaluation)
+        """
+        audio_hash = cache_utils.hash_file(audio_file)
+        if diarizer is None:
+            return cache_utils.make_key(
+                DIARIZATION_VERSION, audio_hash, "channel", channel_diarization.cache_params(), max_duration
+            )
+        return cache_utils.make_key(
+            DIARIZATION_VERSION, audio_hash, diarizer.name, diarizer.cache_params(),
+            channel_diarization.cache_params(), num_speakers, max_duration
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[Tuple[List[Dict], Dict[str, np.ndarray]]]:
+        """Tours de parole et empreintes des locuteurs en cache (None si absent)"""
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    starts, ends = data['starts'], data['ends']
+                    speaker_ids = data['speaker_ids']
+                    speakers = data['speakers'].tolist()
+                    embeddings, has_embedding = data['embeddings'], data['has_embedding']
+            except Exception as e:
+                logging.warning(f"[DIARIZATION_CACHE] Entrée illisible {path}: {e}")
+                return None
+            cache_utils.touch(path)
+
+        turns = [
+            {'start': start, 'end': end, 'speaker': speakers[speaker_id]}
+            for start, end, speaker_id in zip(starts.tolist(), ends.tolist(), speaker_ids.tolist())
+        ]
+        speaker_embeddings = {
+            speaker: embeddings[index]
+            for index, speaker in enumerate(speakers) if has_embedding[index]
+        }
+        logging.info(f"[DIARIZATION_CACHE] Tours de parole trouvés: {key[:12]} ({len(turns)} tours)")
+        return turns, speaker_embeddings
+
+    def put(self, key: str, turns: List[Dict], speaker_embeddings: Optional[Dict] = None):
+        """Enregistre les tours de parole [{'start', 'end', 'speaker'}] et les empreintes des locuteurs"""
+        speaker_embeddings = speaker_embeddings or {}
+        speakers = list(dict.fromkeys(turn['speaker'] for turn in turns))
+        index = {speaker: k for k, speaker in enumerate(speakers)}
+        dimension = len(next(iter(speaker_embeddings.values()))) if speaker_embeddings else 0
+        embeddings = np.zeros((len(speakers), dimension), dtype=np.float32)
+        has_embedding = np.zeros(len(speakers), dtype=bool)
+        for speaker, embedding in speaker_embeddings.items():
+            if speaker in index:
+                embeddings[index[speaker]] = embedding
+                has_embedding[index[speaker]] = True
+
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        with self._lock:
+            try:
+                np.savez(
+                    temp_path,
+                    starts=np.array([turn['start'] for turn in turns], dtype=np.float64),
+                    ends=np.array([turn['end'] for turn in turns], dtype=np.float64),
+                    speaker_ids=np.array([index[turn['speaker']] for turn in turns], dtype=np.int32),
+                    speakers=np.array(speakers, dtype=str),
+                    embeddings=embeddings,
+                    has_embedding=has_embedding
+                )
+                os.replace(temp_path, path)
+            except Exception as e:
+                logging.warning(f"[DIARIZATION_CACHE] Écriture impossible {path}: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return
+            cache_utils.enforce_size_limit(self.cache_dir, self.max_bytes, suffix=".npz")
+
+    def lookup(
+        self,
+        audio_file: str,
+        diarizer,
+        num_speakers: Optional[int] = None,
+        max_duration: Optional[float] = None
+    ) -> Optional[List[Dict]]:
+        """
+        Tours de parole en cache pour ce fichier et ce moteur, ou par canal si diarizer=None (None si absents)
+        Les voix connues sont de nouveau reconnues (voir DiarizationBackend.restore)
+        """
+        try:
+            cached = self.get(self.make_key(audio_file, diarizer, num_speakers, max_duration))
+        except Exception as e:
+            logging.warning(f"[DIARIZATION_CACHE] Cache indisponible: {e}")
+            return None
+        if cached is None:
+            return None
+        if diarizer is None:
+            # Locuteurs nommés d'après leur canal: pas d'empreintes
+            return cached[0]
+        return diarizer.restore(*cached)
+
+    def store(
+        self,
+        audio_file: str,
+        diarizer,
+        segments: List[Dict],
+        num_speakers: Optional[int] = None,
+        max_duration: Optional[float] = None
+    ):
+        """Enregistre le résultat de diarizer.diarize(), ou de la diarisation par canal si diarizer=None (ignoré si vide)"""
+        if not segments:
+            return
+        try:
+            key = self.make_key(audio_file, diarizer, num_speakers, max_duration)
+            self.put(key, segments, diarizer.speaker_embeddings if diarizer is not None else None)
+        except Exception as e:
+            logging.warning(f"[DIARIZATION_CACHE] Cache indisponible: {e}")
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npz"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+
+def is_diarization_cache_enabled() -> bool:
+    """[Performance] diarization_cache_mb = 0 désactive le cache"""
+    return settings.get_int("Performance", "diarization_cache_mb", 50) > 0
+
+
+# Variable globale
+_diarization_cache_instance = None
+
+
+def get_diarization_cache() -> DiarizationCache:
+    global _diarization_cache_instance
+    if _diarization_cache_instance is None:
+        _diarization_cache_instance = DiarizationCache()
+    return _diarization_cache_instance
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diarisation par morceaux des longs enregistrements pour VocaNote
+Le signal est découpé en morceaux de longueur fixe qui se recouvrent, chaque morceau
+est diarisé séparément (mémoire bornée, morceaux en parallèle) puis les locuteurs
+locaux sont reliés entre morceaux en regroupant les centroïdes de leurs empreintes vocales
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def plan_chunks(total_samples: int, chunk_samples: int, overlap_samples: int) -> List[Tuple[int, int]]:
+    """Intervalles [début, fin) des morceaux (le dernier est allongé plutôt que de laisser un reste trop court)"""
+    step = max(1, chunk_samples - overlap_samples)
+    chunks = []
+    start = 0
+    while True:
+        end = start + chunk_samples
+        # Reste plus court qu'un demi-morceau: rattaché au morceau courant
+        if end + chunk_samples // 2 >= total_samples:
+            chunks.append((start, total_samples))
+            break
+        chunks.append((start, end))
+        start += step
+    return chunks
+
+
+def core_bounds(chunks: List[Tuple[int, int]], index: int) -> Tuple[int, int]:
+    """
+    Partie d'un morceau dont les tours de parole sont gardés: la zone de recouvrement
+    est partagée au milieu entre les deux morceaux voisins (loin de leurs bords)
+    """
+    start, end = chunks[index]
+    core_start = start if index == 0 else (start + chunks[index - 1][1]) // 2
+    core_end = end if index == len(chunks) - 1 else (end + chunks[index + 1][0]) // 2
+    return core_start, core_end
+
+
+def link_speakers(
+    centroids: np.ndarray,
+    chunk_ids: np.ndarray,
+    threshold: float,
+    num_speakers: Optional[int] = None
+) -> np.ndarray:
+    """
+    Regroupement hiérarchique (lien moyen, distance cosinus) des locuteurs locaux
+
+    Deux locuteurs d'un même morceau ne sont jamais regroupés (la diarisation locale
+    les a déjà séparés). Les regroupements s'arrêtent au-delà de threshold, ou quand
+    il reste num_speakers groupes si le nombre de locuteurs est connu.
+    Un centroïde invalide (locuteur trop bref, NaN) reste seul.
+
+    Returns:
+        Numéro de locuteur global (0, 1, ...) de chaque centroïde
+    """
+    count = len(centroids)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    valid = np.all(np.isfinite(centroids), axis=1)
+    normed = np.where(valid[:, None], centroids, 0.0)
+    norms = np.linalg.norm(normed, axis=1, keepdims=True)
+    normed = normed / np.maximum(norms, 1e-12)
+
+    distances = 1.0 - normed @ normed.T
+    distances[chunk_ids[:, None] == chunk_ids[None, :]] = np.inf  # Même morceau (et diagonale)
+    distances[~valid, :] = np.inf
+    distances[:, ~valid] = np.inf
+
+    labels = np.arange(count)
+    sizes = np.ones(count)
+    remaining = count
+    while remaining > 1:
+        flat = int(np.argmin(distances))
+        i, j = divmod(flat, count)
+        distance = distances[i, j]
+        if not np.isfinite(distance):
+            break
+        if num_speakers is not None:
+            if remaining <= num_speakers:
+                break
+        elif distance > threshold:
+            break
+
+        # Lien moyen: distance du groupe fusionné = moyenne pondérée (inf: interdiction conservée)
+        merged = (sizes[i] * distances[i] + sizes[j] * distances[j]) / (sizes[i] + sizes[j])
+        distances[i, :] = merged
+        distances[:, i] = merged
+        distances[i, i] = np.inf
+        distances[j, :] = np.inf
+        distances[:, j] = np.inf
+        sizes[i] += sizes[j]
+        labels[labels == j] = i
+        remaining -= 1
+
+    # Numéros consécutifs
+    _, compact = np.unique(labels, return_inverse=True)
+    return compact
+
+
+def stitch_turns(chunk_turns: List[List[Dict]], max_gap: float = 0.01) -> List[Dict]:
+    """
+    Assemble les tours de parole (déjà limités à la partie centrale de chaque morceau
+    et portant leur locuteur global) et recolle ceux d'un même locuteur coupés à une frontière
+    """
+    turns = sorted(
+        (turn for turns in chunk_turns for turn in turns),
+        key=lambda turn: (turn['start'], turn['end'])
+    )
+    stitched = []
+    last_by_speaker = {}
+    for turn in turns:
+        previous = last_by_speaker.get(turn['speaker'])
+        if previous is not None and turn['start'] - previous['end'] <= max_gap:
+            previous['end'] = max(previous['end'], turn['end'])
+            continue
+        turn = dict(turn)
+        stitched.append(turn)
+        last_by_speaker[turn['speaker']] = turn
+    return stitched
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Moteur de transcription de VocaNote (sans interface graphique)
+Enchaîne cache de résultats, décodage Whisper (avec reprise) et diarisation;
+l'avancement est signalé par des fonctions de rappel (signaux Qt, file de travaux...)
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+import settings
+import decoding
+import audio_io
+import audio_cache
+import sharding
+import vad
+import channel_diarization
+import diarization_cache
+import diarization
+from model_registry import get_model_registry
+from result_cache import get_result_cache
+from checkpoint import Checkpointer, get_checkpoint_store
+from summarizer import get_summarizer
+
+
+def _ignore(*args):
+    pass
+
+
+def _lookup_turns(cache, audio_file: str, diarizer, num_speakers: Optional[int] = None, max_duration: Optional[float] = None):
+    """Tours de parole en cache: par canal d'abord, sinon ceux du moteur (None si absents)"""
+    if channel_diarization.cache_params()['mode'] != "off":
+        cached = cache.lookup(audio_file, None, max_duration=max_duration)
+        if cached is not None:
+            return cached
+    return cache.lookup(audio_file, diarizer, num_speakers, max_duration)
+
+
+class _DiarizationTask(threading.Thread):
+    """
+    Diarisation dans un thread, en parallèle du décodage Whisper
+    (pyannote et Whisper passent l'essentiel de leur temps dans torch, hors GIL)
+    waveform: signal décodé, ou fonction qui le retourne (appelée seulement si les
+    tours de parole ne sont pas dans le cache de diarisation)
+    max_duration: diarisation limitée au début du fichier (version d'évaluation, le signal
+    fourni doit déjà être tronqué)
+    cancel() arrête la diarisation entre deux étapes (ou deux morceaux) et l'attend
+    """
+
+    def __init__(self, audio_file: str, waveform=None, backend: Optional[str] = None, max_duration: Optional[float] = None):
+        super().__init__(name="vocanote-diarization", daemon=True)
+        self.audio_file = audio_file
+        self.waveform = waveform
+        self.max_duration = max_duration
+        self.diarizer = diarization.create_diarizer(backend)
+        self.model_loaded = False
+        self.fallback = False  # Moteur rapide utilisé faute de modèle pyannote
+        self.segments = []
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def cancel(self):
+        """Arrête la diarisation (transcription annulée ou en échec) et attend la fin du thread"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def _check_stop(self):
+        if self._stop_event.is_set():
+            raise diarization.DiarizationCancelled()
+
+    def run(self):
+        try:
+            # Tours de parole déjà calculés pour cet audio: ni décodage ni modèle
+            cache = diarization_cache.get_diarization_cache() if diarization_cache.is_diarization_cache_enabled() else None
+            if cache is not None:
+                cached = _lookup_turns(cache, self.audio_file, self.diarizer, max_duration=self.max_duration)
+                if cached is not None:
+                    self.segments = cached
+                    self.model_loaded = True
+                    return
+
+            self._check_stop()
+            # Un locuteur par canal: pas besoin de pyannote
+            self.segments = channel_diarization.diarize_by_channel(self.audio_file, max_duration=self.max_duration)
+            if self.segments is not None:
+                self.model_loaded = True
+                if cache is not None:
+                    cache.store(self.audio_file, None, self.segments, max_duration=self.max_duration)
+            else:
+                self.segments = []
+                self.model_loaded = bool(self.diarizer.load_model())
+                if not self.model_loaded and self.diarizer.name != "fast" and settings.get_bool("Diarization", "fast_fallback", True):
+                    self.diarizer = diarization.create_diarizer("fast")
+                    self.model_loaded = self.fallback = bool(self.diarizer.load_model())
+                if self.model_loaded:
+                    self._check_stop()
+                    waveform = self.waveform() if callable(self.waveform) else self.waveform
+                    self._check_stop()
+                    self.segments = self.diarizer.diarize(self.audio_file, waveform=waveform, should_stop=self._stop_event.is_set)
+                    if cache is not None:
+                        cache.store(self.audio_file, self.diarizer, self.segments, max_duration=self.max_duration)
+        except Exception as e:
+            self.error = e
+
+
+class TranscriptionEngine:
+    """
+    Transcription d'un fichier audio
+
+    Les fonctions de rappel sont optionnelles:
+        on_status(str): message d'état
+        on_progress(int): progression en pourcentage
+        on_indeterminate(bool): étape sans progression mesurable (diarisation)
+        on_warning(str): avertissement (licence, diarisation)
+        on_segments(list): nouveaux segments après chaque fenêtre décodée
+        should_stop() -> bool: arrêt demandé (consulté entre deux lots de fenêtres)
+
+    allow_sharding=False désactive la transcription multi-processus des longs fichiers
+    (appelant déjà réparti sur plusieurs processus)
+    word_timestamps ajoute l'horodatage des mots à chaque segment: segment['words'] = [[début, fin, mot], ...]
+    (par défaut: [Transcription] word_timestamps)
+    diarization_backend: moteur de diarisation, "pyannote" (précis) ou "fast" (rapide, CPU)
+    (par défaut: [Diarization] backend)
+    """
+
+    def __init__(
+        self,
+        audio_file: str,
+        model_size: str = "base",
+        language: Optional[str] = None,
+        max_duration: Optional[float] = None,
+        enable_diarization: bool = False,
+        on_status: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        on_indeterminate: Optional[Callable[[bool], None]] = None,
+        on_warning: Optional[Callable[[str], None]] = None,
+        on_segments: Optional[Callable[[List[Dict]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        allow_sharding: bool = True,
+        word_timestamps: Optional[bool] = None,
+        diarization_backend: Optional[str] = None
+    ):
+        self.audio_file = audio_file
+        self.model_size = model_size
+        self.language = language
+        self.max_duration = max_duration  # Limite de durée en secondes (pour version sans licence)
+        self.enable_diarization = enable_diarization  # Activer la diarisation des locuteurs
+        self.on_status = on_status or _ignore
+        self.on_progress = on_progress or _ignore
+        self.on_indeterminate = on_indeterminate or _ignore
+        self.on_warning = on_warning or _ignore
+        self.on_segments = on_segments or _ignore
+        self.should_stop = should_stop or (lambda: False)
+        self.allow_sharding = allow_sharding
+        self._waveform = None  # Audio décodé (vue du cache), partagé par transcription et diarisation
+        if word_timestamps is None:
+            word_timestamps = settings.get_bool("Transcription", "word_timestamps", False)
+        self.word_timestamps = word_timestamps
+        self.diarization_backend = diarization_backend or diarization.get_default_backend()
+
+    def run(self) -> Dict:
+        """
+        Transcrit le fichier (et détecte les locuteurs si demandé)
+
+        Returns:
+            Dictionnaire {'text', 'segments', 'language', 'duration', ...} (+ 'diarized_segments')
+
+        Raises:
+            decoding.TranscriptionCancelled: arrêt demandé par should_stop
+        """
+        # Résultat déjà calculé pour ce fichier et ces paramètres ?
+        cache = get_result_cache()
+        cache_key = None
+        result = None
+        try:
+            cache_key = cache.make_key(self.audio_file, self.model_size, self.language, self._decoding_options())
+            result = cache.get(cache_key)
+        except Exception as e:
+            logging.warning(f"Cache de résultats indisponible: {e}")
+
+        diarization_task = None
+        try:
+            if result is not None:
+                self.on_status("✅ Transcription trouvée dans le cache")
+                if result.get('truncated'):
+                    self.on_warning(f"⚠️ Version d'évaluation : transcription limitée à {self.max_duration} secondes")
+            else:
+                # Diarisation lancée dès maintenant: elle avance pendant le décodage Whisper
+                # (jointure à la fusion, durée totale ~ max(transcription, diarisation))
+                if self.enable_diarization and settings.get_bool("Performance", "parallel_diarization", True):
+                    diarization_task = self._create_diarization_task()
+                    diarization_task.start()
+                result = self._transcribe(cache_key)
+                if cache_key:
+                    cache.put(cache_key, result)
+
+            self.on_progress(100)
+
+            if self.should_stop():
+                raise decoding.TranscriptionCancelled()
+        except BaseException:
+            # Annulation ou erreur: la diarisation en parallèle ne doit pas continuer seule
+            if diarization_task is not None:
+                diarization_task.cancel()
+            raise
+
+        # Effectuer la diarisation si activée (seule l'étape manquante est calculée)
+        if self.enable_diarization:
+            # Locuteurs déjà calculés avec un autre moteur: recalculés
+            if result.get('diarization_backend', "pyannote") != self.diarization_backend:
+                result.pop('diarized_segments', None)
+            if diarization_task is not None or 'diarized_segments' not in result:
+                self._diarize(result, diarization_task)
+                if cache_key and 'diarized_segments' in result:
+                    cache.put(cache_key, result)
+        else:
+            result.pop('diarized_segments', None)
+            result.pop('speaker_embeddings', None)
+            result.pop('diarization_backend', None)
+
+        self.on_status("Transcription terminée!")
+        return result
+
+    def _get_waveform(self, decode: bool = True):
+        """
+        Signal du fichier lu dans le cache d'audio décodé (None si le cache est désactivé
+        ou si le fichier est plus grand que le cache: lecture en continu)
+        decode=False: seulement si le fichier est déjà dans le cache (pas de décodage complet)
+        """
+        if self._waveform is None and audio_cache.is_audio_cache_enabled():
+            try:
+                cache = audio_cache.get_audio_cache()
+                if cache.lookup(self.audio_file) or (decode and cache.fits(self.audio_file)):
+                    self._waveform = cache.load(self.audio_file, self.on_status)
+            except Exception as e:
+                logging.warning(f"Cache audio indisponible: {e}")
+        return self._waveform
+
+    def _open_source(self, audio, audio_duration: float, seek: int = 0):
+        """Source audio de la transcription: signal en mémoire (ou vue du cache), sinon lecture en continu"""
+        if audio is None:
+            # Fichier enregistré dans le cache pendant un passage précédent
+            audio = self._get_waveform(decode=False) if seek == 0 and self.max_duration is None else None
+        if audio is not None:
+            return audio_io.ArraySource(audio)
+
+        # Lecture en continu par blocs: mémoire constante quelle que soit la durée
+        if seek == 0 and self._can_cache_stream():
+            # Fichier enregistré dans le cache d'audio décodé pendant la lecture
+            blocks = audio_cache.get_audio_cache().stream(self.audio_file)
+        else:
+            blocks = audio_io.stream_audio(self.audio_file, offset=seek / audio_io.SAMPLE_RATE)
+        return audio_io.StreamingSource(
+            blocks,
+            total_samples=int(audio_duration * audio_io.SAMPLE_RATE) or None,
+            start=seek
+        )
+
+    def _can_cache_stream(self) -> bool:
+        """La lecture en continu peut-elle alimenter le cache d'audio décodé ?"""
+        if not audio_cache.is_audio_cache_enabled():
+            return False
+        try:
+            return audio_cache.get_audio_cache().fits(self.audio_file)
+        except Exception as e:
+            logging.warning(f"Cache audio indisponible: {e}")
+            return False
+
+    def _create_diarization_task(self) -> _DiarizationTask:
+        """Diarisation du fichier, limitée à max_duration en version d'évaluation"""
+        return _DiarizationTask(self.audio_file, self._get_diarization_waveform, self.diarization_backend, self.max_duration)
+
+    def _get_diarization_waveform(self):
+        """
+        Signal à diariser: en version d'évaluation, seulement le début du fichier
+        (vue du cache s'il est déjà décodé, sinon lecture ffmpeg limitée)
+        """
+        if self.max_duration is None:
+            return self._get_waveform()
+        waveform = self._get_waveform(decode=False)
+        if waveform is not None:
+            return waveform[:int(self.max_duration * audio_io.SAMPLE_RATE)]
+        audio, _ = audio_io.load_audio_limited(self.audio_file, self.max_duration)
+        return audio
+
+    def _decoding_options(self):
+        """Options qui influencent le texte produit (partie de la clé de cache)"""
+        return {
+            'max_duration': self.max_duration,
+            'vad': vad.is_vad_enabled(),
+            'word_timestamps': self.word_timestamps
+        }
+
+    def _transcribe(self, checkpoint_key=None):
+        """
+        Transcrit le fichier avec Whisper et retourne {'text', 'segments', 'language', ...}
+        Avec checkpoint_key, l'avancement est enregistré régulièrement et une transcription
+        interrompue reprend à la dernière fenêtre terminée
+        """
+        registry = get_model_registry()
+        loaded_model = None
+        try:
+            # Vérifier si CUDA est disponible
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            device_name = "🚀 GPU (CUDA)" if device == "cuda" else "💻 CPU"
+            self.on_status(f"Périphérique: {device_name}")
+
+            # Préparer la source audio: vue du cache d'audio décodé s'il contient déjà le fichier
+            # (sinon lecture en continu, enregistrée dans le cache au passage)
+            truncated = False
+            audio = None
+            waveform = self._get_waveform(decode=False)
+            if waveform is not None:
+                audio = waveform
+                if self.max_duration is not None:
+                    max_samples = int(self.max_duration * audio_io.SAMPLE_RATE)
+                    truncated = len(waveform) > max_samples
+                    audio = waveform[:max_samples]
+                    if truncated:
+                        self.on_warning(f"⚠️ Version d'évaluation : transcription limitée à {self.max_duration} secondes")
+                audio_duration = len(audio) / audio_io.SAMPLE_RATE
+            elif self.max_duration is not None:
+                # Version sans licence: ffmpeg s'arrête à la limite, inutile de décoder tout le fichier
+                audio, truncated = audio_io.load_audio_limited(self.audio_file, self.max_duration)
+                if truncated:
+                    self.on_warning(f"⚠️ Version d'évaluation : transcription limitée à {self.max_duration} secondes")
+                audio_duration = len(audio) / audio_io.SAMPLE_RATE
+            else:
+                audio_duration = audio_io.probe_duration(self.audio_file) or 0
+
+            # Plusieurs fenêtres sont décodées ensemble (taille de lot selon la mémoire)
+            batch_size = decoding.get_batch_size(self.model_size, device)
+
+            self.on_status(f"Transcription en cours... ({int(audio_duration)}s d'audio)")
+            self.on_progress(0)
+
+            def report_fraction(fraction):
+                # Émettre la progression AVANT de transcrire chaque lot
+                self.on_progress(int(fraction * 95))
+                position = int(fraction * audio_duration)
+                self.on_status(f"Transcription en cours... {position}s / {int(audio_duration)}s")
+
+            # Long fichier sur CPU: découpage sur les silences et transcription multi-processus
+            if self.max_duration is None and self.allow_sharding and sharding.should_shard(device, audio_duration, self.model_size):
+                # Les processus lisent le fichier décodé du cache (projection partagée)
+                waveform = self._get_waveform()
+                num_workers = sharding.get_shard_workers(self.model_size)
+                transcriber = sharding.ShardedTranscriber(
+                    self.model_size, num_workers, self.language, max(1, batch_size // num_workers),
+                    word_timestamps=self.word_timestamps
+                )
+                result = transcriber.transcribe(
+                    self.audio_file, audio_duration, report_fraction, self.on_status, self.on_segments,
+                    should_stop=self.should_stop,
+                    checkpoint_key=checkpoint_key,
+                    checkpoint_options=self._decoding_options(),
+                    audio_path=getattr(waveform, 'filename', None)
+                )
+                self._report_skipped(result)
+                return result
+
+            # Reprendre là où une transcription précédente s'est arrêtée
+            checkpointer = None
+            resume = None
+            if checkpoint_key:
+                checkpointer = Checkpointer(get_checkpoint_store(), checkpoint_key, self._decoding_options())
+                resume = checkpointer.load()
+                if resume:
+                    self.on_status(f"⏩ Reprise à {int(resume['seek'] / audio_io.SAMPLE_RATE)}s")
+
+            # Obtenir le modèle (déjà en mémoire si utilisé récemment)
+            self.on_status("Chargement du modèle Whisper...")
+            loaded_model = registry.acquire(self.model_size, device=device)
+
+            detector = vad.create_detector()
+            while True:
+                source = self._open_source(audio, audio_duration, resume['seek'] if resume else 0)
+
+                # Fenêtres glissantes guidées par les timestamps de Whisper (segments fins)
+                transcriber = decoding.SeekTranscriber(
+                    loaded_model, self.language, batch_size,
+                    vad=detector, word_timestamps=self.word_timestamps
+                )
+                try:
+                    result = transcriber.transcribe(
+                        source, report_fraction, self.on_status, self.on_segments,
+                        should_stop=self.should_stop,
+                        checkpoint_callback=checkpointer if detector is not None else None,
+                        resume=resume
+                    )
+                except decoding.TranscriptionCancelled:
+                    # Garder l'avancement pour la prochaine tentative
+                    if checkpointer:
+                        checkpointer.flush()
+                    raise
+                finally:
+                    if hasattr(source, "close"):
+                        source.close()
+
+                if detector is None or not vad.skipped_everything(result):
+                    break
+                # Aucune parole détectée dans tout le fichier: nouveau passage sans détection
+                logging.warning("VAD: aucune parole détectée, transcription sans détection de parole")
+                self.on_status("🔇 Aucune parole détectée: nouvelle transcription sans détection de parole")
+                detector = None
+                resume = None
+
+            if checkpointer:
+                checkpointer.clear()
+
+            if truncated:
+                result['truncated'] = True
+            self._report_skipped(result)
+            return result
+        finally:
+            # Rendre le modèle au registre (il reste en mémoire pour la prochaine transcription)
+            if loaded_model is not None:
+                registry.release(loaded_model)
+
+    def _report_skipped(self, result):
+        """Indique la durée de silence non décodée grâce à la détection de parole"""
+        skipped = result.get('skipped_duration', 0)
+        if skipped >= 1:
+            logging.info(f"VAD: {skipped:.0f}s de silence ignorées")
+            self.on_status(f"🔇 {int(skipped)}s de silence ignorées")
+
+    def _diarize(self, result, task: Optional[_DiarizationTask] = None):
+        """
+        Ajoute result['diarized_segments'] (segments avec locuteur)
+        task: diarisation déjà lancée en parallèle de la transcription (attendue ici)
+        """
+        try:
+            if task is None or task.is_alive():
+                self.on_status("Détection des locuteurs en cours... (Cela peut prendre plusieurs minutes la première fois lors du téléchargement des modèles)")
+                self.on_indeterminate(True) # Mode indéterminé
+
+            if task is None:
+                task = self._create_diarization_task()
+                task.run()
+            else:
+                task.join()
+            if task.error is not None:
+                raise task.error
+            if task.fallback:
+                self.on_warning("⚠️ Modèle pyannote indisponible: détection rapide des locuteurs (moins précise)")
+
+            if task.model_loaded:
+                diarization_segments = task.segments
+
+                if diarization_segments:
+                    # Fusionner avec la transcription
+                    merged_segments = task.diarizer.merge_with_transcription(
+                        result.get('segments', []),
+                        diarization_segments
+                    )
+
+                    # Ajouter les segments fusionnés au résultat
+                    result['diarized_segments'] = merged_segments
+                    result['diarization_backend'] = task.diarizer.name
+                    # Empreintes des locuteurs (pour enregistrer leur voix sous un nom)
+                    result['speaker_embeddings'] = {
+                        speaker: [round(float(x), 6) for x in embedding]
+                        for speaker, embedding in task.diarizer.speaker_embeddings.items()
+                    }
+                    self.on_status("Diarisation terminée!")
+                else:
+                    self.on_warning("⚠️ Aucun locuteur détecté")
+            else:
+                self.on_warning("⚠️ Impossible de charger le modèle de diarisation")
+
+            self.on_indeterminate(False) # Retour au mode normal
+        except Exception as e:
+            self.on_indeterminate(False)
+            self.on_warning(f"⚠️ Erreur lors de la diarisation: {str(e)}")
+
+
+def diarize_file(audio_file: str, num_speakers: Optional[int] = None, backend: Optional[str] = None) -> List[Dict]:
+    """
+    Tours de parole d'un fichier [{'start', 'end', 'speaker'}]
+
+    Raises:
+        RuntimeError: modèle de diarisation indisponible
+    """
+    diarizer = diarization.create_diarizer(backend)
+    cache = diarization_cache.get_diarization_cache() if diarization_cache.is_diarization_cache_enabled() else None
+    if cache is not None:
+        segments = _lookup_turns(cache, audio_file, diarizer, num_speakers)
+        if segments is not None:
+            return segments
+
+    segments = channel_diarization.diarize_by_channel(audio_file)
+    if segments is not None:
+        if cache is not None:
+            cache.store(audio_file, None, segments)
+        return segments
+
+    if not diarizer.load_model():
+        raise RuntimeError("Impossible de charger le modèle de diarisation")
+    waveform = audio_cache.get_audio_cache().load(audio_file) if audio_cache.is_audio_cache_enabled() else None
+    segments = diarizer.diarize(audio_file, num_speakers, waveform=waveform)
+    if cache is not None:
+        cache.store(audio_file, diarizer, segments, num_speakers)
+    return segments
+
+
+def summarize_text(text: str) -> str:
+    """Résumé d'une transcription (ratio adapté à la longueur du texte)"""
+    # Pour les longs textes on compresse plus
+    ratio = 0.1 if len(text) > 10000 else 0.2
+    return get_summarizer().summarize(text, ratio=ratio)
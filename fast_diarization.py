@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diarisation rapide sur CPU pour VocaNote
+Alternative à pyannote sans modèle à télécharger ni token HuggingFace:
+détection de parole (VAD), empreinte MFCC de chaque fenêtre de 1,5 s (NumPy)
+puis regroupement hiérarchique des fenêtres (scipy). Moins précise que pyannote
+(chevauchements non détectés, voix proches parfois confondues) mais bien plus rapide.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.fft import dct
+from scipy.cluster.hierarchy import fcluster, linkage
+
+import settings
+import audio_io
+import audio_cache
+import vad
+from diarization import DiarizationBackend, _check_stop, _rename_speakers
+
+
+SAMPLE_RATE = audio_io.SAMPLE_RATE
+
+# Analyse spectrale: trames de 25 ms toutes les 10 ms
+FRAME_LENGTH = 400
+FRAME_HOP = 160
+FFT_SIZE = 512
+NUM_MELS = 40
+NUM_CEPSTRA = 20
+
+# Fenêtres d'empreinte (secondes)
+WINDOW_SECONDS = 1.5
+STEP_SECONDS = 0.75
+
+# Un locuteur parlant moins que cette durée (secondes) est rattaché au plus proche
+MIN_SPEAKER_SECONDS = 3.0
+
+# Nombre maximal de fenêtres regroupées (mémoire quadratique); au-delà, les autres
+# fenêtres sont rattachées au locuteur le plus proche
+MAX_CLUSTER_WINDOWS = 3000
+
+
+def _mel_filterbank() -> np.ndarray:
+    """Banc de filtres triangulaires sur l'échelle mel (NUM_MELS, FFT_SIZE // 2 + 1)"""
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    edges = to_hz(np.linspace(to_mel(20.0), to_mel(7600.0), NUM_MELS + 2))
+    freqs = np.fft.rfftfreq(FFT_SIZE, 1.0 / SAMPLE_RATE)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (freqs[None, :] - lower) / (center - lower)
+    falling = (upper - freqs[None, :]) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling))
+
+
+_MEL_FILTERS = _mel_filterbank()
+_WINDOW = np.hamming(FRAME_LENGTH)
+
+
+def mfcc(audio: np.ndarray, block_frames: int = 6000) -> np.ndarray:
+    """
+    Coefficients cepstraux (MFCC, sans c0) de chaque trame de 10 ms: (trames, NUM_CEPSTRA - 1)
+    Calculés par blocs de trames pour borner la mémoire des FFT
+    """
+    num_frames = 1 + (len(audio) - FRAME_LENGTH) // FRAME_HOP if len(audio) >= FRAME_LENGTH else 0
+    result = np.empty((num_frames, NUM_CEPSTRA - 1), dtype=np.float32)
+    audio = audio.astype(np.float32, copy=False)
+    for first in range(0, num_frames, block_frames):
+        count = min(block_frames, num_frames - first)
+        frames = np.lib.stride_tricks.as_strided(
+            audio[first * FRAME_HOP:],
+            shape=(count, FRAME_LENGTH),
+            strides=(audio.strides[0] * FRAME_HOP, audio.strides[0])
+        )
+        power = np.abs(np.fft.rfft(frames * _WINDOW, FFT_SIZE, axis=1)) ** 2
+        log_mel = np.log(power @ _MEL_FILTERS.T + 1e-10)
+        result[first:first + count] = dct(log_mel, type=2, norm='ortho', axis=1)[:, 1:NUM_CEPSTRA]
+    return result
+
+
+def speech_regions(audio: np.ndarray, block_samples: int = 30 * SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    Zones de parole [(début, fin)] en échantillons (VAD par blocs de 30 s)
+    Sans marge de silence et coupées aux pauses: une fenêtre ne mélange pas deux tours de parole
+    """
+    detector = vad.VoiceActivityDetector(max_gap_ms=150, padding_ms=0)
+    masks = [detector.speech_mask(audio[start:start + block_samples]) for start in range(0, len(audio), block_samples)]
+    mask = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+    return [
+        (start * vad.FRAME_SAMPLES, min(end * vad.FRAME_SAMPLES, len(audio)))
+        for start, end in vad.mask_to_regions(mask)
+    ]
+
+
+def window_embeddings(features: np.ndarray, window_frames: int, step_frames: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Empreinte (moyenne et écart-type des MFCC) de fenêtres glissantes sur une zone de parole
+    Sommes cumulées: coût indépendant de la longueur des fenêtres
+
+    Returns:
+        (premières trames des fenêtres, empreintes (fenêtres, 2 * dimension))
+    """
+    count = len(features)
+    if count <= window_frames:
+        starts = np.array([0])
+        lengths = np.array([max(count, 1)])
+    else:
+        starts = np.arange(0, count - window_frames + 1, step_frames)
+        # Dernière fenêtre calée sur la fin de la zone
+        if starts[-1] + window_frames < count:
+            starts = np.append(starts, count - window_frames)
+        lengths = np.full(len(starts), window_frames)
+
+    padded = np.vstack([np.zeros((1, features.shape[1])), features.astype(np.float64)])
+    sums = np.cumsum(padded, axis=0)
+    squares = np.cumsum(padded ** 2, axis=0)
+    ends = np.minimum(starts + lengths, count)
+    n = np.maximum(ends - starts, 1)[:, None]
+    mean = (sums[ends] - sums[starts]) / n
+    std = np.sqrt(np.maximum((squares[ends] - squares[starts]) / n - mean ** 2, 0.0))
+    return starts, np.hstack([mean, std])
+
+
+def cluster_windows(
+    embeddings: np.ndarray,
+    durations: np.ndarray,
+    threshold: float,
+    num_speakers: Optional[int] = None
+) -> np.ndarray:
+    """
+    Regroupement hiérarchique (lien moyen, distance cosinus) des fenêtres
+    Les groupes trop courts (< MIN_SPEAKER_SECONDS) sont rattachés au groupe le plus proche;
+    au-delà de MAX_CLUSTER_WINDOWS, un échantillon régulier des fenêtres est regroupé
+
+    Returns:
+        Numéro de locuteur (0, 1, ...) de chaque fenêtre
+    """
+    if len(embeddings) < 2:
+        return np.zeros(len(embeddings), dtype=np.int64)
+
+    # Normalisation de chaque dimension sur le fichier (canal d'enregistrement, volume)
+    normalized = (embeddings - embeddings.mean(axis=0)) / (embeddings.std(axis=0) + 1e-8)
+    normalized /= np.linalg.norm(normalized, axis=1, keepdims=True) + 1e-12
+
+    sample = np.arange(len(normalized))
+    if len(sample) > MAX_CLUSTER_WINDOWS:
+        sample = np.linspace(0, len(normalized) - 1, MAX_CLUSTER_WINDOWS).astype(np.int64)
+    tree = linkage(normalized[sample], method='average', metric='cosine')
+    if num_speakers:
+        sample_labels = fcluster(tree, t=num_speakers, criterion='maxclust')
+    else:
+        sample_labels = fcluster(tree, t=threshold, criterion='distance')
+    _, sample_labels = np.unique(sample_labels, return_inverse=True)
+
+    # Groupes trop courts: écartés (sauf nombre de locuteurs imposé)
+    totals = np.bincount(sample_labels, weights=durations[sample])
+    major = np.flatnonzero(totals >= MIN_SPEAKER_SECONDS * len(sample) / len(normalized))
+    if num_speakers or len(major) == 0:
+        major = np.arange(len(totals))
+    if len(major) == len(totals) and len(sample) == len(normalized):
+        return sample_labels
+
+    # Chaque fenêtre est rattachée au centroïde le plus proche parmi les groupes gardés
+    centroids = np.stack([normalized[sample[sample_labels == k]].mean(axis=0) for k in major])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    labels = np.argmax(normalized @ centroids.T, axis=1)
+    labels[sample] = np.where(np.isin(sample_labels, major), np.searchsorted(major, sample_labels), labels[sample])
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+
+class FastDiarization(DiarizationBackend):
+    """
+    Diarisation rapide sur CPU (VAD + MFCC + regroupement hiérarchique)
+    Même format de sortie que SpeakerDiarization.diarize
+    """
+
+    name = "fast"
+
+    def load_model(self) -> bool:
+        """Aucun modèle à charger"""
+        return True
+
+    def cache_params(self) -> Dict:
+        return {
+            'threshold': settings.get_float("Diarization", "fast_threshold", 0.8),
+            'window': WINDOW_SECONDS,
+            'step': STEP_SECONDS,
+        }
+
+    def diarize(
+        self,
+        audio_file: str,
+        num_speakers: Optional[int] = None,
+        waveform: Optional[np.ndarray] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[Dict]:
+        """
+        Effectue la diarisation sur un fichier audio
+
+        Args:
+            audio_file: Chemin du fichier audio
+            num_speakers: Nombre de locuteurs (optionnel, sinon seuil [Diarization] fast_threshold)
+            waveform: Signal 16 kHz mono déjà décodé (optionnel, sinon décodé ici)
+            should_stop: Arrêt demandé, consulté entre deux zones de parole
+
+        Returns:
+            Liste de segments avec locuteurs
+
+        Raises:
+            DiarizationCancelled: arrêt demandé par should_stop
+        """
+        if waveform is None:
+            if audio_cache.is_audio_cache_enabled():
+                waveform = audio_cache.get_audio_cache().load(audio_file)
+            else:
+                waveform = audio_io.load_audio(audio_file)
+
+        threshold = settings.get_float("Diarization", "fast_threshold", 0.8)
+        window_frames = int(WINDOW_SECONDS * SAMPLE_RATE / FRAME_HOP)
+        step_frames = int(STEP_SECONDS * SAMPLE_RATE / FRAME_HOP)
+        frame_seconds = FRAME_HOP / SAMPLE_RATE
+
+        # Fenêtres de chaque zone de parole: (zone, début, fin) en secondes + empreinte
+        _check_stop(should_stop)
+        regions = speech_regions(waveform)
+        windows = []
+        embeddings = []
+        for region_index, (region_start, region_end) in enumerate(regions):
+            _check_stop(should_stop)
+            features = mfcc(waveform[region_start:region_end])
+            if len(features) == 0:
+                continue
+            starts, region_embeddings = window_embeddings(features, window_frames, step_frames)
+            offset = region_start / SAMPLE_RATE
+            region_seconds = (region_end - region_start) / SAMPLE_RATE
+            for start in starts.tolist():
+                windows.append((
+                    region_index,
+                    offset + start * frame_seconds,
+                    offset + min(start * frame_seconds + WINDOW_SECONDS, region_seconds)
+                ))
+            embeddings.append(region_embeddings)
+
+        if not windows:
+            self.speaker_embeddings = {}
+            logging.info("Diarisation rapide: aucune parole détectée")
+            return []
+
+        _check_stop(should_stop)
+        bounds = np.array([(start, end) for _, start, end in windows])
+        labels = cluster_windows(np.vstack(embeddings), bounds[:, 1] - bounds[:, 0], threshold, num_speakers)
+        turns = self._windows_to_turns(windows, labels)
+
+        # Empreintes MFCC normalisées par fichier: pas comparables d'un enregistrement à l'autre
+        segments, self.speaker_embeddings = _rename_speakers(turns)
+        logging.info(f"Diarisation rapide: {len(segments)} segments détectés, {len(set(labels.tolist()))} locuteurs")
+        return segments
+
+    def _windows_to_turns(self, windows: List[Tuple[int, float, float]], labels: np.ndarray) -> List[Dict]:
+        """
+        Tours de parole à partir des fenêtres étiquetées (qui se recouvrent)
+        Chaque fenêtre couvre le milieu de son recouvrement avec ses voisines de la même zone;
+        une fenêtre isolée entre deux fenêtres d'un même autre locuteur est corrigée
+        """
+        labels = labels.copy()
+        for k in range(1, len(windows) - 1):
+            same_region = windows[k - 1][0] == windows[k][0] == windows[k + 1][0]
+            if same_region and labels[k - 1] == labels[k + 1] != labels[k]:
+                labels[k] = labels[k - 1]
+
+        turns = []
+        for k, (region, start, end) in enumerate(windows):
+            if k > 0 and windows[k - 1][0] == region:
+                start = (start + windows[k - 1][2]) / 2
+            if k + 1 < len(windows) and windows[k + 1][0] == region:
+                end = (end + windows[k + 1][1]) / 2
+            speaker = int(labels[k])
+            if turns and turns[-1]['speaker'] == speaker and start - turns[-1]['end'] < 1e-3:
+                turns[-1]['end'] = round(end, 3)
+            else:
+                turns.append({'start': round(start, 3), 'end': round(end, 3), 'speaker': speaker})
+        return turns
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File de travaux de transcription pour VocaNote
+Plusieurs fichiers (ou un dossier) sont ajoutés à la file, un ordonnanceur les transcrit
+avec un nombre configurable de travaux simultanés; le modèle Whisper reste chargé
+d'un fichier à l'autre et chaque résultat est enregistré sur disque dès qu'il est prêt
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import itertools
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import settings
+import decoding
+from engine import TranscriptionEngine
+from model_registry import get_model_registry
+
+
+# Extensions proposées lors de l'ajout d'un dossier
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg')
+
+# États d'un travail
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+STATE_LABELS = {
+    PENDING: "⏳ En attente",
+    RUNNING: "▶️ En cours",
+    DONE: "✅ Terminé",
+    FAILED: "❌ Erreur",
+    CANCELLED: "⏹️ Annulé",
+}
+
+
+def get_default_output_dir() -> str:
+    """Dossier des résultats ([Performance] batch_output_dir, par défaut ~/VocaNote/Transcriptions)"""
+    output_dir = settings.get_str("Performance", "batch_output_dir", "")
+    if not output_dir:
+        output_dir = os.path.join(os.path.expanduser("~"), "VocaNote", "Transcriptions")
+    return output_dir
+
+
+def get_default_concurrency() -> int:
+    """Nombre de travaux simultanés ([Performance] batch_concurrency)"""
+    return max(1, settings.get_int("Performance", "batch_concurrency", 1))
+
+
+def list_audio_files(folder: str, recursive: bool = False) -> List[str]:
+    """Fichiers audio d'un dossier, triés par nom"""
+    files = []
+    for root, dirs, names in os.walk(folder):
+        dirs.sort()
+        for name in sorted(names):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                files.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return files
+
+
+class Job:
+    """Un fichier à transcrire et son état dans la file"""
+
+    def __init__(
+        self,
+        job_id: int,
+        audio_file: str,
+        model_size: str = "base",
+        language: Optional[str] = None,
+        max_duration: Optional[float] = None,
+        enable_diarization: bool = False,
+        word_timestamps: Optional[bool] = None,
+        diarization_backend: Optional[str] = None
+    ):
+        self.id = job_id
+        self.audio_file = audio_file
+        self.model_size = model_size
+        self.language = language
+        self.max_duration = max_duration
+        self.enable_diarization = enable_diarization
+        self.word_timestamps = word_timestamps  # None: [Transcription] word_timestamps
+        self.diarization_backend = diarization_backend  # None: [Diarization] backend
+
+        self.state = PENDING
+        self.progress = 0  # Pourcentage
+        self.message = ""
+        self.error = None
+        self.output_path = None  # Fichier JSON du résultat
+        self.started_at = None
+        self.finished_at = None
+        self.segments = []  # Segments décodés (au fil de l'eau, puis résultat complet)
+        self._stop_requested = False
+        self._changed = threading.Condition()
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.audio_file)
+
+    @property
+    def state_label(self) -> str:
+        return STATE_LABELS.get(self.state, self.state)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def request_stop(self):
+        """Arrêt coopératif (entre deux lots de fenêtres)"""
+        self._stop_requested = True
+
+    def is_stop_requested(self) -> bool:
+        return self._stop_requested
+
+    def wait_for_change(self, timeout: Optional[float] = None):
+        """Bloque jusqu'au prochain changement du travail (état, progression, segments)"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def _signal_change(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def to_dict(self) -> Dict:
+        """Description du travail (manifeste, API)"""
+        return {
+            'id': self.id,
+            'audio_file': self.audio_file,
+            'model_size': self.model_size,
+            'language': self.language,
+            'enable_diarization': self.enable_diarization,
+            'diarization_backend': self.diarization_backend,
+            'state': self.state,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'output_path': self.output_path,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    File de travaux et ordonnanceur
+
+    Les travaux sont exécutés par `concurrency` threads. Le modèle de chaque travail est
+    réservé dans le registre tant que la file n'est pas vide: il n'est chargé qu'une fois
+    pour toute la série. Avec plusieurs travaux simultanés sur le même modèle, le décodage
+    reste séquentiel (verrou du modèle) mais la lecture audio, la détection de parole et la
+    diarisation se recouvrent.
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, concurrency: Optional[int] = None):
+        self.output_dir = output_dir or get_default_output_dir()
+        self.concurrency = concurrency or get_default_concurrency()
+
+        self._jobs = []
+        self._pending = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._workers = []
+        self._active_workers = 0
+        self._listeners = []
+        self._pinned_models = {}  # (modèle, périphérique) -> LoadedModel
+
+    # --- Ajout et consultation ---
+
+    def add(self, audio_file: str, **options) -> Job:
+        """Ajoute un fichier (options: model_size, language, max_duration, enable_diarization, word_timestamps, diarization_backend)"""
+        with self._lock:
+            job = Job(next(self._ids), audio_file, **options)
+            self._jobs.append(job)
+        self._pending.put(job)
+        self._notify(job)
+        return job
+
+    def add_folder(self, folder: str, recursive: bool = False, **options) -> List[Job]:
+        """Ajoute tous les fichiers audio d'un dossier"""
+        return [self.add(path, **options) for path in list_audio_files(folder, recursive)]
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            for job in self._jobs:
+                if job.id == job_id:
+                    return job
+        return None
+
+    def add_listener(self, callback: Callable[[Job], None]):
+        """callback(job) est appelé (depuis un thread de travail) à chaque changement d'un travail"""
+        self._listeners.append(callback)
+
+    def pending_count(self) -> int:
+        """Nombre de travaux en attente"""
+        with self._lock:
+            return sum(1 for job in self._jobs if job.state == PENDING)
+
+    def _notify(self, job: Job):
+        job._signal_change()
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                logging.warning(f"[JOBS] Erreur dans un observateur: {e}")
+
+    # --- Ordonnancement ---
+
+    @property
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._active_workers > 0
+
+    def start(self):
+        """Lance (ou complète) les threads de travail jusqu'à `concurrency`"""
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            for _ in range(self.concurrency - self._active_workers):
+                worker = threading.Thread(target=self._worker_loop, name="vocanote-job", daemon=True)
+                self._workers.append(worker)
+                self._active_workers += 1
+                worker.start()
+        logging.info(f"[JOBS] Ordonnanceur démarré ({self.concurrency} travaux simultanés)")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin de tous les travaux (True si la file est vide)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            worker.join(remaining)
+        return not self.is_running
+
+    def cancel(self, job_id: int):
+        """Annule un travail (en attente: retiré, en cours: arrêté entre deux lots)"""
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return
+        job.request_stop()
+        if job.state == PENDING:
+            job.state = CANCELLED
+            self._notify(job)
+
+    def cancel_all(self):
+        for job in self.jobs():
+            self.cancel(job.id)
+
+    def _worker_loop(self):
+        exited = False
+        try:
+            while True:
+                # File vide constatée et thread décompté en une seule étape: un start()
+                # concurrent voit ce thread comme terminé et en relance un autre
+                with self._lock:
+                    try:
+                        job = self._pending.get_nowait()
+                    except queue.Empty:
+                        self._active_workers -= 1
+                        last = self._active_workers == 0
+                        exited = True
+                        break
+                if job.state != PENDING:
+                    continue
+                self._run_job(job)
+        finally:
+            if not exited:
+                with self._lock:
+                    self._active_workers -= 1
+                    last = self._active_workers == 0
+            # Dernier thread: la série est terminée, le registre peut libérer les modèles
+            if last:
+                self._unpin_models()
+
+    def _pin_model(self, model_size: str):
+        """Garde le modèle chargé jusqu'à la fin de la file"""
+        registry = get_model_registry()
+        with self._lock:
+            if any(key[0] == model_size for key in self._pinned_models):
+                return
+        loaded = registry.acquire(model_size)
+        with self._lock:
+            key = (model_size, loaded.device)
+            if key in self._pinned_models:
+                registry.release(loaded)
+            else:
+                self._pinned_models[key] = loaded
+
+    def _unpin_models(self):
+        registry = get_model_registry()
+        with self._lock:
+            pinned = list(self._pinned_models.values())
+            self._pinned_models.clear()
+        for loaded in pinned:
+            registry.release(loaded)
+
+    def _run_job(self, job: Job):
+        job.state = RUNNING
+        job.started_at = datetime.now().isoformat(timespec='seconds')
+        self._notify(job)
+
+        def on_status(message):
+            job.message = message
+            self._notify(job)
+
+        def on_progress(percent):
+            job.progress = percent
+            self._notify(job)
+
+        def on_segments(segments):
+            job.segments.extend(segments)
+            self._notify(job)
+
+        try:
+            self._pin_model(job.model_size)
+            engine = TranscriptionEngine(
+                job.audio_file,
+                job.model_size,
+                job.language,
+                job.max_duration,
+                job.enable_diarization,
+                on_status=on_status,
+                on_progress=on_progress,
+                on_warning=on_status,
+                on_segments=on_segments,
+                should_stop=job.is_stop_requested,
+                word_timestamps=job.word_timestamps,
+                diarization_backend=job.diarization_backend
+            )
+            result = engine.run()
+            # Résultat trouvé dans le cache: rien n'a été transmis au fil de l'eau
+            if len(job.segments) != len(result.get('segments', [])):
+                job.segments = list(result.get('segments', []))
+            job.output_path = self._save_result(job, result)
+            job.state = DONE
+            job.progress = 100
+            job.message = f"Résultat: {job.output_path}"
+        except decoding.TranscriptionCancelled:
+            job.state = CANCELLED
+            job.message = "Transcription annulée"
+        except Exception as e:
+            logging.error(f"[JOBS] Échec de {job.audio_file}: {e}")
+            job.state = FAILED
+            job.error = str(e)
+            job.message = f"Erreur: {e}"
+        finally:
+            job.finished_at = datetime.now().isoformat(timespec='seconds')
+            self._notify(job)
+
+    # --- Résultats ---
+
+    def _save_result(self, job: Job, result: Dict) -> str:
+        """
+        Enregistre le résultat complet (JSON) et le texte (TXT) dans le dossier de sortie,
+        puis ajoute une ligne au manifeste jobs.jsonl
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.splitext(job.name)[0]
+
+        with self._lock:
+            # Deux fichiers de même nom (dossiers différents): suffixe numéroté
+            base = os.path.join(self.output_dir, stem)
+            candidate = base
+            for k in itertools.count(2):
+                if not os.path.exists(candidate + ".json"):
+                    break
+                candidate = f"{base}-{k}"
+            json_path = candidate + ".json"
+            # Réserver le nom avant d'écrire (autres threads)
+            open(json_path, 'w').close()
+
+        data = dict(result, audio_file=os.path.abspath(job.audio_file), model_size=job.model_size)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(candidate + ".txt", 'w', encoding='utf-8') as f:
+            f.write(result.get('text', ''))
+
+        with self._lock:
+            manifest = dict(job.to_dict(), output_path=json_path, state=DONE)
+            with open(os.path.join(self.output_dir, "jobs.jsonl"), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(manifest, ensure_ascii=False) + "\n")
+
+        logging.info(f"[JOBS] Résultat enregistré: {json_path}")
+        return json_path
@@ -89,75 +89,24 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QTextEdit, QLabel, QFileDialog, QProgressBar,
     QMessageBox, QComboBox, QGroupBox, QDialog, QLineEdit, QFormLayout,
-    QDialogButtonBox
+    QDialogButtonBox, QTableWidget, QTableWidgetItem, QHeaderView, QSpinBox
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon
+from PyQt6.QtCore import Qt, QThread, QObject, pyqtSignal
+from PyQt6.QtGui import QFont, QIcon, QTextCursor
 
 # Import du système de licence
 import license as lic
 
-# Import du module de diarisation
-from diarization import SpeakerDiarization
-# Import du module de résumé
-from summarizer import get_summarizer
-
 # Supprimer les avertissements FP16 de Whisper
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU")
 
 # --- CONFIGURATION FFMPEG ---
-print("🔍 Configuration de FFmpeg...")
-ffmpeg_dirs = []
-
-# Déterminer le chemin de base (différent en mode développement vs exécutable)
-if getattr(sys, 'frozen', False):
-    # Mode exécutable PyInstaller
-    base_path = sys._MEIPASS
-else:
-    # Mode développement
-    base_path = os.getcwd()
-
-# 1. Chercher dans le dossier local (créé par installer_ffmpeg.bat)
-# Vérifier ffmpeg/bin ET ffmpeg/ racine
-possible_paths = [
-    os.path.join(base_path, "ffmpeg", "bin"),
-    os.path.join(base_path, "ffmpeg")
-]
-
-for path in possible_paths:
-    if os.path.exists(path) and (os.path.exists(os.path.join(path, "ffmpeg.exe")) or os.path.exists(os.path.join(path, "ffmpeg"))):
-        print(f"   ✅ FFmpeg local trouvé: {path}")
-        ffmpeg_dirs.append(path)
-        break
-
-# 2. Chercher via imageio_ffmpeg (si installé)
-# 2. Chercher via imageio_ffmpeg (si installé)
-try:
-    import imageio_ffmpeg
-    try:
-        # Ppeut échouer en mode frozen
-        exe_path = imageio_ffmpeg.get_ffmpeg_exe()
-        imageio_path = os.path.dirname(exe_path)
-        print(f"   ✅ imageio-ffmpeg trouvé: {imageio_path}")
-        ffmpeg_dirs.append(imageio_path)
-    except Exception as e:
-        print(f"   ℹ️ imageio-ffmpeg erreur runtime: {e}")
-except ImportError:
-    print("   ℹ️ imageio-ffmpeg non installé")
+import audio_io
 
-# Ajouter au PATH
-if ffmpeg_dirs:
-    current_path = os.environ.get("PATH", "")
-    # Ajouter au début du PATH pour être prioritaire
-    os.environ["PATH"] = os.pathsep.join(ffmpeg_dirs) + os.pathsep + current_path
-    print("   ✅ PATH mis à jour avec FFmpeg")
-else:
-    print("   ⚠️ Aucun dossier FFmpeg spécifique trouvé (utilisation du PATH système)")
-
-# Vérification finale
-import shutil
-if shutil.which("ffmpeg"):
-    print(f"   🚀 FFmpeg est prêt: {shutil.which('ffmpeg')}")
+print("🔍 Configuration de FFmpeg...")
+ffmpeg_path = audio_io.configure_ffmpeg_path()
+if ffmpeg_path:
+    print(f"   🚀 FFmpeg est prêt: {ffmpeg_path}")
 else:
     print("   ❌ FFmpeg n'est PAS trouvé dans le PATH!")
 # ---------------------------
@@ -165,6 +114,13 @@ else:
 import whisper
 import torch
 
+# Import du moteur de transcription (décodage Whisper, cache, diarisation)
+import decoding
+import sharding
+import job_queue
+import diarization
+from engine import TranscriptionEngine, summarize_text
+
 # --- FIX POUR EXÉCUTABLE SANS CONSOLE ---
 # Rediriger stdout/stderr si None (cas PyInstaller console=False)
 if sys.stdout is None:
@@ -185,14 +141,8 @@ class SummaryThread(QThread):
         
     def run(self):
         try:
-            summarizer = get_summarizer()
-            # Ratio adaptatif en fonction de la longueur (pour les longs textes on compresse plus)
-            if len(self.text) > 10000:
-                ratio = 0.1
-            else:
-                ratio = 0.2
-                
-            summary = summarizer.summarize(self.text, ratio=ratio)
+            # Ratio adaptatif en fonction de la longueur (voir engine.summarize_text)
+            summary = summarize_text(self.text)
             self.finished.emit(summary)
         except Exception as e:
             self.error.emit(str(e))
@@ -206,176 +156,206 @@ class TranscriptionThread(QThread):
     finished = pyqtSignal(dict)  # On renvoie le dictionnaire complet (texte + segments)
     error = pyqtSignal(str)
     warning = pyqtSignal(str)  # Pour les avertissements de licence
+    segment_ready = pyqtSignal(list)  # Nouveaux segments après chaque fenêtre décodée (affichage progressif)
+    cancelled = pyqtSignal()  # Arrêt demandé par l'utilisateur (un point de reprise est conservé)
     
-    def __init__(self, audio_file, model_size="base", language=None, max_duration=None, enable_diarization=False):
+    def __init__(self, audio_file, model_size="base", language=None, max_duration=None, enable_diarization=False, diarization_backend=None):
         super().__init__()
         self.audio_file = audio_file
         self.model_size = model_size
         self.language = language
         self.max_duration = max_duration  # Limite de durée en secondes (pour version sans licence)
         self.enable_diarization = enable_diarization  # Activer la diarisation des locuteurs
+        self.diarization_backend = diarization_backend  # "pyannote" (précis) ou "fast" (rapide)
+        self._stop_requested = False
+        
+    def request_stop(self):
+        """Demande l'arrêt: pris en compte entre deux fenêtres (ou lots) de décodage"""
+        self._stop_requested = True
+        
+    def is_stop_requested(self):
+        return self._stop_requested
         
     def run(self):
+        engine = TranscriptionEngine(
+            self.audio_file,
+            self.model_size,
+            self.language,
+            self.max_duration,
+            self.enable_diarization,
+            on_status=self.progress.emit,
+            on_progress=self.progress_percent.emit,
+            on_indeterminate=self.progress_indeterminate.emit,
+            on_warning=self.warning.emit,
+            on_segments=self.segment_ready.emit,
+            should_stop=self.is_stop_requested,
+            diarization_backend=self.diarization_backend
+        )
         try:
-            import tempfile
-            import numpy as np
-            
-            self.progress.emit("Chargement du modèle Whisper...")
-            
-            # Vérifier si CUDA est disponible
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            device_name = "🚀 GPU (CUDA)" if device == "cuda" else "💻 CPU"
-            self.progress.emit(f"Périphérique: {device_name}")
-            
-            # Charger le modèle
-            model = whisper.load_model(self.model_size, device=device)
-            
-            audio_to_transcribe = self.audio_file
-            temp_file = None
-            
-            # Vérifier la limite de durée (version sans licence)
-            if self.max_duration is not None:
-                # Charger l'audio avec Whisper pour vérifier la durée
-                audio = whisper.load_audio(self.audio_file)
-                audio_duration = len(audio) / whisper.audio.SAMPLE_RATE
-                
-                if audio_duration > self.max_duration:
-                    self.warning.emit(f"⚠️ Version d'évaluation : transcription limitée à {self.max_duration} secondes")
-                    
-                    # Tronquer l'audio à la limite
-                    max_samples = int(self.max_duration * whisper.audio.SAMPLE_RATE)
-                    audio_truncated = audio[:max_samples]
-                    
-                    # Sauvegarder l'audio tronqué dans un fichier temporaire
-                    import scipy.io.wavfile as wav
-                    temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-                    temp_file.close()
-                    
-                    # Convertir en int16 pour le fichier WAV
-                    audio_int16 = (audio_truncated * 32767).astype(np.int16)
-                    wav.write(temp_file.name, whisper.audio.SAMPLE_RATE, audio_int16)
-                    
-                    audio_to_transcribe = temp_file.name
-            
-            # Charger l'audio pour calculer la durée et les segments
-            audio = whisper.load_audio(audio_to_transcribe)
-            audio_duration = len(audio) / whisper.audio.SAMPLE_RATE
-            
-            # Whisper traite par segments de 30 secondes
-            SEGMENT_DURATION = 30
-            num_segments = max(1, int(np.ceil(audio_duration / SEGMENT_DURATION)))
-            
-            self.progress.emit(f"Transcription en cours... ({int(audio_duration)}s d'audio)")
-            self.progress_percent.emit(0)
-            
-            # Transcription segment par segment pour progression réelle
-            all_segments = []
-            full_text = ""
-            
-            for i in range(num_segments):
-                start_sample = i * SEGMENT_DURATION * whisper.audio.SAMPLE_RATE
-                end_sample = min((i + 1) * SEGMENT_DURATION * whisper.audio.SAMPLE_RATE, len(audio))
-                
-                segment_audio = audio[int(start_sample):int(end_sample)]
-                
-                # Émettre la progression AVANT de transcrire ce segment
-                progress_percent = int((i / num_segments) * 95)
-                self.progress_percent.emit(progress_percent)
-                self.progress.emit(f"Transcription segment {i+1}/{num_segments}...")
-                
-                # Transcrire ce segment
-                # Utiliser pad_or_trim pour s'assurer que l'audio fait exactement 30s
-                segment_audio_padded = whisper.pad_or_trim(segment_audio)
-                mel = whisper.log_mel_spectrogram(segment_audio_padded).to(device)
-                
-                # Détecter la langue si pas spécifiée (seulement pour le premier segment)
-                if i == 0 and self.language is None:
-                    _, probs = model.detect_language(mel)
-                    detected_lang = max(probs, key=probs.get)
-                    self.progress.emit(f"Langue détectée: {detected_lang}")
-                    decode_language = detected_lang
-                else:
-                    decode_language = self.language if self.language else "fr"
-                
-                # Options de décodage
-                options = whisper.DecodingOptions(
-                    language=decode_language,
-                    without_timestamps=False
-                )
-                
-                # Décoder le segment
-                decode_result = whisper.decode(model, mel, options)
-                
-                segment_text = decode_result.text.strip()
-                if segment_text:
-                    # Calculer les timestamps réels
-                    segment_start_time = i * SEGMENT_DURATION
-                    
-                    # Ajouter au texte complet
-                    full_text += segment_text + " "
-                    
-                    # Créer un segment avec les timestamps
-                    all_segments.append({
-                        'start': segment_start_time,
-                        'end': min(segment_start_time + SEGMENT_DURATION, audio_duration),
-                        'text': segment_text
-                    })
-            
-            # Créer le résultat final
-            result = {
-                'text': full_text.strip(),
-                'segments': all_segments,
-                'language': decode_language if 'decode_language' in dir() else self.language
-            }
-            
-            self.progress_percent.emit(100)
-            
-            # Nettoyer le fichier temporaire si créé
-            if temp_file is not None:
-                try:
-                    os.remove(temp_file.name)
-                except:
-                    pass
-            
-            # Effectuer la diarisation si activée
-            if self.enable_diarization:
-                try:
-                    self.progress.emit("Détection des locuteurs en cours... (Cela peut prendre plusieurs minutes la première fois lors du téléchargement des modèles)")
-                    self.progress_indeterminate.emit(True) # Mode indéterminé
-                    
-                    diarizer = SpeakerDiarization()
-                    
-                    if diarizer.load_model():
-                        # Effectuer la diarisation
-                        diarization_segments = diarizer.diarize(self.audio_file)
-                        
-                        if diarization_segments:
-                            # Fusionner avec la transcription
-                            merged_segments = diarizer.merge_with_transcription(
-                                result.get('segments', []),
-                                diarization_segments
-                            )
-                            
-                            # Ajouter les segments fusionnés au résultat
-                            result['diarized_segments'] = merged_segments
-                            self.progress.emit("Diarisation terminée!")
-                        else:
-                            self.warning.emit("⚠️ Aucun locuteur détecté")
-                    else:
-                        self.warning.emit("⚠️ Impossible de charger le modèle de diarisation")
-                    
-                    self.progress_indeterminate.emit(False) # Retour au mode normal
-                except Exception as e:
-                    self.progress_indeterminate.emit(False)
-                    self.warning.emit(f"⚠️ Erreur lors de la diarisation: {str(e)}")
-            
-            self.progress.emit("Transcription terminée!")
+            result = engine.run()
             self.finished.emit(result)  # Renvoyer tout le résultat
             
+        except decoding.TranscriptionCancelled:
+            self.progress.emit("⏹️ Transcription annulée")
+            self.cancelled.emit()
         except Exception as e:
             self.error.emit(f"Erreur lors de la transcription: {str(e)}")
 
 
+class BatchDialog(QDialog):
+    """Dialogue de traitement par lots: file de fichiers transcrits les uns après les autres"""
+    job_changed = pyqtSignal(object)  # Relais des notifications de la file vers le thread de l'interface
+    
+    COLUMNS = ["Fichier", "État", "Progression", "Message"]
+    
+    def __init__(self, model_size, language, enable_diarization, parent=None, diarization_backend=None):
+        super().__init__(parent)
+        self.setWindowTitle("Traitement par lots")
+        self.setMinimumSize(750, 450)
+        self.model_size = model_size
+        self.language = language
+        self.enable_diarization = enable_diarization
+        self.diarization_backend = diarization_backend
+        
+        self.queue = job_queue.JobQueue()
+        self.rows = {}  # id du travail -> ligne du tableau
+        self.job_changed.connect(self.update_job_row)
+        self.queue.add_listener(self.job_changed.emit)
+        self.setup_ui()
+        
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        
+        # Paramètres appliqués aux fichiers ajoutés
+        lang_text = self.language or "auto-détection"
+        diarization_text = "avec locuteurs" if self.enable_diarization else "sans locuteurs"
+        if self.enable_diarization and self.diarization_backend == "fast":
+            diarization_text += " (rapide)"
+        info_label = QLabel(f"Modèle: {self.model_size} | Langue: {lang_text} | {diarization_text}")
+        info_label.setStyleSheet("color: #666;")
+        layout.addWidget(info_label)
+        
+        # Ajout de fichiers
+        add_layout = QHBoxLayout()
+        btn_add_files = QPushButton("📁 Ajouter des fichiers")
+        btn_add_files.clicked.connect(self.add_files)
+        add_layout.addWidget(btn_add_files)
+        btn_add_folder = QPushButton("📂 Ajouter un dossier")
+        btn_add_folder.clicked.connect(self.add_folder)
+        add_layout.addWidget(btn_add_folder)
+        layout.addLayout(add_layout)
+        
+        # Tableau des travaux
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+        
+        # Dossier de sortie et nombre de travaux simultanés
+        options_layout = QFormLayout()
+        output_layout = QHBoxLayout()
+        self.output_input = QLineEdit(self.queue.output_dir)
+        output_layout.addWidget(self.output_input)
+        btn_output = QPushButton("...")
+        btn_output.setFixedWidth(40)
+        btn_output.clicked.connect(self.choose_output_dir)
+        output_layout.addWidget(btn_output)
+        options_layout.addRow("Dossier des résultats :", output_layout)
+        
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 8)
+        self.concurrency_spin.setValue(self.queue.concurrency)
+        options_layout.addRow("Travaux simultanés :", self.concurrency_spin)
+        layout.addLayout(options_layout)
+        
+        # Boutons d'action
+        btn_layout = QHBoxLayout()
+        self.btn_start = QPushButton("▶️ Démarrer")
+        self.btn_start.setEnabled(False)
+        self.btn_start.clicked.connect(self.start_queue)
+        btn_layout.addWidget(self.btn_start)
+        
+        self.btn_cancel_all = QPushButton("⏹️ Tout annuler")
+        self.btn_cancel_all.clicked.connect(self.queue.cancel_all)
+        btn_layout.addWidget(self.btn_cancel_all)
+        
+        btn_close = QPushButton("Fermer")
+        btn_close.clicked.connect(self.close)
+        btn_layout.addWidget(btn_close)
+        layout.addLayout(btn_layout)
+        
+    def add_files(self):
+        """Ajouter des fichiers à la file"""
+        file_names, _ = QFileDialog.getOpenFileNames(
+            self,
+            "Sélectionner des fichiers audio",
+            "",
+            "Fichiers Audio (*.wav *.mp3 *.m4a *.flac *.ogg);;Tous les fichiers (*.*)"
+        )
+        for file_name in file_names:
+            self.queue.add(file_name, **self.job_options())
+            
+    def add_folder(self):
+        """Ajouter tous les fichiers audio d'un dossier"""
+        folder = QFileDialog.getExistingDirectory(self, "Sélectionner un dossier")
+        if folder:
+            jobs = self.queue.add_folder(folder, **self.job_options())
+            if not jobs:
+                QMessageBox.information(self, "Traitement par lots", "Aucun fichier audio dans ce dossier.")
+                
+    def job_options(self):
+        """Paramètres de la fenêtre principale (et limite de la licence)"""
+        return {
+            'model_size': self.model_size,
+            'language': self.language,
+            'max_duration': lic.get_transcription_limit(),
+            'enable_diarization': self.enable_diarization,
+            'diarization_backend': self.diarization_backend
+        }
+        
+    def choose_output_dir(self):
+        folder = QFileDialog.getExistingDirectory(self, "Dossier des résultats", self.output_input.text())
+        if folder:
+            self.output_input.setText(folder)
+            
+    def start_queue(self):
+        """Lancer l'ordonnanceur (les fichiers ajoutés ensuite sont pris en compte)"""
+        self.queue.output_dir = self.output_input.text().strip() or job_queue.get_default_output_dir()
+        self.queue.concurrency = self.concurrency_spin.value()
+        self.queue.start()
+        
+    def update_job_row(self, job):
+        """Mettre à jour la ligne d'un travail (appelé dans le thread de l'interface)"""
+        row = self.rows.get(job.id)
+        if row is None:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            self.rows[job.id] = row
+            self.table.setItem(row, 0, QTableWidgetItem(job.name))
+            self.btn_start.setEnabled(True)
+        
+        self.table.setItem(row, 1, QTableWidgetItem(job.state_label))
+        self.table.setItem(row, 2, QTableWidgetItem(f"{job.progress}%"))
+        self.table.setItem(row, 3, QTableWidgetItem(job.message))
+        
+    def closeEvent(self, event):
+        """Fermer pendant le traitement arrête les travaux en cours"""
+        if self.queue.is_running:
+            reply = QMessageBox.question(
+                self,
+                "Traitement par lots",
+                "Des fichiers sont en cours de traitement. Tout annuler et fermer ?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply == QMessageBox.StandardButton.No:
+                event.ignore()
+                return
+            self.queue.cancel_all()
+        event.accept()
+
+
 class LicenseDialog(QDialog):
     """Dialogue pour gérer la licence"""
     
@@ -608,6 +588,7 @@ class VocaNote(QMainWindow):
         self.current_file = None
         self.transcription_thread = None
         self.last_result = None  # Pour stocker le résultat brut
+        self.streamed_segments = 0  # Segments déjà affichés pendant la transcription
         self.init_ui()
         self.update_license_display()
         
@@ -718,6 +699,26 @@ class VocaNote(QMainWindow):
         self.btn_select.clicked.connect(self.select_file)
         btn_layout.addWidget(self.btn_select)
         
+        # Bouton de traitement par lots
+        self.btn_batch = QPushButton("📚 Traitement par lots")
+        self.btn_batch.setMinimumHeight(40)
+        self.btn_batch.setStyleSheet("""
+            QPushButton {
+                background-color: #607D8B;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                padding: 10px;
+                font-size: 14px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #546E7A;
+            }
+        """)
+        self.btn_batch.clicked.connect(self.show_batch_dialog)
+        btn_layout.addWidget(self.btn_batch)
+        
         file_layout.addLayout(btn_layout)
         file_group.setLayout(file_layout)
         main_layout.addWidget(file_group)
@@ -786,7 +787,27 @@ class VocaNote(QMainWindow):
             "Note: Nécessite un token HuggingFace (gratuit) pour le premier usage."
         )
         self.check_diarization.stateChanged.connect(self.on_diarization_changed)
-        settings_layout.addWidget(self.check_diarization)
+        
+        # Moteur de diarisation: précision (pyannote) ou rapidité (CPU, sans modèle)
+        self.diarization_backend_combo = QComboBox()
+        self.diarization_backend_combo.addItem("🎯 Précis (pyannote)", "pyannote")
+        self.diarization_backend_combo.addItem("⚡ Rapide (CPU)", "fast")
+        self.diarization_backend_combo.setCurrentIndex(
+            max(0, self.diarization_backend_combo.findData(diarization.get_default_backend()))
+        )
+        self.diarization_backend_combo.setToolTip(
+            "Précis: modèle pyannote (téléchargement ~500 Mo, token HuggingFace, lent sans GPU).\n"
+            "Rapide: analyse du timbre de voix sur CPU, sans modèle; moins fiable\n"
+            "quand les voix se ressemblent ou se chevauchent."
+        )
+        self.diarization_backend_combo.setEnabled(False)
+        self.diarization_backend_combo.currentIndexChanged.connect(self.on_diarization_changed)
+        
+        diarization_layout = QHBoxLayout()
+        diarization_layout.addWidget(self.check_diarization)
+        diarization_layout.addWidget(self.diarization_backend_combo)
+        diarization_layout.addStretch()
+        settings_layout.addLayout(diarization_layout)
         
         settings_group.setLayout(settings_layout)
         main_layout.addWidget(settings_group)
@@ -817,7 +838,35 @@ class VocaNote(QMainWindow):
             }
         """)
         self.btn_transcribe.clicked.connect(self.start_transcription)
-        main_layout.addWidget(self.btn_transcribe)
+        
+        # Bouton d'annulation (visible pendant la transcription)
+        self.btn_cancel = QPushButton("⏹️ Annuler")
+        self.btn_cancel.setMinimumHeight(50)
+        self.btn_cancel.setVisible(False)
+        self.btn_cancel.setStyleSheet("""
+            QPushButton {
+                background-color: #F44336;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                padding: 10px;
+                font-size: 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover:enabled {
+                background-color: #e53935;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+                color: #666666;
+            }
+        """)
+        self.btn_cancel.clicked.connect(self.cancel_transcription)
+        
+        transcribe_row = QHBoxLayout()
+        transcribe_row.addWidget(self.btn_transcribe, 3)
+        transcribe_row.addWidget(self.btn_cancel, 1)
+        main_layout.addLayout(transcribe_row)
         
         # === Barre de progression ===
         self.progress_bar = QProgressBar()
@@ -973,7 +1022,8 @@ class VocaNote(QMainWindow):
             
         # Si la diarisation est activée, avertir du téléchargement potentiel
         enable_diarization = self.check_diarization.isChecked()
-        if enable_diarization:
+        diarization_backend = self.diarization_backend_combo.currentData()
+        if enable_diarization and diarization_backend == "pyannote":
             reply = QMessageBox.question(
                 self, 
                 "Téléchargement de modèles", 
@@ -993,14 +1043,19 @@ class VocaNote(QMainWindow):
         self.lang_combo.setEnabled(False)
         self.check_timestamps.setEnabled(False)
         self.check_diarization.setEnabled(False)
+        self.diarization_backend_combo.setEnabled(False)
         
-        # Afficher la barre de progression
+        # Afficher la barre de progression et le bouton d'annulation
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 100)  # Mode avec pourcentage (0-100%)
+        self.btn_cancel.setVisible(True)
+        self.btn_cancel.setEnabled(True)
+        self.status_label.setStyleSheet("color: #2196F3; font-weight: bold;")
         
         # Effacer le texte précédent
         self.text_edit.clear()
         self.last_result = None
+        self.streamed_segments = 0
         
         # Obtenir les paramètres
         model_size = self.model_combo.currentText()
@@ -1016,16 +1071,43 @@ class VocaNote(QMainWindow):
             model_size,
             language,
             max_duration,
-            enable_diarization
+            enable_diarization,
+            diarization_backend
         )
         self.transcription_thread.progress.connect(self.update_status)
         self.transcription_thread.progress_percent.connect(self.update_progress_bar)
         self.transcription_thread.progress_indeterminate.connect(self.on_progress_indeterminate)
+        self.transcription_thread.segment_ready.connect(self.append_segments)
         self.transcription_thread.finished.connect(self.transcription_finished)
         self.transcription_thread.error.connect(self.transcription_error)
+        self.transcription_thread.cancelled.connect(self.transcription_cancelled)
         self.transcription_thread.warning.connect(self.show_warning)
         self.transcription_thread.start()
         
+    def cancel_transcription(self):
+        """Demander l'arrêt de la transcription (effectif à la fin de la fenêtre en cours)"""
+        if self.transcription_thread and self.transcription_thread.isRunning():
+            self.transcription_thread.request_stop()
+            self.btn_cancel.setEnabled(False)
+            self.status_label.setText("⏳ Arrêt après la fenêtre en cours...")
+            
+    def transcription_cancelled(self):
+        """Appelé quand la transcription a été annulée"""
+        self.progress_bar.setVisible(False)
+        self.btn_cancel.setVisible(False)
+        self.streamed_segments = 0
+        self.status_label.setText("⏹️ Transcription annulée (elle reprendra où elle s'est arrêtée)")
+        self.status_label.setStyleSheet("color: #FF9800; font-weight: bold;")
+        
+        # Réactiver les boutons
+        self.btn_select.setEnabled(True)
+        self.btn_transcribe.setEnabled(True)
+        self.model_combo.setEnabled(True)
+        self.lang_combo.setEnabled(True)
+        self.check_timestamps.setEnabled(True)
+        self.check_diarization.setEnabled(True)
+        self.diarization_backend_combo.setEnabled(self.check_diarization.isChecked())
+        
     def on_progress_indeterminate(self, indeterminate):
         """Passer la barre de progression en mode indéterminé (busy)"""
         if indeterminate:
@@ -1046,6 +1128,28 @@ class VocaNote(QMainWindow):
         m, s = divmod(int(seconds), 60)
         return f"{m:02d}:{s:02d}"
         
+    def append_segments(self, segments):
+        """Ajouter les segments d'une fenêtre à la fin du texte (sans reconstruire le document)"""
+        cursor = self.text_edit.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        
+        if self.check_timestamps.isChecked():
+            chunk = ""
+            for segment in segments:
+                start = self.format_timestamp(segment["start"])
+                end = self.format_timestamp(segment["end"])
+                chunk += f"[{start} -> {end}] {segment['text'].strip()}\n"
+        else:
+            chunk = " ".join(segment["text"].strip() for segment in segments)
+            if self.streamed_segments:
+                chunk = " " + chunk
+        cursor.insertText(chunk)
+        self.streamed_segments += len(segments)
+        
+        # Suivre la fin du texte pendant la transcription
+        self.text_edit.setTextCursor(cursor)
+        self.text_edit.ensureCursorVisible()
+        
     def refresh_text_display(self):
         """Rafraîchir l'affichage du texte selon les options"""
         if not self.last_result:
@@ -1099,9 +1203,13 @@ class VocaNote(QMainWindow):
     def transcription_finished(self, result):
         """Appelé quand la transcription est terminée"""
         self.last_result = result
-        self.refresh_text_display()
+        # Le texte affiché au fil de l'eau est déjà complet, sauf avec les locuteurs ou depuis le cache
+        if result.get("diarized_segments") or self.streamed_segments != len(result.get("segments", [])):
+            self.refresh_text_display()
+        self.streamed_segments = 0
         
         self.progress_bar.setVisible(False)
+        self.btn_cancel.setVisible(False)
         self.status_label.setText("✅ Transcription terminée avec succès!")
         self.status_label.setStyleSheet("color: #4CAF50; font-weight: bold;")
         
@@ -1112,6 +1220,7 @@ class VocaNote(QMainWindow):
         self.lang_combo.setEnabled(True)
         self.check_timestamps.setEnabled(True)
         self.check_diarization.setEnabled(True)
+        self.diarization_backend_combo.setEnabled(self.check_diarization.isChecked())
         
         # Activer les boutons d'action
         self.btn_copy.setEnabled(True)
@@ -1122,6 +1231,7 @@ class VocaNote(QMainWindow):
     def transcription_error(self, error_message):
         """Appelé en cas d'erreur"""
         self.progress_bar.setVisible(False)
+        self.btn_cancel.setVisible(False)
         self.status_label.setText("❌ Erreur!")
         self.status_label.setStyleSheet("color: #F44336; font-weight: bold;")
         
@@ -1134,6 +1244,7 @@ class VocaNote(QMainWindow):
         self.lang_combo.setEnabled(True)
         self.check_timestamps.setEnabled(True)
         self.check_diarization.setEnabled(True)
+        self.diarization_backend_combo.setEnabled(self.check_diarization.isChecked())
         
     def copy_text(self):
         """Copier le texte dans le presse-papiers"""
@@ -1179,9 +1290,17 @@ class VocaNote(QMainWindow):
     
     def on_diarization_changed(self):
         """Appelé quand l'option de diarisation change"""
-        if self.check_diarization.isChecked():
+        enabled = self.check_diarization.isChecked()
+        self.diarization_backend_combo.setEnabled(enabled)
+        if enabled:
             # Activer automatiquement les timestamps si diarisation activée
             self.check_timestamps.setChecked(True)
+        if enabled and self.diarization_backend_combo.currentData() == "pyannote":
+            # Charger le modèle de diarisation pendant que l'utilisateur choisit son fichier
+            diarization.preload_pipeline()
+        else:
+            # Libérer la mémoire du modèle de diarisation (inutile au moteur rapide)
+            diarization.unload_pipeline()
         # Rafraîchir l'affichage si on a déjà un résultat
         self.refresh_text_display()
     
@@ -1190,6 +1309,19 @@ class VocaNote(QMainWindow):
         self.status_label.setText(message)
         self.status_label.setStyleSheet("color: #FF9800; font-weight: bold;")
     
+    def show_batch_dialog(self):
+        """Affiche le dialogue de traitement par lots (avec les paramètres actuels)"""
+        lang_text = self.lang_combo.currentText()
+        language = None if lang_text == "Auto-détection" else lang_text.split("(")[1].strip(")")
+        dialog = BatchDialog(
+            self.model_combo.currentText(),
+            language,
+            self.check_diarization.isChecked(),
+            self,
+            self.diarization_backend_combo.currentData()
+        )
+        dialog.exec()
+        
     def show_license_dialog(self):
         """Affiche le dialogue de gestion de licence"""
         dialog = LicenseDialog(self)
@@ -1405,13 +1537,19 @@ class VocaNote(QMainWindow):
 
 def main():
     """Point d'entrée de l'application"""
+    # Requis pour les processus de transcription parallèle dans l'exécutable PyInstaller
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     
     window = VocaNote()
     window.show()
     
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    sharding.shutdown_pool()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registre des modèles Whisper pour VocaNote
+Garde les modèles chargés en mémoire entre les transcriptions (clé: taille, périphérique, précision)
+et libère les moins récemment utilisés quand le budget mémoire est dépassé
+"""
+
+import gc
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import torch
+
+import settings
+
+
+def get_memory_info() -> Tuple[int, int]:
+    """
+    Retourne la mémoire physique (totale, disponible) en octets
+    Utilise psutil si installé, sinon les API du système
+    """
+    try:
+        import psutil
+        mem = psutil.virtual_memory()
+        return int(mem.total), int(mem.available)
+    except ImportError:
+        pass
+
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("sullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return int(status.ullTotalPhys), int(status.ullAvailPhys)
+
+        if os.path.exists("/proc/meminfo"):
+            info = {}
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    name, value = line.split(":", 1)
+                    info[name] = int(value.split()[0]) * 1024
+            total = info.get("MemTotal", 0)
+            return total, info.get("MemAvailable", info.get("MemFree", total // 2))
+
+        total = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        return total, total // 2
+    except Exception as e:
+        logging.warning(f"[MODELS] Impossible de lire la mémoire système: {e}")
+        # Valeur prudente: 8 Go au total, 4 Go disponibles
+        return 8 * 1024 ** 3, 4 * 1024 ** 3
+
+
+def get_default_device() -> str:
+    """Retourne le périphérique à utiliser (cuda si disponible, sinon cpu)"""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def get_default_dtype(device: str) -> str:
+    """Précision par défaut: float16 sur GPU, float32 sur CPU (fp16 non supporté)"""
+    return "float16" if device == "cuda" else "float32"
+
+
+def _model_nbytes(model) -> int:
+    """Taille en octets des poids et buffers d'un modèle"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class LoadedModel:
+    """
+    Modèle Whisper prêté par le registre
+
+    Le décodage Whisper installe des hooks (cache KV) sur le modèle: les appels
+    à decode/detect_language sur un même modèle doivent être faits sous `lock`.
+    """
+
+    def __init__(self, key: Tuple[str, str, str], model, nbytes: int):
+        self.key = key
+        self.model = model
+        self.nbytes = nbytes
+        self.lock = threading.RLock()
+        self.refcount = 0
+
+    @property
+    def model_size(self) -> str:
+        return self.key[0]
+
+    @property
+    def device(self) -> str:
+        return self.key[1]
+
+    @property
+    def dtype(self) -> str:
+        return self.key[2]
+
+    @property
+    def fp16(self) -> bool:
+        """Option fp16 à passer à whisper.DecodingOptions"""
+        return self.dtype == "float16"
+
+
+class WhisperModelRegistry:
+    """
+    Cache process des modèles Whisper avec éviction LRU sous un budget mémoire
+
+    Usage:
+        with registry.model("base") as loaded:
+            with loaded.lock:
+                whisper.decode(loaded.model, mel, options)
+    """
+
+    def __init__(self, ram_budget_bytes: Optional[int] = None):
+        if ram_budget_bytes is None:
+            budget_mb = settings.get_int("Performance", "model_cache_ram_mb", 0)
+            if budget_mb > 0:
+                ram_budget_bytes = budget_mb * 1024 ** 2
+            else:
+                # Auto: la moitié de la mémoire physique
+                total, _ = get_memory_info()
+                ram_budget_bytes = total // 2
+        self.ram_budget_bytes = ram_budget_bytes
+        self._entries = OrderedDict()  # clé -> LoadedModel, du moins au plus récemment utilisé
+        self._lock = threading.Lock()
+        self._load_locks = {}  # clé -> Lock (évite de charger deux fois le même modèle)
+        logging.info(f"[MODELS] Registre initialisé, budget: {ram_budget_bytes // 1024 ** 2} Mo")
+
+    def _make_key(self, model_size: str, device: Optional[str], dtype: Optional[str]) -> Tuple[str, str, str]:
+        device = device or get_default_device()
+        dtype = dtype or get_default_dtype(device)
+        return (model_size, device, dtype)
+
+    def acquire(self, model_size: str, device: Optional[str] = None, dtype: Optional[str] = None) -> LoadedModel:
+        """
+        Retourne le modèle demandé (chargé si nécessaire) et le marque comme utilisé
+        Chaque appel doit être suivi d'un release()
+        """
+        key = self._make_key(model_size, device, dtype)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refcount += 1
+                self._entries.move_to_end(key)
+                logging.info(f"[MODELS] Modèle {key} déjà chargé (réutilisation)")
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Un autre thread a pu le charger pendant l'attente
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refcount += 1
+                    self._entries.move_to_end(key)
+                    return entry
+
+            entry = self._load(key)
+
+            with self._lock:
+                entry.refcount += 1
+                self._entries[key] = entry
+                self._evict()
+            return entry
+
+    def release(self, entry: LoadedModel):
+        """Rend un modèle obtenu par acquire()"""
+        with self._lock:
+            entry.refcount = max(0, entry.refcount - 1)
+            self._evict()
+
+    def model(self, model_size: str, device: Optional[str] = None, dtype: Optional[str] = None):
+        """Context manager autour de acquire()/release()"""
+        registry = self
+
+        class _ModelContext:
+            def __enter__(self):
+                self.entry = registry.acquire(model_size, device, dtype)
+                return self.entry
+
+            def __exit__(self, exc_type, exc, tb):
+                registry.release(self.entry)
+                return False
+
+        return _ModelContext()
+
+    def _load(self, key: Tuple[str, str, str]) -> LoadedModel:
+        """Charge un modèle Whisper depuis le disque"""
+        import whisper
+
+        model_size, device, dtype = key
+        download_root = settings.get_str("Advanced", "cache_dir", "") or None
+        logging.info(f"[MODELS] Chargement du modèle {key}...")
+
+        model = whisper.load_model(model_size, device=device, download_root=download_root)
+        if dtype == "float16":
+            # Poids en fp16 (moitié de la mémoire), LayerNorm conservées en fp32 comme l'attend Whisper
+            model = model.half()
+            for module in model.modules():
+                if isinstance(module, torch.nn.LayerNorm):
+                    module.float()
+        model.eval()
+
+        nbytes = _model_nbytes(model)
+        logging.info(f"[MODELS] Modèle {key} chargé ({nbytes // 1024 ** 2} Mo)")
+        return LoadedModel(key, model, nbytes)
+
+    def _evict(self):
+        """Libère les modèles inutilisés les plus anciens tant que le budget est dépassé (appelé sous _lock)"""
+        total = sum(entry.nbytes for entry in self._entries.values())
+        freed = False
+
+        for key in list(self._entries.keys()):
+            if total <= self.ram_budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refcount > 0:
+                continue
+            del self._entries[key]
+            total -= entry.nbytes
+            entry.model = None
+            freed = True
+            logging.info(f"[MODELS] Modèle {key} libéré (budget mémoire dépassé)")
+
+        if freed:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def clear(self):
+        """Libère tous les modèles inutilisés"""
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if self._entries[key].refcount == 0:
+                    self._entries[key].model = None
+                    del self._entries[key]
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def loaded_models(self) -> list:
+        """Liste des clés des modèles actuellement en mémoire (du moins au plus récent)"""
+        with self._lock:
+            return list(self._entries.keys())
+
+
+# Variable globale
+_registry_instance = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> WhisperModelRegistry:
+    """Retourne le registre de modèles partagé par tout le processus"""
+    global _registry_instance
+    with _registry_lock:
+        if _registry_instance is None:
+            _registry_instance = WhisperModelRegistry()
+        return _registry_instance
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache disque des résultats de transcription pour VocaNote
+Clé: empreinte du contenu audio + modèle + langue + options de décodage
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+import settings
+import cache_utils
+
+
+# À incrémenter quand le format des segments produits change
+ENGINE_VERSION = 2
+
+
+class ResultCache:
+    """
+    Stocke le dictionnaire résultat complet (text, segments, language, diarized_segments)
+    dans un fichier JSON par clé, avec éviction LRU au-delà de la taille maximale
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or cache_utils.get_cache_dir("results")
+        if max_bytes is None:
+            max_bytes = settings.get_int("Performance", "result_cache_mb", 200) * 1024 ** 2
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def make_key(self, audio_file: str, model_size: str, language: Optional[str], options: Optional[Dict] = None) -> str:
+        """Clé de cache pour la transcription (ASR) d'un fichier"""
+        audio_hash = cache_utils.hash_file(audio_file)
+        return cache_utils.make_key(ENGINE_VERSION, audio_hash, model_size, language, options or {})
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Retourne le résultat en cache (None si absent)"""
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except Exception as e:
+                logging.warning(f"[CACHE] Entrée illisible {path}: {e}")
+                return None
+            cache_utils.touch(path)
+        logging.info(f"[CACHE] Résultat trouvé: {key[:12]}")
+        return result
+
+    def put(self, key: str, result: Dict):
+        """Enregistre (ou met à jour) un résultat"""
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        with self._lock:
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False)
+                os.replace(temp_path, path)
+            except Exception as e:
+                logging.warning(f"[CACHE] Écriture impossible {path}: {e}")
+                return
+            cache_utils.enforce_size_limit(self.cache_dir, self.max_bytes, suffix=".json")
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+
+# Variable globale
+_result_cache_instance = None
+
+
+def get_result_cache() -> ResultCache:
+    global _result_cache_instance
+    if _result_cache_instance is None:
+        _result_cache_instance = ResultCache()
+    return _result_cache_instance
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Service HTTP local de VocaNote (bibliothèque standard, sans interface graphique)
+Les modèles restent chargés entre les requêtes; les travaux passent par la même
+file (job_queue) et le même moteur (engine) que l'application
+
+Points d'accès (JSON):
+    GET    /health                  état du service
+    POST   /jobs                    soumettre un travail: {"path": ..., "model_size", "language", "diarize", "word_timestamps",
+                                    "diarization_backend": "pyannote" | "fast"}
+                                    ou audio brut dans le corps (?name=..&model_size=..&language=..&diarize=1&word_timestamps=1)
+    GET    /jobs                    liste des travaux
+    GET    /jobs/<id>               état d'un travail
+    GET    /jobs/<id>/result        résultat complet (409 tant que le travail n'est pas terminé)
+    GET    /jobs/<id>/segments      segments au fil du décodage (JSON Lines, jusqu'à la fin du travail)
+    DELETE /jobs/<id>               annuler un travail
+    POST   /summarize               {"text": ...} -> {"summary": ...}
+"""
+
+import os
+import re
+import json
+import uuid
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+import settings
+import cache_utils
+import job_queue
+import license as lic
+from engine import summarize_text
+from diarization import BACKENDS as DIARIZATION_BACKENDS
+from model_registry import get_model_registry
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Taille maximale d'un fichier audio envoyé dans le corps de la requête
+MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+
+_JOB_PATH = re.compile(r"^/jobs/(\d+)(/result|/segments)?$")
+
+
+class TranscriptionService:
+    """File de travaux partagée par toutes les requêtes et modèles préchargés"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        output_dir: Optional[str] = None,
+        default_model: str = "base"
+    ):
+        self.queue = job_queue.JobQueue(
+            output_dir or cache_utils.get_cache_dir("server"),
+            workers or settings.get_int("Server", "workers", 1)
+        )
+        self.max_pending = max_pending or settings.get_int("Server", "max_pending", 100)
+        self.upload_dir = cache_utils.get_cache_dir("uploads")
+        self.default_model = default_model
+        self._resident = []
+        self.queue.add_listener(self._remove_upload)
+
+    def _remove_upload(self, job: job_queue.Job):
+        """Les fichiers envoyés sont supprimés une fois le travail terminé (le résultat est sur disque)"""
+        if job.is_finished and os.path.dirname(os.path.abspath(job.audio_file)) == os.path.abspath(self.upload_dir):
+            try:
+                os.remove(job.audio_file)
+            except OSError:
+                pass
+
+    def preload(self, model_sizes, summarizer: bool = False, diarization: bool = False):
+        """Charge les modèles au démarrage et les garde en mémoire jusqu'à l'arrêt du service"""
+        registry = get_model_registry()
+        for model_size in model_sizes:
+            logging.info(f"[SERVER] Préchargement du modèle Whisper {model_size}")
+            self._resident.append(registry.acquire(model_size))
+        if summarizer:
+            from summarizer import get_summarizer
+            logging.info("[SERVER] Préchargement du modèle de résumé")
+            get_summarizer().load_model()
+        if diarization:
+            import diarization as diarization_module
+            logging.info("[SERVER] Préchargement du modèle de diarisation")
+            diarization_module.get_pipeline()
+
+    def shutdown(self):
+        self.queue.cancel_all()
+        registry = get_model_registry()
+        for loaded in self._resident:
+            registry.release(loaded)
+        self._resident = []
+
+    def submit(self, audio_file: str, options: Dict) -> job_queue.Job:
+        """Ajoute un travail et réveille l'ordonnanceur (ValueError si la file est pleine)"""
+        if self.queue.pending_count() >= self.max_pending:
+            raise ValueError("File d'attente pleine")
+        job = self.queue.add(
+            audio_file,
+            model_size=options.get('model_size') or self.default_model,
+            language=options.get('language') or None,
+            max_duration=lic.get_transcription_limit(),
+            enable_diarization=bool(options.get('diarize')),
+            word_timestamps=options.get('word_timestamps'),
+            diarization_backend=options.get('diarization_backend') or None
+        )
+        self.queue.start()
+        return job
+
+    def save_upload(self, stream, length: int, name: str) -> str:
+        """Enregistre un fichier audio envoyé dans le corps de la requête"""
+        extension = os.path.splitext(name)[1] or ".audio"
+        path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex}{extension}")
+        remaining = length
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                chunk = stream.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        return path
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Routage des requêtes vers le TranscriptionService du serveur"""
+
+    server_version = "VocaNote"
+
+    @property
+    def service(self) -> TranscriptionService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logging.info(f"[SERVER] {self.address_string()} {format % args}")
+
+    def _send_json(self, data, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json({'error': message}, status)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _get_job(self, job_id: str) -> Optional[job_queue.Job]:
+        job = self.service.queue.get(int(job_id))
+        if job is None:
+            self._send_error(404, "Travail inconnu")
+        return job
+
+    # --- Méthodes HTTP ---
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/health":
+            self._send_json({
+                'status': 'ok',
+                'models': [list(key) for key in get_model_registry().loaded_models()],
+                'pending': self.service.queue.pending_count(),
+            })
+            return
+        if path == "/jobs":
+            self._send_json([job.to_dict() for job in self.service.queue.jobs()])
+            return
+
+        match = _JOB_PATH.match(path)
+        if not match:
+            self._send_error(404, "Ressource inconnue")
+            return
+        job = self._get_job(match.group(1))
+        if job is None:
+            return
+
+        if match.group(2) == "/result":
+            self._send_result(job)
+        elif match.group(2) == "/segments":
+            self._stream_segments(job)
+        else:
+            self._send_json(job.to_dict())
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/")
+        try:
+            if path == "/jobs":
+                self._submit(parse_qs(parsed.query))
+            elif path == "/summarize":
+                text = self._read_json().get('text', '')
+                self._send_json({'summary': summarize_text(text)})
+            else:
+                self._send_error(404, "Ressource inconnue")
+        except json.JSONDecodeError:
+            self._send_error(400, "Corps JSON invalide")
+        except Exception as e:
+            # Modèle absent, mémoire GPU insuffisante, corps mal formé...: réponse 500 plutôt qu'une connexion coupée
+            logging.error(f"[SERVER] Erreur sur POST {path}: {e}", exc_info=True)
+            self._send_error(500, str(e) or type(e).__name__)
+
+    def do_DELETE(self):
+        match = _JOB_PATH.match(urlparse(self.path).path.rstrip("/"))
+        if not match or match.group(2):
+            self._send_error(404, "Ressource inconnue")
+            return
+        job = self._get_job(match.group(1))
+        if job is None:
+            return
+        self.service.queue.cancel(job.id)
+        self._send_json(job.to_dict())
+
+    # --- Traitements ---
+
+    def _submit(self, query: Dict):
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            options = self._read_json()
+            audio_file = options.get('path')
+            if not audio_file or not os.path.isfile(audio_file):
+                self._send_error(400, "Champ 'path' absent ou fichier introuvable")
+                return
+        else:
+            # Audio brut dans le corps, options dans l'URL
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0:
+                self._send_error(400, "Corps vide: envoyer un fichier audio ou {\"path\": ...}")
+                return
+            if length > MAX_UPLOAD_BYTES:
+                self._send_error(413, "Fichier trop volumineux")
+                return
+            options = {key: values[0] for key, values in query.items()}
+            options['diarize'] = options.get('diarize', '') in ('1', 'true', 'yes')
+            if 'word_timestamps' in options:
+                options['word_timestamps'] = options['word_timestamps'] in ('1', 'true', 'yes')
+            audio_file = None
+
+        backend = options.get('diarization_backend')
+        if backend and backend not in DIARIZATION_BACKENDS:
+            self._send_error(400, f"Moteur de diarisation inconnu: {backend}")
+            return
+        if audio_file is None:
+            audio_file = self.service.save_upload(self.rfile, length, options.get('name', ''))
+
+        try:
+            job = self.service.submit(audio_file, options)
+        except ValueError as e:
+            self._send_error(503, str(e))
+            return
+        self._send_json(job.to_dict(), 202)
+
+    def _send_result(self, job: job_queue.Job):
+        if job.state != job_queue.DONE:
+            self._send_error(409, f"Travail non terminé ({job.state})")
+            return
+        with open(job.output_path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        self._send_json(result)
+
+    def _stream_segments(self, job: job_queue.Job):
+        """Envoie chaque segment dès qu'il est décodé (une ligne JSON par segment)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        sent = 0
+        try:
+            while True:
+                finished = job.is_finished
+                segments = job.segments[sent:]
+                for segment in segments:
+                    self.wfile.write((json.dumps(segment, ensure_ascii=False) + "\n").encode('utf-8'))
+                sent += len(segments)
+                if segments:
+                    self.wfile.flush()
+                if finished:
+                    break
+                job.wait_for_change(timeout=1.0)
+            # Dernière ligne: état final du travail
+            self.wfile.write((json.dumps({'state': job.state, 'error': job.error}) + "\n").encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            logging.info(f"[SERVER] Client déconnecté du flux du travail {job.id}")
+
+
+class VocaNoteHTTPServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-thread (un thread par requête, travaux limités par la file)"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service: TranscriptionService):
+        super().__init__(address, _RequestHandler)
+        self.service = service
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: Optional[int] = None,
+    preload_models=(),
+    preload_summarizer: bool = False,
+    output_dir: Optional[str] = None,
+    preload_diarization: bool = False
+):
+    """Démarre le service et traite les requêtes jusqu'à Ctrl+C"""
+    service = TranscriptionService(workers, output_dir=output_dir)
+    service.preload(preload_models, preload_summarizer, preload_diarization)
+
+    httpd = VocaNoteHTTPServer((host, port), service)
+    logging.warning(f"[SERVER] VocaNote à l'écoute sur http://{host}:{httpd.server_port} ({service.queue.concurrency} travaux simultanés)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+def start_in_background(service: TranscriptionService, host: str = DEFAULT_HOST, port: int = 0) -> VocaNoteHTTPServer:
+    """Démarre le serveur dans un thread (port 0: port libre choisi par le système)"""
+    httpd = VocaNoteHTTPServer((host, port), service)
+    threading.Thread(target=httpd.serve_forever, name="vocanote-http", daemon=True).start()
+    return httpd
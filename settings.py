@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lecture de la configuration VocaNote (config.ini)
+Fournit des accesseurs typés avec valeurs par défaut
+"""
+
+import os
+import sys
+import logging
+import configparser
+from typing import Optional
+
+
+# Instance de configuration chargée à la demande
+_config = None
+
+
+def get_base_path() -> str:
+    """Retourne le chemin de base de l'application (compatible PyInstaller)"""
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def _find_config_file() -> Optional[str]:
+    """Cherche config.ini (variable d'environnement, à côté de l'exe, dossier de l'application, CWD)"""
+    possible_paths = [
+        os.environ.get("VOCANOTE_CONFIG"),
+        os.path.join(os.path.dirname(sys.executable), "config.ini") if getattr(sys, 'frozen', False) else None,
+        os.path.join(get_base_path(), "config.ini"),
+        os.path.join(os.getcwd(), "config.ini"),
+    ]
+
+    for path in possible_paths:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def get_config() -> configparser.ConfigParser:
+    """Retourne la configuration (chargée une seule fois)"""
+    global _config
+    if _config is None:
+        _config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
+        config_file = _find_config_file()
+        if config_file:
+            try:
+                _config.read(config_file, encoding='utf-8')
+                logging.info(f"[SETTINGS] Configuration chargée: {config_file}")
+            except Exception as e:
+                logging.warning(f"[SETTINGS] Erreur lecture {config_file}: {e}")
+        else:
+            logging.info("[SETTINGS] Aucun config.ini trouvé, valeurs par défaut utilisées")
+    return _config
+
+
+def get_str(section: str, key: str, default: str = "") -> str:
+    """Lit une valeur texte (la valeur par défaut si absente ou vide)"""
+    value = get_config().get(section, key, fallback="").strip()
+    return value if value else default
+
+
+def get_int(section: str, key: str, default: int = 0) -> int:
+    """Lit une valeur entière"""
+    try:
+        return int(get_str(section, key, str(default)))
+    except ValueError:
+        logging.warning(f"[SETTINGS] Valeur entière invalide pour [{section}] {key}")
+        return default
+
+
+def get_float(section: str, key: str, default: float = 0.0) -> float:
+    """Lit une valeur décimale"""
+    try:
+        return float(get_str(section, key, str(default)))
+    except ValueError:
+        logging.warning(f"[SETTINGS] Valeur décimale invalide pour [{section}] {key}")
+        return default
+
+
+def get_bool(section: str, key: str, default: bool = False) -> bool:
+    """Lit une valeur booléenne (true/false, yes/no, 1/0)"""
+    value = get_str(section, key, "").lower()
+    if value in ("1", "true", "yes", "on", "oui"):
+        return True
+    if value in ("0", "false", "no", "off", "non"):
+        return False
+    return default
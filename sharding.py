@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transcription multi-processus pour les longs fichiers sur CPU
+Le fichier est découpé en K morceaux sur des silences, chaque morceau est transcrit
+par un processus (avec son propre modèle Whisper) puis les segments sont recollés
+avec leurs timestamps absolus
+"""
+
+import os
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+import settings
+import audio_io
+import audio_cache
+import decoding
+import vad
+import cache_utils
+from checkpoint import Checkpointer, get_checkpoint_store
+from model_registry import get_model_registry, get_memory_info
+
+
+# Mémoire approximative (Mo) d'un processus de transcription selon le modèle
+_WORKER_RAM_MB = {
+    "tiny": 500,
+    "base": 700,
+    "small": 1600,
+    "medium": 4000,
+    "large": 8000,
+}
+
+# Demi-largeur (s) de la zone où l'on cherche un silence autour de chaque point de coupe
+SILENCE_SEARCH_SECONDS = 10.0
+
+
+def get_shard_workers(model_size: str) -> int:
+    """
+    Nombre de processus ([Performance] shard_workers, 0 = automatique, 1 = désactivé)
+    En automatique: un processus par tranche de 4 cœurs, dans la limite de la mémoire
+    """
+    workers = settings.get_int("Performance", "shard_workers", 0)
+    if workers > 0:
+        return workers
+
+    cpu_count = os.cpu_count() or 1
+    _, available = get_memory_info()
+    cost = _WORKER_RAM_MB.get(model_size.split(".")[0].split("-")[0], 8000) * 1024 ** 2
+    by_memory = int((available * 0.6) // cost)
+    return max(1, min(4, cpu_count // 4, by_memory))
+
+
+def should_shard(device: str, duration: Optional[float], model_size: str) -> bool:
+    """Le mode multi-processus n'est utile que sur CPU et pour les longs fichiers"""
+    if device != "cpu" or not duration:
+        return False
+    min_duration = settings.get_float("Performance", "shard_min_duration", 600.0)
+    return duration >= min_duration and get_shard_workers(model_size) > 1
+
+
+def find_silence_near(
+    audio_file: str,
+    target: float,
+    search_seconds: float = SILENCE_SEARCH_SECONDS,
+    waveform: Optional[np.ndarray] = None
+) -> float:
+    """Position (s) du passage le plus calme dans [target - search, target + search]"""
+    start = max(0.0, target - search_seconds)
+    if waveform is not None:
+        # Vue du cache d'audio décodé: pas de nouveau passage ffmpeg
+        first = int(start * audio_io.SAMPLE_RATE)
+        audio = waveform[first:first + int(2 * search_seconds * audio_io.SAMPLE_RATE)]
+    else:
+        audio = audio_io.load_audio(audio_file, offset=start, duration=2 * search_seconds)
+
+    best = audio_io.quietest_position(audio)
+    if best is None:
+        return target
+    return start + best / audio_io.SAMPLE_RATE
+
+
+def plan_shards(
+    audio_file: str,
+    duration: float,
+    num_shards: int,
+    waveform: Optional[np.ndarray] = None
+) -> List[Tuple[float, float]]:
+    """Découpe [0, duration] en num_shards intervalles coupés sur des silences"""
+    cuts = [0.0]
+    for k in range(1, num_shards):
+        cut = find_silence_near(audio_file, duration * k / num_shards, waveform=waveform)
+        if cut > cuts[-1] + 1.0:
+            cuts.append(cut)
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+# --- Côté processus de travail ---
+
+_progress_queue = None
+
+
+def _init_worker(num_threads: int, progress_queue):
+    """Initialisation d'un processus: répartir les cœurs entre processus"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    torch.set_num_threads(max(1, num_threads))
+
+
+def _detect_language_worker(audio_file: str, model_size: str, audio_path: Optional[str] = None) -> str:
+    """Détecte la langue sur les 30 premières secondes"""
+    with get_model_registry().model(model_size, device="cpu") as loaded:
+        if audio_path:
+            audio = audio_cache.open_audio(audio_path)[:decoding.WINDOW_SAMPLES]
+        else:
+            audio = audio_io.load_audio(audio_file, duration=decoding.WINDOW_SECONDS)
+        mel = decoding.log_mel_batch([audio], loaded.model.dims.n_mels, "cpu")
+        return decoding.detect_language(loaded, mel[0])
+
+
+def _transcribe_shard_worker(
+    job_id: int,
+    index: int,
+    audio_file: str,
+    start: float,
+    end: float,
+    model_size: str,
+    language: str,
+    batch_size: int,
+    stop_event=None,
+    checkpoint_key: Optional[str] = None,
+    checkpoint_options: Optional[Dict] = None,
+    word_timestamps: bool = False,
+    audio_path: Optional[str] = None,
+    use_vad: bool = True
+) -> Dict:
+    """
+    Transcrit l'intervalle [start, end] et retourne {'segments' (temps absolu), 'skipped_duration'}
+    Avec checkpoint_key, l'avancement du morceau est enregistré et repris au prochain lancement
+    Avec audio_path (.npy du cache d'audio décodé), le morceau est lu sans copie ni ffmpeg
+    use_vad=False: toutes les fenêtres sont décodées (pas de détection de parole)
+    """
+    def on_progress(fraction):
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, index, fraction, None))
+
+    def on_segments(segments):
+        # Segments envoyés au processus principal en temps absolu
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, index, None, [_shift_segment(segment, start, end) for segment in segments]))
+
+    checkpointer = None
+    resume = None
+    if checkpoint_key:
+        checkpointer = Checkpointer(get_checkpoint_store(), _shard_checkpoint_key(checkpoint_key, start, end), checkpoint_options)
+        resume = checkpointer.load()
+    offset = resume['seek'] / audio_io.SAMPLE_RATE if resume else 0.0
+
+    with get_model_registry().model(model_size, device="cpu") as loaded:
+        if audio_path:
+            # Projection partagée par tous les processus: seules les pages lues sont chargées
+            waveform = audio_cache.open_audio(audio_path)
+            source = audio_io.ArraySource(
+                waveform[int(start * audio_io.SAMPLE_RATE):int(end * audio_io.SAMPLE_RATE)]
+            )
+        else:
+            source = audio_io.StreamingSource(
+                audio_io.stream_audio(audio_file, offset=start + offset, duration=end - start - offset),
+                total_samples=int((end - start) * audio_io.SAMPLE_RATE),
+                start=resume['seek'] if resume else 0
+            )
+        try:
+            transcriber = decoding.SeekTranscriber(
+                loaded, language, batch_size, vad=vad.create_detector() if use_vad else None, word_timestamps=word_timestamps
+            )
+            result = transcriber.transcribe(
+                source, on_progress,
+                segments_callback=on_segments,
+                should_stop=stop_event.is_set if stop_event is not None else None,
+                checkpoint_callback=checkpointer,
+                resume=resume
+            )
+        except decoding.TranscriptionCancelled:
+            if checkpointer:
+                checkpointer.flush()
+            raise
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+
+    # Morceau terminé: son état final est gardé jusqu'à la fin des autres morceaux
+    if checkpointer:
+        checkpointer.flush()
+
+    segments = [_shift_segment(segment, start, end) for segment in result['segments']]
+    return {'segments': segments, 'skipped_duration': result['skipped_duration']}
+
+
+def _shard_checkpoint_key(checkpoint_key: str, start: float, end: float) -> str:
+    """Clé du point de reprise d'un morceau"""
+    return cache_utils.make_key(checkpoint_key, round(start, 3), round(end, 3))
+
+
+def _shift_segment(segment: Dict, start: float, end: float) -> Dict:
+    """Convertit un segment relatif au morceau en temps absolu"""
+    shifted = dict(segment)
+    shifted['start'] = round(segment['start'] + start, 2)
+    shifted['end'] = round(min(segment['end'] + start, end), 2)
+    if 'words' in segment:
+        shifted['words'] = [
+            [round(word_start + start, 2), round(min(word_end + start, end), 2), word]
+            for word_start, word_end, word in segment['words']
+        ]
+    return shifted
+
+
+# --- Côté processus principal ---
+
+_pool = None
+_pool_workers = 0
+_pool_queue = None
+_pool_manager = None
+_pool_lock = threading.Lock()
+_job_counter = itertools.count(1)
+_job_queues = {}  # Numéro de transcription -> file de ses messages (progression, segments)
+_job_queues_lock = threading.Lock()
+
+
+def _dispatch_messages(progress_queue):
+    """
+    Répartit les messages des processus entre les transcriptions en cours (un thread par pool):
+    plusieurs transcriptions simultanées partagent la même file sans se voler leurs messages
+    """
+    while True:
+        try:
+            message = progress_queue.get()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        with _job_queues_lock:
+            job_queue = _job_queues.get(message[0])
+        # Messages d'une transcription terminée ou annulée: ignorés
+        if job_queue is not None:
+            job_queue.put(message[1:])
+
+
+def _stop_dispatcher():
+    """Arrête le thread de répartition de la file courante (appelé sous _pool_lock)"""
+    global _pool_queue
+    if _pool_queue is not None:
+        _pool_queue.put(None)
+        _pool_queue = None
+
+
+def _get_pool(num_workers: int):
+    """Pool de processus réutilisé d'une transcription à l'autre (les modèles restent chargés)"""
+    global _pool, _pool_workers, _pool_queue, _pool_manager
+    with _pool_lock:
+        if _pool is None or _pool_workers != num_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _stop_dispatcher()
+            context = multiprocessing.get_context("spawn")
+            _pool_queue = context.Queue()
+            threading.Thread(
+                target=_dispatch_messages, args=(_pool_queue,), name="vocanote-shard-messages", daemon=True
+            ).start()
+            threads = max(1, (os.cpu_count() or 1) // num_workers)
+            _pool = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(threads, _pool_queue)
+            )
+            _pool_workers = num_workers
+            if _pool_manager is None:
+                # Serveur d'objets partagés: événements d'annulation par transcription
+                _pool_manager = context.Manager()
+            logging.info(f"[SHARDING] Pool de {num_workers} processus ({threads} threads chacun)")
+        return _pool, _pool_manager
+
+
+def shutdown_pool():
+    """Arrête les processus de travail (fermeture de l'application)"""
+    global _pool, _pool_manager
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        _stop_dispatcher()
+        if _pool_manager is not None:
+            _pool_manager.shutdown()
+            _pool_manager = None
+
+
+class ShardedTranscriber:
+    """Transcription d'un long fichier par K processus en parallèle"""
+
+    def __init__(
+        self,
+        model_size: str,
+        num_workers: int,
+        language: Optional[str] = None,
+        batch_size: int = 1,
+        word_timestamps: bool = False
+    ):
+        self.model_size = model_size
+        self.num_workers = num_workers
+        self.language = language
+        self.batch_size = batch_size
+        self.word_timestamps = word_timestamps
+
+    def transcribe(
+        self,
+        audio_file: str,
+        duration: float,
+        progress_callback: Optional[Callable[[float], None]] = None,
+        status_callback: Optional[Callable[[str], None]] = None,
+        segments_callback: Optional[Callable[[List[Dict]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        checkpoint_key: Optional[str] = None,
+        checkpoint_options: Optional[Dict] = None,
+        audio_path: Optional[str] = None
+    ) -> Dict:
+        """
+        Les segments sont transmis à segments_callback dans l'ordre chronologique:
+        ceux d'un morceau sont retenus tant que les morceaux précédents ne sont pas terminés.
+        should_stop est consulté pendant l'attente: les morceaux en cours s'arrêtent
+        à la fin de leur lot (avec un point de reprise si checkpoint_key est fourni).
+        audio_path: .npy du cache d'audio décodé, lu directement par les processus (sinon ffmpeg par morceau)
+
+        Returns:
+            Dictionnaire {'text', 'segments', 'language', 'duration', 'skipped_duration'} (même format que SeekTranscriber)
+        """
+        pool, manager = _get_pool(self.num_workers)
+        job_id = next(_job_counter)
+        stop_event = manager.Event()
+        progress_queue = queue.Queue()  # Messages de cette transcription (voir _dispatch_messages)
+        with _job_queues_lock:
+            _job_queues[job_id] = progress_queue
+        try:
+            result = self._transcribe(
+                pool, job_id, stop_event, progress_queue, audio_file, duration, progress_callback,
+                status_callback, segments_callback, should_stop, checkpoint_key, checkpoint_options, audio_path
+            )
+            if vad.skipped_everything(result):
+                # Aucune parole détectée dans tout le fichier: nouveau passage sans détection (ni reprise)
+                logging.warning("[SHARDING] VAD: aucune parole détectée, transcription sans détection de parole")
+                if status_callback:
+                    status_callback("🔇 Aucune parole détectée: nouvelle transcription sans détection de parole")
+                result = self._transcribe(
+                    pool, job_id, stop_event, progress_queue, audio_file, duration, progress_callback,
+                    status_callback, segments_callback, should_stop, None, None, audio_path, use_vad=False
+                )
+            return result
+        finally:
+            with _job_queues_lock:
+                _job_queues.pop(job_id, None)
+
+    def _transcribe(
+        self, pool, job_id, stop_event, progress_queue, audio_file, duration, progress_callback,
+        status_callback, segments_callback, should_stop, checkpoint_key, checkpoint_options, audio_path,
+        use_vad=True
+    ) -> Dict:
+
+        waveform = audio_cache.open_audio(audio_path) if audio_path else None
+        shards = plan_shards(audio_file, duration, self.num_workers, waveform)
+        logging.info(f"[SHARDING] {len(shards)} morceaux: {[(round(a), round(b)) for a, b in shards]}")
+        if status_callback:
+            status_callback(f"Transcription parallèle sur {len(shards)} processus...")
+
+        # Une seule détection de langue pour que tous les morceaux soient cohérents
+        if self.language is None:
+            self.language = pool.submit(_detect_language_worker, audio_file, self.model_size, audio_path).result()
+            if status_callback:
+                status_callback(f"Langue détectée: {self.language}")
+
+        futures = [
+            pool.submit(
+                _transcribe_shard_worker, job_id, index, audio_file, start, end,
+                self.model_size, self.language, self.batch_size,
+                stop_event, checkpoint_key, checkpoint_options, self.word_timestamps, audio_path, use_vad
+            )
+            for index, (start, end) in enumerate(shards)
+        ]
+
+        # Suivre la progression de chaque morceau (pondérée par sa durée)
+        weights = [(end - start) / duration for start, end in shards]
+        fractions = [0.0] * len(shards)
+        held_segments = [[] for _ in shards]  # Segments reçus, pas encore transmis
+        emitted = [0] * len(shards)  # Segments déjà transmis par morceau
+        next_to_emit = 0  # Premier morceau dont les segments ne sont pas tous transmis
+
+        pending = set(futures)
+        while pending:
+            if should_stop and should_stop():
+                # Arrêt coopératif: les morceaux en cours terminent leur lot et enregistrent leur état
+                stop_event.set()
+                for future in futures:
+                    future.cancel()
+                wait(pending)
+                raise decoding.TranscriptionCancelled()
+
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    index, fraction, segments = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if fraction is not None and fractions[index] < 1.0:
+                    fractions[index] = fraction
+                if segments and index >= next_to_emit:
+                    held_segments[index].extend(segments)
+            for future in done:
+                fractions[futures.index(future)] = 1.0
+
+            # Transmettre dans l'ordre: le morceau courant au fil de l'eau, les suivants une fois atteints.
+            # Un morceau terminé est complété par son résultat: ses derniers messages peuvent
+            # arriver après la fin du processus (ils sont alors ignorés)
+            while next_to_emit < len(shards):
+                index = next_to_emit
+                future = futures[index]
+                finished = future.done()
+                if finished:
+                    segments = future.result()['segments'][emitted[index]:] if future.exception() is None else []
+                else:
+                    segments = held_segments[index]
+                held_segments[index] = []
+                if segments_callback and segments:
+                    segments_callback(segments)
+                emitted[index] += len(segments)
+                if not finished:
+                    break
+                next_to_emit += 1
+
+            if progress_callback:
+                progress_callback(sum(f * w for f, w in zip(fractions, weights)))
+
+        # Recoller les segments dans l'ordre (result() relance une éventuelle erreur du processus)
+        all_segments = []
+        skipped_duration = 0.0
+        for future in futures:
+            shard_result = future.result()
+            all_segments.extend(shard_result['segments'])
+            skipped_duration += shard_result['skipped_duration']
+
+        if checkpoint_key:
+            store = get_checkpoint_store()
+            for start, end in shards:
+                store.remove(_shard_checkpoint_key(checkpoint_key, start, end))
+
+        return {
+            'text': " ".join(segment['text'] for segment in all_segments),
+            'segments': all_segments,
+            'language': self.language,
+            'duration': duration,
+            'skipped_duration': round(skipped_duration, 2)
+        }
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Voix connues pour VocaNote
+Les empreintes vocales des participants habituels sont enregistrées sous leur nom
+(fichier .npz dans les données de l'application); après la diarisation, chaque
+locuteur détecté est comparé à ces voix (plus proche voisin, distance cosinus)
+et reçoit automatiquement le nom de la personne reconnue
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import settings
+import cache_utils
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Vecteurs de norme 1 (produit scalaire = similarité cosinus)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class SpeakerStore:
+    """
+    Index des voix connues: noms + empreintes normalisées (une ou plusieurs par personne)
+    Gardé en mémoire et relu si le fichier a été modifié par un autre processus
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(cache_utils.get_cache_dir("speakers"), "speakers.npz")
+        self._lock = threading.Lock()
+        self._names = np.zeros(0, dtype=str)
+        self._embeddings = None  # (n, dimension) float32
+        self._mtime = None
+
+    def _refresh(self):
+        """Recharge l'index si le fichier a changé (appelé sous le verrou)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._names, self._embeddings, self._mtime = np.zeros(0, dtype=str), None, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self._names = data['names']
+                self._embeddings = data['embeddings'].astype(np.float32)
+            self._mtime = mtime
+        except Exception as e:
+            logging.warning(f"[SPEAKERS] Index des voix illisible {self.path}: {e}")
+
+    def _save(self):
+        """Écriture atomique de l'index (appelé sous le verrou)"""
+        temp_path = self.path + ".tmp.npz"
+        embeddings = self._embeddings if self._embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+        np.savez(temp_path, names=self._names, embeddings=embeddings)
+        os.replace(temp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def names(self) -> List[str]:
+        """Personnes enregistrées (sans doublon, par ordre alphabétique)"""
+        with self._lock:
+            self._refresh()
+            return sorted(set(self._names.tolist()))
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return len(self._names) == 0
+
+    def enroll(self, name: str, embedding) -> None:
+        """Ajoute une empreinte pour cette personne (plusieurs empreintes améliorent la reconnaissance)"""
+        vector = _normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        if not np.all(np.isfinite(vector)):
+            raise ValueError("Empreinte vocale invalide")
+        with self._lock:
+            self._refresh()
+            if self._embeddings is not None and len(self._embeddings) and self._embeddings.shape[1] != vector.shape[1]:
+                raise ValueError("Empreinte d'une autre dimension que celles de l'index (modèle de diarisation différent)")
+            self._names = np.append(self._names, name)
+            self._embeddings = vector if self._embeddings is None or not len(self._embeddings) else np.vstack([self._embeddings, vector])
+            self._save()
+        logging.info(f"[SPEAKERS] Voix enregistrée: {name}")
+
+    def remove(self, name: str) -> bool:
+        """Oublie une personne (True si elle était enregistrée)"""
+        with self._lock:
+            self._refresh()
+            keep = self._names != name
+            if keep.all():
+                return False
+            self._names = self._names[keep]
+            self._embeddings = self._embeddings[keep]
+            self._save()
+        logging.info(f"[SPEAKERS] Voix supprimée: {name}")
+        return True
+
+    def match(self, centroids, max_distance: Optional[float] = None) -> List[Optional[str]]:
+        """
+        Nom de la personne la plus proche pour chaque centroïde (None si aucune assez proche)
+
+        Toutes les similarités sont calculées en un produit matriciel; chaque personne
+        n'est attribuée qu'à un seul locuteur (le plus ressemblant en premier)
+        """
+        if max_distance is None:
+            max_distance = settings.get_float("Diarization", "speaker_match_distance", 0.5)
+        centroids = np.asarray(centroids, dtype=np.float32)
+        result = [None] * len(centroids)
+        with self._lock:
+            self._refresh()
+            names, embeddings = self._names, self._embeddings
+        if not len(names) or not len(centroids) or embeddings.shape[1] != centroids.shape[1]:
+            return result
+
+        valid = np.all(np.isfinite(centroids), axis=1)
+        similarities = _normalize(np.where(valid[:, None], centroids, 0.0)) @ embeddings.T  # (locuteurs, empreintes)
+        similarities[~valid] = -np.inf
+
+        # Meilleure empreinte de chaque personne pour chaque locuteur
+        people, person_index = np.unique(names, return_inverse=True)
+        per_person = np.full((len(centroids), len(people)), -np.inf, dtype=np.float32)
+        np.maximum.at(per_person, (slice(None), person_index), similarities)
+
+        # Attribution gloutonne par similarité décroissante, sans réutiliser une personne
+        order = np.argsort(-per_person, axis=None)
+        used_speakers, used_people = set(), set()
+        for flat in order.tolist():
+            speaker, person = divmod(flat, len(people))
+            if 1.0 - per_person[speaker, person] > max_distance:
+                break
+            if speaker in used_speakers or person in used_people:
+                continue
+            result[speaker] = str(people[person])
+            used_speakers.add(speaker)
+            used_people.add(person)
+        return result
+
+    def rename(self, embeddings_by_label: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """Correspondance {étiquette: nom reconnu} pour les locuteurs reconnus"""
+        labels = list(embeddings_by_label)
+        if not labels:
+            return {}
+        names = self.match(np.stack([np.asarray(embeddings_by_label[label], dtype=np.float32) for label in labels]))
+        return {label: name for label, name in zip(labels, names) if name}
+
+
+# Variable globale
+_speaker_store_instance = None
+
+
+def get_speaker_store() -> SpeakerStore:
+    global _speaker_store_instance
+    if _speaker_store_instance is None:
+        _speaker_store_instance = SpeakerStore()
+    return _speaker_store_instance
@@ -13,6 +13,9 @@ import sys
 from threading import Thread
 from typing import Optional, Callable
 
+import settings
+from model_registry import get_memory_info
+
 # Supprimer les avertissements transformers
 warnings.filterwarnings("ignore")
 os.environ["TRANSFORMERS_VERBOSITY"] = "error"
@@ -34,6 +37,13 @@ except Exception as e:
     logging.warning(f"[SUMMARIZER] Patch torchcodec échoué: {e}")
 
 
+# Recherche en faisceau des résumés abstractifs
+NUM_BEAMS = 5
+
+# Nombre maximal de morceaux générés ensemble
+MAX_SUMMARY_BATCH_SIZE = 8
+
+
 def get_base_path() -> str:
     """Retourne le chemin de base de l'application (compatible PyInstaller)"""
     if getattr(sys, 'frozen', False):
@@ -190,12 +200,12 @@ class TextSummarizer:
         
         logging.info(f"Summarizer: Texte découpé en {len(chunks)} morceaux")
         
-        # Résumer chaque morceau
+        # Résumer les morceaux (générés par lots)
+        chunk_max = max(120, min(180, max_length))
+        summaries = self._summarize_chunks(chunks, 50, chunk_max)
+        
         chunk_summaries = []
-        for i, chunk in enumerate(chunks):
-            logging.info(f"Summarizer: Résumé du morceau {i+1}/{len(chunks)}")
-            chunk_max = max(120, min(180, max_length))
-            summary = self._summarize_chunk(chunk, 50, chunk_max)
+        for i, (chunk, summary) in enumerate(zip(chunks, summaries)):
             if summary and summary.strip() and len(summary.strip()) > 30:
                 chunk_summaries.append(summary)
                 logging.info(f"  -> Morceau {i+1}: {len(summary)} chars")
@@ -335,7 +345,7 @@ class TextSummarizer:
                     attention_mask=inputs['attention_mask'],
                     max_length=target_max,
                     min_length=target_min,
-                    num_beams=5,           # Plus de beams pour meilleure qualité
+                    num_beams=NUM_BEAMS,   # Plus de beams pour meilleure qualité
                     length_penalty=1.0,    # Équilibré pour longueur naturelle
                     no_repeat_ngram_size=3,
                     repetition_penalty=1.2, # Éviter les répétitions
@@ -349,6 +359,108 @@ class TextSummarizer:
             logging.error(f"Summarizer chunk error: {e}")
             return ""
     
+    def _summarize_chunks(self, chunks: list, min_length: int, max_length: int) -> list:
+        """
+        Résume plusieurs morceaux (mêmes paramètres que _summarize_chunk) en les générant par lots:
+        les morceaux de même longueur cible sont tokenisés ensemble, complétés à la même taille
+        et passés en un seul appel à generate. Un morceau en échec donne "".
+        """
+        summaries = [""] * len(chunks)
+        if not chunks:
+            return summaries
+        
+        try:
+            encoded = self.tokenizer(chunks, max_length=self.max_input_tokens, truncation=True)
+        except Exception as e:
+            logging.error(f"Summarizer chunk error: {e}")
+            return summaries
+        lengths = [len(ids) for ids in encoded['input_ids']]
+        
+        # Longueurs cibles de chaque morceau (comme _summarize_chunk)
+        targets = []
+        for input_length in lengths:
+            target_max = max(min_length + 30, min(max_length, input_length))
+            target_min = max(20, min(min_length, target_max - 20))
+            targets.append((target_min, target_max))
+        
+        # Lots de morceaux de même longueur cible, triés par taille (peu de remplissage)
+        batch_size = self._get_batch_size(max(lengths), max_length)
+        order = sorted(range(len(chunks)), key=lambda k: (targets[k], lengths[k]))
+        batches = []
+        for k in order:
+            if batches and len(batches[-1]) < batch_size and targets[batches[-1][0]] == targets[k]:
+                batches[-1].append(k)
+            else:
+                batches.append([k])
+        
+        done = 0
+        for batch in batches:
+            logging.info(f"Summarizer: Résumé des morceaux {done + 1}-{done + len(batch)}/{len(chunks)} (lot de {len(batch)})")
+            done += len(batch)
+            target_min, target_max = targets[batch[0]]
+            try:
+                inputs = self.tokenizer.pad(
+                    {
+                        'input_ids': [encoded['input_ids'][k] for k in batch],
+                        'attention_mask': [encoded['attention_mask'][k] for k in batch]
+                    },
+                    return_tensors="pt"
+                ).to(self.device)
+                
+                with torch.no_grad():
+                    summary_ids = self.model.generate(
+                        inputs['input_ids'],
+                        attention_mask=inputs['attention_mask'],
+                        max_length=target_max,
+                        min_length=target_min,
+                        num_beams=NUM_BEAMS,
+                        length_penalty=1.0,
+                        no_repeat_ngram_size=3,
+                        repetition_penalty=1.2,
+                        do_sample=False
+                    )
+                
+                for k, summary in zip(batch, self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)):
+                    summaries[k] = summary.strip()
+            except Exception as e:
+                # Lot trop gros pour la mémoire, etc.: morceaux repris un par un
+                logging.warning(f"Summarizer: échec du lot ({e}), morceaux résumés un par un")
+                if self.device == "cuda":
+                    torch.cuda.empty_cache()
+                for k in batch:
+                    summaries[k] = self._summarize_chunk(chunks[k], min_length, max_length)
+        
+        return summaries
+    
+    def _get_batch_size(self, input_tokens: int, output_tokens: int) -> int:
+        """
+        Nombre de morceaux générés ensemble ([Performance] summarizer_batch_size, 0 = automatique)
+        Automatique: cache clé/valeur de la recherche en faisceau de chaque morceau (attention
+        croisée sur l'entrée + auto-attention sur le résumé), dans la moitié de la mémoire libre
+        """
+        batch_size = settings.get_int("Performance", "summarizer_batch_size", 0)
+        if batch_size > 0:
+            return min(batch_size, MAX_SUMMARY_BATCH_SIZE)
+        
+        config = self.model.config
+        d_model = getattr(config, 'd_model', 1024)
+        layers = getattr(config, 'decoder_layers', 12)
+        bytes_per_value = next(self.model.parameters()).element_size()
+        # Clés + valeurs, par couche et par faisceau (x2: activations et copies de réordonnancement)
+        cost = NUM_BEAMS * layers * 2 * d_model * (input_tokens + output_tokens) * bytes_per_value * 2
+        
+        if self.device == "cuda":
+            try:
+                available, _ = torch.cuda.mem_get_info()
+            except Exception:
+                available = 2 * 1024 ** 3
+        else:
+            _, available = get_memory_info()
+        
+        batch_size = max(1, min(MAX_SUMMARY_BATCH_SIZE, int((available * 0.5) // cost)))
+        logging.info(f"[SUMMARIZER] Taille de lot auto: {batch_size} ({available // 1024 ** 2} Mo libres, {self.device})")
+        return batch_size
+    
     def _clean_text(self, text: str) -> str:
         """Nettoie le texte des caractères problématiques et du formatage de transcription"""
         import re
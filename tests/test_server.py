@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests du service HTTP local (server.py) sur 127.0.0.1
+Le moteur de transcription est remplacé par un moteur factice: ni modèle Whisper ni ffmpeg
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import http.client
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+import job_queue
+
+
+class _StubEngine:
+    """Moteur factice: émet SEGMENTS un par un une fois la barrière ouverte"""
+
+    SEGMENTS = [
+        {'start': 0.0, 'end': 1.0, 'text': "Bonjour"},
+        {'start': 1.0, 'end': 2.0, 'text': "tout"},
+        {'start': 2.0, 'end': 3.0, 'text': "le monde"},
+    ]
+    gate = threading.Event()
+
+    def __init__(self, audio_file, model_size, language=None, max_duration=None, enable_diarization=False,
+                 on_segments=None, should_stop=None, **kwargs):
+        self.on_segments = on_segments
+        self.should_stop = should_stop
+
+    def run(self):
+        self.gate.wait(10)
+        for segment in self.SEGMENTS:
+            self.on_segments([segment])
+        return {
+            'text': " ".join(segment['text'] for segment in self.SEGMENTS),
+            'segments': list(self.SEGMENTS),
+            'language': "fr",
+            'duration': 3.0,
+        }
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="vocanote-test-")
+        self.audio_file = os.path.join(self.temp_dir, "reunion.wav")
+        with open(self.audio_file, 'wb') as f:
+            f.write(b"RIFF")
+
+        _StubEngine.gate.clear()
+        patches = [
+            mock.patch.object(job_queue, "TranscriptionEngine", _StubEngine),
+            mock.patch.object(job_queue.JobQueue, "_pin_model", lambda self, model_size: None),
+            mock.patch.object(server.lic, "get_transcription_limit", lambda: None),
+            mock.patch.object(server.cache_utils, "get_cache_dir", self._cache_dir),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.service = server.TranscriptionService(workers=1, max_pending=1, output_dir=os.path.join(self.temp_dir, "out"))
+        self.httpd = server.start_in_background(self.service)
+        self.addCleanup(self._stop)
+
+    def _cache_dir(self, name=""):
+        path = os.path.join(self.temp_dir, "cache", name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _stop(self):
+        _StubEngine.gate.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.service.queue.wait(10)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.httpd.server_port, timeout=10)
+        self.addCleanup(connection.close)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+            headers = dict(headers or {}, **{"Content-Type": "application/json"})
+        connection.request(method, path, body=body, headers=headers or {})
+        return connection.getresponse()
+
+    def _json(self, method, path, body=None, headers=None):
+        response = self._request(method, path, body, headers)
+        return response.status, json.loads(response.read().decode('utf-8'))
+
+    def test_health(self):
+        status, data = self._json("GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(data['status'], "ok")
+        self.assertEqual(data['pending'], 0)
+
+    def test_submit_rejects_invalid_requests(self):
+        status, data = self._json("POST", "/jobs", {'path': os.path.join(self.temp_dir, "absent.wav")})
+        self.assertEqual(status, 400)
+        self.assertIn('error', data)
+
+        status, _ = self._json("POST", "/jobs", b"{pas du json", {"Content-Type": "application/json"})
+        self.assertEqual(status, 400)
+
+        status, _ = self._json("POST", "/jobs", b"", {"Content-Type": "application/octet-stream"})
+        self.assertEqual(status, 400)
+
+        status, _ = self._json("POST", "/jobs", {'path': self.audio_file, 'diarization_backend': "inconnu"})
+        self.assertEqual(status, 400)
+
+    def test_submit_rejects_oversize_upload(self):
+        with mock.patch.object(server, "MAX_UPLOAD_BYTES", 16):
+            status, data = self._json("POST", "/jobs?name=a.wav", b"x" * 32, {"Content-Type": "application/octet-stream"})
+        self.assertEqual(status, 413)
+        self.assertIn('error', data)
+
+    def test_submit_rejects_when_queue_is_full(self):
+        # Premier travail en cours (moteur bloqué), deuxième en attente: la file (max_pending = 1) est pleine
+        status, first = self._json("POST", "/jobs", {'path': self.audio_file})
+        self.assertEqual(status, 202)
+        status, second = self._json("POST", "/jobs", {'path': self.audio_file})
+        self.assertEqual(status, 202)
+        status, data = self._json("POST", "/jobs", {'path': self.audio_file})
+        self.assertEqual(status, 503)
+        self.assertIn('error', data)
+
+    def test_unknown_job(self):
+        status, _ = self._json("GET", "/jobs/999")
+        self.assertEqual(status, 404)
+        status, _ = self._json("GET", "/jobs/999/segments")
+        self.assertEqual(status, 404)
+
+    def test_segments_stream(self):
+        status, job = self._json("POST", "/jobs", {'path': self.audio_file})
+        self.assertEqual(status, 202)
+
+        # Flux ouvert avant le décodage: les segments arrivent au fil de l'eau
+        response = self._request("GET", f"/jobs/{job['id']}/segments")
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader("Content-Type").startswith("application/x-ndjson"))
+        _StubEngine.gate.set()
+
+        lines = [json.loads(line) for line in response.read().decode('utf-8').splitlines()]
+        self.assertEqual(lines[:-1], _StubEngine.SEGMENTS)
+        self.assertEqual(lines[-1], {'state': job_queue.DONE, 'error': None})
+
+        status, result = self._json("GET", f"/jobs/{job['id']}/result")
+        self.assertEqual(status, 200)
+        self.assertEqual(result['text'], "Bonjour tout le monde")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Détection d'activité vocale (VAD) pour VocaNote
+Détecteur énergie + platitude spectrale en NumPy (CPU, sans modèle ni réseau)
+utilisé pour ne pas décoder les fenêtres de silence avec Whisper
+"""
+
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import settings
+
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 480  # Trames de 30 ms
+
+
+class VoiceActivityDetector:
+    """
+    Détecteur de parole par trames de 30 ms
+
+    Une trame est considérée comme parole si son énergie dépasse le bruit de fond
+    d'au moins `threshold_db` et si son spectre n'est pas plat (bruit blanc, ventilation).
+    Le bruit de fond est un percentile bas des énergies de toutes les trames déjà vues
+    de l'enregistrement (sans plafond fixe: un enregistrement faible garde sa parole).
+    """
+
+    # Histogramme des énergies de trame (dBFS) de l'enregistrement, par pas de 0,5 dB
+    HISTOGRAM_EDGES = np.arange(-120.0, 0.5, 0.5)
+    # Percentile de cet histogramme pris comme bruit de fond
+    NOISE_PERCENTILE = 10
+
+    def __init__(
+        self,
+        threshold_db: float = 8.0,
+        max_flatness: float = 0.45,
+        min_speech_ms: int = 150,
+        max_gap_ms: int = 500,
+        padding_ms: int = 200
+    ):
+        self.threshold_db = threshold_db
+        self.max_flatness = max_flatness
+        self.min_speech_frames = max(1, min_speech_ms * SAMPLE_RATE // 1000 // FRAME_SAMPLES)
+        self.max_gap_frames = max_gap_ms * SAMPLE_RATE // 1000 // FRAME_SAMPLES
+        self.padding_frames = padding_ms * SAMPLE_RATE // 1000 // FRAME_SAMPLES
+        self.noise_floor_db = None
+        self._histogram = np.zeros(len(self.HISTOGRAM_EDGES) - 1, dtype=np.int64)
+
+    def _frame_features(self, audio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Énergie (dBFS) et platitude spectrale de chaque trame"""
+        num_frames = len(audio) // FRAME_SAMPLES
+        frames = audio[:num_frames * FRAME_SAMPLES].reshape(num_frames, FRAME_SAMPLES)
+
+        energy = np.mean(frames.astype(np.float64) ** 2, axis=1)
+        energy_db = 10.0 * np.log10(energy + 1e-10)
+
+        # Platitude spectrale dans la bande de la voix (300 - 4000 Hz):
+        # moyenne géométrique / moyenne arithmétique du spectre de puissance
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SAMPLES), axis=1)) ** 2 + 1e-12
+        freqs = np.fft.rfftfreq(FRAME_SAMPLES, 1.0 / SAMPLE_RATE)
+        band = spectrum[:, (freqs >= 300) & (freqs <= 4000)]
+        flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+
+        return energy_db, flatness
+
+    def speech_mask(self, audio: np.ndarray) -> np.ndarray:
+        """Masque booléen parole/silence par trame de 30 ms (lissé)"""
+        if len(audio) < FRAME_SAMPLES:
+            return np.zeros(0, dtype=bool)
+
+        energy_db, flatness = self._frame_features(audio)
+
+        # Bruit de fond: distribution des niveaux de tout l'enregistrement (indépendante de l'ordre des fenêtres)
+        counts, _ = np.histogram(np.clip(energy_db, -120.0, 0.0), bins=self.HISTOGRAM_EDGES)
+        self._histogram += counts
+        cumulative = np.cumsum(self._histogram)
+        index = int(np.searchsorted(cumulative, cumulative[-1] * self.NOISE_PERCENTILE / 100))
+        self.noise_floor_db = floor = float(self.HISTOGRAM_EDGES[index])
+
+        loud = energy_db > floor + self.threshold_db
+        # Un spectre plat n'est accepté comme parole que s'il est nettement plus fort
+        # (dans le doute on décode: rater de la parole est pire que décoder du bruit)
+        voiced = (flatness < self.max_flatness) | (energy_db > floor + 3 * self.threshold_db)
+        mask = loud & voiced
+
+        return self._smooth(mask)
+
+    def _smooth(self, mask: np.ndarray) -> np.ndarray:
+        """Supprime les détections trop courtes, comble les petites pauses, ajoute une marge"""
+        regions = mask_to_regions(mask)
+
+        # Combler les pauses courtes entre deux zones de parole
+        merged = []
+        for start, end in regions:
+            if merged and start - merged[-1][1] <= self.max_gap_frames:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+
+        smoothed = np.zeros_like(mask)
+        for start, end in merged:
+            if end - start >= self.min_speech_frames:
+                smoothed[max(0, start - self.padding_frames):end + self.padding_frames] = True
+        return smoothed
+
+    def speech_regions(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """Zones de parole [(début, fin)] en échantillons, relatives au début du signal"""
+        mask = self.speech_mask(audio)
+        return [
+            (start * FRAME_SAMPLES, min(end * FRAME_SAMPLES, len(audio)))
+            for start, end in mask_to_regions(mask)
+        ]
+
+    def first_speech(self, audio: np.ndarray):
+        """Position (échantillons) du début de la première zone de parole, None si silence"""
+        regions = self.speech_regions(audio)
+        return regions[0][0] if regions else None
+
+
+def mask_to_regions(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """Intervalles [début, fin) des suites de True dans un masque"""
+    if len(mask) == 0:
+        return []
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    changes = np.flatnonzero(np.diff(padded))
+    return list(zip(changes[0::2].tolist(), changes[1::2].tolist()))
+
+
+def skipped_everything(result: Dict) -> bool:
+    """
+    La détection de parole a écarté tout l'audio (aucun segment): enregistrement très faible
+    ou bruit de fond mal estimé, à redécoder sans détection plutôt que de rendre un texte vide
+    """
+    skipped = result.get('skipped_duration', 0)
+    return not result.get('segments') and skipped > 0 and skipped >= 0.9 * result.get('duration', 0)
+
+
+def is_vad_enabled() -> bool:
+    """[Performance] vad_enabled (activé par défaut)"""
+    return settings.get_bool("Performance", "vad_enabled", True)
+
+
+def create_detector():
+    """Crée un détecteur selon la configuration (None si désactivé)"""
+    if not is_vad_enabled():
+        return None
+    threshold_db = settings.get_float("Performance", "vad_threshold_db", 8.0)
+    logging.info(f"[VAD] Détection de parole activée (seuil {threshold_db} dB)")
+    return VoiceActivityDetector(threshold_db=threshold_db)